@@ -2,9 +2,10 @@
 
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.utils import timezone
 from django_tenants.admin import TenantAdminMixin
 
-from .models import Agency, Domain, CustomUser
+from .models import Agency, BackgroundJob, Domain, CustomUser, PendingObjectDelete
 
 
 # 1. Registra o modelo da Agência (o Tenant)
@@ -46,4 +47,27 @@ class CustomUserAdmin(UserAdmin):
     )
     add_fieldsets = UserAdmin.add_fieldsets + (
         ('Informações da Agência', {'fields': ('agency',)}),
-    )
\ No newline at end of file
+    )
+
+# 4. Fila de remoção de objetos no R2 (drenada pelo drain_storage_deletes)
+@admin.register(PendingObjectDelete)
+class PendingObjectDeleteAdmin(admin.ModelAdmin):
+    list_display = ('key', 'schema_name', 'attempts', 'next_attempt_at', 'created_at')
+    list_filter = ('schema_name',)
+    search_fields = ('key', 'last_error')
+
+
+# 5. Fila de tarefas em segundo plano (executada pelo run_workers)
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'schema_name', 'status', 'priority', 'attempts', 'run_at', 'locked_by')
+    list_filter = ('status', 'task', 'schema_name')
+    search_fields = ('task', 'last_error')
+    actions = ('retry_now',)
+
+    @admin.action(description='Executar novamente agora')
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='running').update(
+            status='queued', attempts=0, run_at=timezone.now(), last_error=''
+        )
+        self.message_user(request, f'{updated} tarefa(s) de volta na fila.')
@@ -0,0 +1,37 @@
+# accounts/jobs.py
+"""
+Tarefas em segundo plano do schema public (executadas pelo run_workers).
+"""
+from django_tenants.models import TenantMixin
+from django_tenants.signals import post_schema_sync
+from django_tenants.utils import schema_exists
+
+from projects.jobs import job
+
+from .models import Agency
+
+
+@job(max_attempts=3, priority=10)
+def create_agency_schema(agency_id):
+    """
+    Cria o schema da agência e roda as migrations dos TENANT_APPS (dezenas de
+    segundos). Era feito no save() do create_agency, segurando a request.
+    Até terminar, o TenantReadyMiddleware segura o acesso ao tenant.
+    """
+    tenant = Agency.objects.filter(pk=agency_id).first()
+    if tenant is None:
+        return
+    if schema_exists(tenant.schema_name):
+        Agency.objects.filter(pk=agency_id).update(schema_ready=True)
+        return
+    try:
+        tenant.create_schema(check_if_exists=True, verbosity=0)
+    except Exception:
+        # Migrations pela metade: descarta o schema para a próxima tentativa recomeçar
+        tenant._drop_schema(force_drop=True)
+        raise
+    post_schema_sync.send(sender=TenantMixin, tenant=tenant.serializable_fields())
+
+    if not Agency.objects.filter(pk=agency_id).update(schema_ready=True):
+        # Agência excluída enquanto o schema era criado: não deixa o schema órfão
+        tenant._drop_schema(force_drop=True)
@@ -1,11 +1,34 @@
 # accounts/middleware.py
 
 import datetime
+from django.http import HttpResponse
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
 from django.conf import settings
 
+class TenantReadyMiddleware:
+    """
+    Segura o acesso à agência enquanto o schema dela é criado em segundo plano
+    (create_agency_schema). Fica logo depois do TenantMainMiddleware: nada pode
+    consultar o banco antes, senão as tabelas do tenant (usuários, sessões)
+    cairiam nas do schema public.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        tenant = getattr(request, 'tenant', None)
+        if tenant is not None and not getattr(tenant, 'schema_ready', True):
+            # Sem request no contexto: os context processors consultariam o banco
+            content = render_to_string('accounts/tenant_preparing.html', {'tenant': tenant})
+            response = HttpResponse(content, status=503)
+            response['Retry-After'] = '10'
+            return response
+        return self.get_response(request)
+
+
 class TrialPeriodMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
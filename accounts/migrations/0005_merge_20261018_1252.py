@@ -0,0 +1,14 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:52
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_domain_tenant'),
+        ('accounts', '0004_agency_menu_config_agency_on_trial_agency_paid_until_and_more'),
+    ]
+
+    operations = [
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuePost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('schema_name', models.CharField(max_length=63)),
+                ('post_id', models.BigIntegerField()),
+                ('scheduled_for', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scheduled_for'], name='due_post_time_idx')],
+                'unique_together': {('schema_name', 'post_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_duepost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agency',
+            name='schema_ready',
+            field=models.BooleanField(default=True, verbose_name='Ambiente pronto?'),
+        ),
+    ]
@@ -6,6 +6,7 @@ from django.conf import settings
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.core.cache import cache
+from django.utils import timezone
 
 # 1. Modelo da Agência (Tenant)
 class Agency(TenantMixin):
@@ -26,6 +27,9 @@ class Agency(TenantMixin):
     primary_color = models.CharField(max_length=7, default='#FFFFFF', verbose_name="Cor Primária")
     secondary_color = models.CharField(max_length=7, default='#000000', verbose_name="Cor Secundária")
 
+    # False enquanto o schema é criado em segundo plano (create_agency_schema)
+    schema_ready = models.BooleanField(default=True, verbose_name="Ambiente pronto?")
+
     auto_create_schema = True
 
     def __str__(self):
@@ -76,6 +80,89 @@ class GoogleApiCredentials(models.Model):
     def __str__(self):
         return f"Credenciais do Google para {self.user.username}"
     
+# 3. Fila de remoção de objetos no storage (R2)
+class PendingObjectDelete(models.Model):
+    """
+    Chave do R2 aguardando remoção. Quem apaga arquivos (pasta, cliente, agência)
+    só grava as chaves aqui, na mesma transação, e a request retorna na hora; o
+    comando drain_storage_deletes remove em lotes (DeleteObjects, até 1000 chaves)
+    e reagenda as que falharem. Fica no schema public para sobreviver à exclusão
+    da agência.
+    """
+    key = models.CharField(max_length=1024)
+    schema_name = models.CharField(max_length=63, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['next_attempt_at'], name='pending_delete_due_idx')]
+
+    def __str__(self):
+        return self.key
+
+
+class BackgroundJob(models.Model):
+    """
+    Tarefa em segundo plano (fila no próprio Postgres, sem broker). Enfileirada
+    por projects.jobs.enqueue() na transação de quem chamou e executada pelo
+    comando run_workers, que pega as tarefas com FOR UPDATE SKIP LOCKED e roda
+    cada uma no schema do tenant que a criou. Tarefas concluídas saem da tabela;
+    as que esgotam as tentativas ficam como 'failed' para consulta no admin.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Na fila'),
+        ('running', 'Executando'),
+        ('failed', 'Falhou'),
+    ]
+
+    task = models.CharField(max_length=255)  # Caminho da função (@job)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    schema_name = models.CharField(max_length=63, blank=True)  # Vazio = public
+    priority = models.SmallIntegerField(default=0)  # Maior roda antes
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Próximas da fila: ORDER BY priority DESC, run_at só sobre as 'queued'
+            models.Index(
+                models.F('priority').desc(), 'run_at', name='job_queue_idx',
+                condition=models.Q(status='queued'),
+            ),
+            models.Index(fields=['locked_at'], name='job_running_idx', condition=models.Q(status='running')),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.get_status_display()})"
+
+
+class DuePost(models.Model):
+    """
+    Índice global dos posts agendados (schema public). Mantido pelos signals do
+    Post em cada tenant: um post 'approved_to_schedule' tem uma linha aqui com o
+    horário. O agendador (run_scheduler) consulta só esta tabela, então o custo
+    de cada rodada depende dos posts vencidos, não do número de agências.
+    """
+    schema_name = models.CharField(max_length=63)
+    post_id = models.BigIntegerField()
+    scheduled_for = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['schema_name', 'post_id']
+        indexes = [models.Index(fields=['scheduled_for'], name='due_post_time_idx')]
+
+    def __str__(self):
+        return f"{self.schema_name}#{self.post_id} @ {self.scheduled_for}"
+
 @receiver(post_save, sender=Domain)
 @receiver(post_delete, sender=Domain)
 def clear_hosts_cache(sender, instance, **kwargs):
@@ -6,7 +6,7 @@ from django.views.decorators.http import require_POST
 from django.contrib.auth import get_user_model
 from django.contrib import messages
 from django.db import transaction, IntegrityError
-from django_tenants.utils import schema_context
+from django_tenants.utils import schema_context, schema_exists
 from datetime import timedelta 
 from django.utils import timezone
 # Bibliotecas Google OAuth2
@@ -14,8 +14,12 @@ from google_auth_oauthlib.flow import Flow
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 
+from projects.jobs import enqueue
+from projects.models import schedule_tenant_media_deletes
+
 # Imports Locais (Do próprio app accounts)
 from .models import GoogleApiCredentials, Agency, Domain
+from .jobs import create_agency_schema
 from .forms import AgencyForm  # Certifique-se que o forms.py está em accounts/
 
 User = get_user_model()
@@ -264,7 +268,11 @@ def create_agency(request):
                         tenant.menu_config = {
                             'allowed_modules': form.cleaned_data['visible_menus']
                         }
-                        tenant.save() # Dispara criação do Schema no Postgres (agora permitido)
+                        # O schema (CREATE SCHEMA + migrations) é criado em segundo plano
+                        tenant.auto_create_schema = False
+                        tenant.schema_ready = False
+                        tenant.save()
+                        enqueue(create_agency_schema, args=[tenant.pk])
 
                         # 2. Cria o Domínio
                         domain = Domain()
@@ -273,7 +281,7 @@ def create_agency(request):
                         domain.is_primary = True
                         domain.save()
 
-                messages.success(request, f"Agência '{tenant.name}' criada com sucesso!")
+                messages.success(request, f"Agência '{tenant.name}' criada! O ambiente fica pronto em instantes.")
                 return redirect('agency_list')
 
             except IntegrityError:
@@ -396,6 +404,11 @@ def delete_agency(request, pk):
             try:
                 with transaction.atomic():
                     agency_name = agency.name
+                    # Arquivos do R2 vão para a fila de remoção (drain_storage_deletes);
+                    # a exclusão não espera o storage
+                    # Schema ainda na fila de criação: não há mídia para remover
+                    if schema_exists(agency.schema_name):
+                        schedule_tenant_media_deletes(agency.schema_name)
                     # O django-tenants automaticamente faz o DROP SCHEMA no banco
                     agency.delete()
                     
@@ -38,7 +38,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 STORAGES = {
     # Gerenciamento de arquivos de mídia (Uploads) -> Vai para o Cloudflare R2
     "default": {
-        "BACKEND": "storages.backends.s3boto3.S3Boto3Storage",
+        # S3Boto3Storage com cache das URLs assinadas (projects/storage.py)
+        "BACKEND": "projects.storage.CachedURLS3Storage",
         "OPTIONS": {
             "access_key": config('R2_ACCESS_KEY_ID'),
             "secret_key": config('R2_SECRET_ACCESS_KEY'),
@@ -56,6 +57,72 @@ STORAGES = {
     },
 }
 
+# Download em lote (zip): quantos objetos do R2 baixar em paralelo e quanto
+# da fila pode ficar em memória por download. Arquivos maiores que o limite
+# são lidos em streaming na vez deles.
+MEDIA_ZIP_PREFETCH_WORKERS = config('MEDIA_ZIP_PREFETCH_WORKERS', default=4, cast=int)
+MEDIA_ZIP_PREFETCH_MAX_BYTES = config('MEDIA_ZIP_PREFETCH_MAX_BYTES', default=64 * 1024 * 1024, cast=int)
+
+# Upload direto para o R2 (URL assinada): validade da URL e tamanho máximo de
+# um PUT. O endpoint antigo (arquivo passando pelo Django) só aceita arquivos
+# pequenos, para não prender os workers.
+# O bucket precisa de CORS liberando PUT a partir do domínio do app.
+MEDIA_DIRECT_UPLOAD_EXPIRES = config('MEDIA_DIRECT_UPLOAD_EXPIRES', default=3600, cast=int)
+MEDIA_DIRECT_UPLOAD_MAX_BYTES = config('MEDIA_DIRECT_UPLOAD_MAX_BYTES', default=5 * 1024 ** 3, cast=int)
+MEDIA_PROXY_UPLOAD_MAX_BYTES = config('MEDIA_PROXY_UPLOAD_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+
+# Upload multipart (vídeos grandes): tamanho de cada parte e depois de quantas
+# horas um upload parado é abortado pelo comando abort_stale_uploads.
+MEDIA_MULTIPART_PART_SIZE = config('MEDIA_MULTIPART_PART_SIZE', default=16 * 1024 * 1024, cast=int)
+MEDIA_MULTIPART_STALE_HOURS = config('MEDIA_MULTIPART_STALE_HOURS', default=24, cast=int)
+
+# Deduplicação da Central de Mídia: uploads diretos até este tamanho têm o
+# SHA-256 calculado na hora; os maiores ficam para o comando dedupe_media_files.
+MEDIA_DEDUP_INLINE_MAX_BYTES = config('MEDIA_DEDUP_INLINE_MAX_BYTES', default=32 * 1024 * 1024, cast=int)
+
+# Cota padrão de espaço por agência (bytes; 0 = sem limite). Cada tenant pode
+# ter a sua em StorageUsage.quota_bytes (admin).
+MEDIA_TENANT_QUOTA_BYTES = config('MEDIA_TENANT_QUOTA_BYTES', default=0, cast=int)
+
+# Derivados de imagem (miniatura/prévia WebP, projects/derivatives.py, gerados
+# pela fila de tarefas): qualidade do WebP e tamanho máximo do original processado.
+MEDIA_DERIVATIVE_QUALITY = config('MEDIA_DERIVATIVE_QUALITY', default=80, cast=int)
+MEDIA_DERIVATIVE_MAX_BYTES = config('MEDIA_DERIVATIVE_MAX_BYTES', default=50 * 1024 * 1024, cast=int)
+
+# Cache das URLs assinadas do R2 (CachedURLS3Storage): tamanho do LRU em memória
+# de cada processo e quantos segundos antes de a assinatura expirar a URL deixa
+# de ser reaproveitada. URLs públicas (custom_domain) não passam pelo cache.
+MEDIA_URL_CACHE_MAX_ENTRIES = config('MEDIA_URL_CACHE_MAX_ENTRIES', default=10000, cast=int)
+MEDIA_URL_CACHE_MARGIN = config('MEDIA_URL_CACHE_MARGIN', default=600, cast=int)
+
+# Fila de tarefas em segundo plano (projects/jobs.py, comando run_workers):
+# tentativas padrão por tarefa e depois de quantos segundos uma tarefa 'running'
+# é considerada abandonada (worker morreu) e volta para a fila.
+JOBS_MAX_ATTEMPTS = config('JOBS_MAX_ATTEMPTS', default=5, cast=int)
+JOBS_STALE_SECONDS = config('JOBS_STALE_SECONDS', default=3600, cast=int)
+
+# Agendador de posts (run_scheduler): intervalo entre rodadas (s), posts vencidos
+# despachados por rodada e limite de entregas na fila (não despacha mais enquanto
+# os workers não derem conta das que já estão lá).
+SCHEDULER_INTERVAL = config('SCHEDULER_INTERVAL', default=5, cast=float)
+SCHEDULER_BATCH_SIZE = config('SCHEDULER_BATCH_SIZE', default=200, cast=int)
+SCHEDULER_MAX_IN_FLIGHT = config('SCHEDULER_MAX_IN_FLIGHT', default=500, cast=int)
+
+# Cliente HTTP das integrações (projects/provider_http.py): timeouts (s) de conexão
+# e leitura, novas tentativas (falha de conexão; 429/5xx só em GET), tamanho dos
+# pools keep-alive (hosts / conexões por host) e a partir de quantos ms a chamada
+# é registrada como lenta.
+PROVIDER_HTTP_CONNECT_TIMEOUT = config('PROVIDER_HTTP_CONNECT_TIMEOUT', default=5, cast=float)
+PROVIDER_HTTP_READ_TIMEOUT = config('PROVIDER_HTTP_READ_TIMEOUT', default=30, cast=float)
+PROVIDER_HTTP_RETRIES = config('PROVIDER_HTTP_RETRIES', default=2, cast=int)
+PROVIDER_HTTP_POOL_HOSTS = config('PROVIDER_HTTP_POOL_HOSTS', default=16, cast=int)
+PROVIDER_HTTP_POOL_SIZE = config('PROVIDER_HTTP_POOL_SIZE', default=10, cast=int)
+PROVIDER_HTTP_SLOW_MS = config('PROVIDER_HTTP_SLOW_MS', default=2000, cast=int)
+
+# Comandos que rodam em todos os tenants (TenantCommand): quantos processos em
+# paralelo, cada um com a própria conexão. Cuidado com o limite de conexões do banco.
+TENANT_COMMAND_WORKERS = config('TENANT_COMMAND_WORKERS', default=4, cast=int)
+
 CSRF_TRUSTED_ORIGINS = [
     'https://randolph-governable-ayana.ngrok-free.dev',
 ]
@@ -93,6 +160,7 @@ SESSION_SAVE_EVERY_REQUEST = True
 
 MIDDLEWARE = [
     'django_tenants.middleware.main.TenantMainMiddleware',
+    'accounts.middleware.TenantReadyMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -128,6 +196,15 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+# Produção roda em ASGI (gunicorn + UvicornWorker) por causa do stream SSE do Kanban
+ASGI_APPLICATION = 'config.asgi.application'
+
+# Fan-out dos eventos do Kanban: LISTEN/NOTIFY do Postgres (funciona com vários workers)
+KANBAN_EVENTS_BACKEND = config('KANBAN_EVENTS_BACKEND', default='projects.events.PostgresEventBackend')
+
+# Cards serializados por coluna no Kanban operacional (0 = todos). A coluna
+# mostra o total real e avisa quando foi cortada (TaskQuerySet.to_board_columns)
+KANBAN_COLUMN_MAX_CARDS = config('KANBAN_COLUMN_MAX_CARDS', default=100, cast=int)
 
 
 # Database
@@ -1,16 +1,19 @@
 # projects/admin.py
 
 from django.contrib import admin
+from django.contrib.postgres.search import SearchQuery
+from django.db.models import Q
+from django.template.defaultfilters import filesizeformat
 from django.utils.html import format_html
 from .models import (
-    Client, Task, SocialAccount, 
-    CalendarEvent, MediaFolder, MediaFile
+    Client, Task, SocialAccount, PostDelivery,
+    CalendarEvent, MediaFolder, MediaFile, MediaBlob, MultipartUpload, StorageUsage, Tag, TASK_SEARCH_CONFIG
 )
 
 # --- CLIENTE ---
 @admin.register(Client)
 class ClientAdmin(admin.ModelAdmin):
-    list_display = ('name', 'get_logo', 'cnpj', 'nome_representante', 'is_active')
+    list_display = ('name', 'get_logo', 'cnpj', 'nome_representante', 'is_active', 'get_media_usage')
     search_fields = ('name', 'cnpj', 'email_representante')
     list_filter = ('is_active', 'data_inicio_contrato')
     
@@ -20,6 +23,10 @@ class ClientAdmin(admin.ModelAdmin):
         return "-"
     get_logo.short_description = "Logo"
 
+    def get_media_usage(self, obj):
+        return filesizeformat(obj.media_bytes)
+    get_media_usage.short_description = "Mídia"
+
 
 # --- TAREFA (KANBAN UNIFICADO) ---
 @admin.register(Task)
@@ -42,19 +49,20 @@ class TaskAdmin(admin.ModelAdmin):
         'social_network', 
         'priority', 
         'client', 
-        'assigned_to'
+        'assigned_to',
+        'tag_set'
     )
     
-    # Barra de busca
+    # Barra de busca (a consulta em si é full-text, ver get_search_results)
     search_fields = ('title', 'description', 'client__name', 'copy_content')
     
     # 2. MUDANÇA AQUI: Melhor interface para selecionar múltiplos usuários
-    filter_horizontal = ('assigned_to',)
+    filter_horizontal = ('assigned_to', 'tag_set')
 
     # Organização do Formulário de Edição (Abas/Seções)
     fieldsets = (
         ('Dados Gerais', {
-            'fields': ('title', 'description', 'project', 'client', 'kanban_type', 'status', 'priority', 'assigned_to', 'order')
+            'fields': ('title', 'description', 'project', 'client', 'kanban_type', 'status', 'priority', 'assigned_to', 'tag_set', 'order')
         }),
         ('Fluxo Operacional (Briefing)', {
             'classes': ('collapse',), 
@@ -95,6 +103,21 @@ class TaskAdmin(admin.ModelAdmin):
         return ", ".join([user.username for user in obj.assigned_to.all()])
     get_assigned_to.short_description = 'Responsáveis'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Usa o índice GIN (search_vector) em vez de icontains nos TextFields."""
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+
+        query = SearchQuery(search_term, config=TASK_SEARCH_CONFIG, search_type='websearch')
+        clients = Client.objects.filter(name__icontains=search_term).values('id')
+        return queryset.filter(Q(search_vector=query) | Q(client__in=clients)), False
+
+# --- TAGS ---
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
+
 # --- CONTAS SOCIAIS ---
 @admin.register(SocialAccount)
 class SocialAccountAdmin(admin.ModelAdmin):
@@ -102,18 +125,45 @@ class SocialAccountAdmin(admin.ModelAdmin):
     list_filter = ('platform', 'is_active', 'client')
     search_fields = ('account_name', 'account_id')
 
+# --- PUBLICAÇÕES (ENTREGAS POR CONTA) ---
+@admin.register(PostDelivery)
+class PostDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('post', 'account', 'status', 'attempts', 'published_at', 'updated_at')
+    list_filter = ('status', 'account__platform')
+    search_fields = ('external_id', 'last_error', 'account__account_name')
+    readonly_fields = ('external_id', 'attempts', 'last_error', 'published_at', 'updated_at')
+
 # --- ARQUIVOS (DRIVE / R2) ---
 @admin.register(MediaFolder)
 class MediaFolderAdmin(admin.ModelAdmin):
     list_display = ('name', 'client', 'parent', 'created_at')
     list_filter = ('client',)
     search_fields = ('name', 'client__name')
+    readonly_fields = ('path', 'total_files', 'total_bytes')
 
 @admin.register(MediaFile)
 class MediaFileAdmin(admin.ModelAdmin):
     list_display = ('filename', 'folder', 'file_size', 'uploaded_at')
-    search_fields = ('filename', 'folder__name')
-    readonly_fields = ('uploaded_at',)
+    search_fields = ('filename', 'folder__name', 'sha256')
+    readonly_fields = ('uploaded_at', 'sha256', 'blob')
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'key', 'size', 'ref_count', 'created_at')
+    search_fields = ('sha256', 'key')
+    readonly_fields = ('sha256', 'key', 'size', 'ref_count', 'created_at')
+
+@admin.register(StorageUsage)
+class StorageUsageAdmin(admin.ModelAdmin):
+    list_display = ('files', 'bytes', 'quota_bytes', 'reconciled_at')
+    readonly_fields = ('files', 'bytes', 'reconciled_at')
+
+@admin.register(MultipartUpload)
+class MultipartUploadAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'target', 'size', 'created_by', 'created_at')
+    list_filter = ('target',)
+    search_fields = ('filename', 'key')
+    readonly_fields = ('key', 'upload_id', 'created_at')
 
 # --- CALENDÁRIO (LEGADO) ---
 @admin.register(CalendarEvent)
@@ -0,0 +1,170 @@
+# projects/derivatives.py
+"""
+Derivados de imagem: miniatura e prévia em WebP das artes e da Central de Mídia.
+
+Os cards, o calendário e a tela de aprovação mostravam o original (PNGs de
+5-20 MB). Quando uma imagem é salva, uma tarefa na fila (projects.jobs) gera
+versões reduzidas com o Pillow e grava ao lado do original, com o SHA-256 do
+conteúdo no nome:
+
+    designs/arte_ab12.png  ->  designs/arte_ab12.png.thumb.3f9a0c1d2e4b5a6f.webp
+
+O resultado fica num JSONField do próprio registro ({'source', 'sha256',
+'thumb', 'preview'}), então os serializers montam a URL sem query extra e usam
+o original enquanto o derivado não existe (ou se a geração falhou).
+"""
+import io
+import logging
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.utils import timezone
+from django_tenants.utils import schema_context
+from PIL import Image, ImageOps
+
+from .jobs import enqueue, job
+from .storage import STREAM_CHUNK_SIZE, open_stream, sha256_hexdigest
+
+logger = logging.getLogger(__name__)
+
+# Lado maior (px) de cada derivado. A imagem nunca é ampliada.
+DERIVATIVE_SIZES = {
+    'thumb': 400,     # cards do Kanban, calendário, grade da Central de Mídia
+    'preview': 1280,  # modais e tela de aprovação
+}
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff'}
+
+
+def is_image_name(name):
+    return os.path.splitext(name or '')[1].lower() in IMAGE_EXTENSIONS
+
+
+def derivative_name(source_name, sha256, label):
+    return f'{source_name}.{label}.{sha256[:16]}.webp'
+
+
+def derivative_keys(derivatives):
+    """Chaves no storage dos derivados gerados (para removê-las junto com o original)."""
+    derivatives = derivatives or {}
+    return [derivatives[label] for label in DERIVATIVE_SIZES if derivatives.get(label)]
+
+
+def derivative_url(fieldfile, derivatives, label):
+    """URL do derivado `label` da imagem; o original se ele ainda não existir."""
+    if not fieldfile:
+        return None
+    derivatives = derivatives or {}
+    if derivatives.get('source') == fieldfile.name and derivatives.get(label):
+        return fieldfile.storage.url(derivatives[label])
+    return fieldfile.url
+
+
+def render_derivatives(data):
+    """Gera {label: bytes WebP} a partir dos bytes da imagem original."""
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEG: decodifica já reduzido (muito mais rápido em fotos grandes)
+        image.draft('RGB', (max(DERIVATIVE_SIZES.values()),) * 2)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        rendered = {}
+        # Do maior para o menor: cada um parte do anterior, já reduzido
+        for label, size in sorted(DERIVATIVE_SIZES.items(), key=lambda item: -item[1]):
+            image = image.copy()
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, 'WEBP', quality=settings.MEDIA_DERIVATIVE_QUALITY, method=4)
+            rendered[label] = buffer.getvalue()
+    return rendered
+
+
+def generate_derivatives(storage, source_name, sha256=''):
+    """
+    Gera e grava os derivados de `source_name`. Com o SHA-256 já conhecido
+    (MediaFile deduplicado) e os derivados no storage, nem baixa o original.
+    Retorna o dicionário guardado no JSONField do registro.
+    """
+    if sha256 and all(storage.exists(derivative_name(source_name, sha256, label)) for label in DERIVATIVE_SIZES):
+        return {'source': source_name, 'sha256': sha256, **{
+            label: derivative_name(source_name, sha256, label) for label in DERIVATIVE_SIZES
+        }}
+
+    chunks = []
+    total = 0
+    with open_stream(storage, source_name) as stream:
+        for chunk in iter(lambda: stream.read(STREAM_CHUNK_SIZE), b''):
+            total += len(chunk)
+            if total > settings.MEDIA_DERIVATIVE_MAX_BYTES:
+                return {'source': source_name, 'error': 'Imagem grande demais para gerar derivados.'}
+            chunks.append(chunk)
+    data = b''.join(chunks)
+    sha256 = sha256_hexdigest([data])
+
+    derivatives = {'source': source_name, 'sha256': sha256}
+    for label, content in render_derivatives(data).items():
+        name = derivative_name(source_name, sha256, label)
+        if not storage.exists(name):
+            storage.save(name, ContentFile(content))
+        derivatives[label] = name
+    return derivatives
+
+
+def refresh_derivatives(model, pk, field_name, json_field):
+    """
+    Gera os derivados da imagem atual do registro e grava no JSONField. Se a
+    imagem trocou enquanto isso, a gravação é ignorada (o save novo agenda outra).
+    Toca o updated_at: ETag do calendário e delta do Kanban enxergam a miniatura.
+    """
+    fields = [field_name, json_field]
+    if any(field.name == 'sha256' for field in model._meta.concrete_fields):
+        fields.append('sha256')
+    row = model.objects.filter(pk=pk).values(*fields).first()
+    if not row or not is_image_name(row[field_name]):
+        return None
+    source_name = row[field_name]
+    if (row[json_field] or {}).get('source') == source_name:
+        return row[json_field]
+
+    storage = model._meta.get_field(field_name).storage
+    try:
+        derivatives = generate_derivatives(storage, source_name, row.get('sha256', ''))
+    except Exception as e:
+        # Arquivo corrompido/formato não suportado: registra para não tentar a cada save
+        logger.warning('Derivados de %s falharam: %s', source_name, e)
+        derivatives = {'source': source_name, 'error': str(e)[:500]}
+
+    changes = {json_field: derivatives}
+    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        changes['updated_at'] = timezone.now()
+    model.objects.filter(pk=pk, **{field_name: source_name}).update(**changes)
+    return derivatives
+
+
+@job(max_attempts=3)
+def refresh_image_derivatives(model_label, pk, field_name, json_field):
+    """Tarefa da fila: derivados da imagem de um registro (model_label: 'projects.Task')."""
+    refresh_derivatives(apps.get_model(model_label), pk, field_name, json_field)
+
+
+def run_in_thread(model, pk, field_name, json_field, schema_name):
+    """refresh_derivatives numa thread (generate_image_derivatives): conexão própria, fechada no fim."""
+    try:
+        with schema_context(schema_name):
+            return refresh_derivatives(model, pk, field_name, json_field)
+    except Exception:
+        logger.exception('Erro ao gerar derivados de %s #%s', model.__name__, pk)
+        return None
+    finally:
+        # Conexão desta thread
+        connections['default'].close()
+
+
+def schedule_derivatives(model, pk, field_name, json_field):
+    """Enfileira a geração na transação do save: o worker só vê a tarefa depois do commit."""
+    enqueue(refresh_image_derivatives, args=[model._meta.label, pk, field_name, json_field])
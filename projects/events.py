@@ -0,0 +1,262 @@
+# projects/events.py
+"""
+Eventos em tempo real do Kanban (Server-Sent Events sobre ASGI).
+
+As views chamam `publish_task_event()` quando um card é criado, movido,
+editado ou excluído. O backend configurado em `settings.KANBAN_EVENTS_BACKEND`
+entrega o evento para todos os navegadores conectados ao stream do tenant.
+
+Backends:
+- PostgresEventBackend (padrão): LISTEN/NOTIFY do próprio Postgres, sem broker
+  externo. Cada processo ASGI mantém UMA conexão de escuta e distribui os eventos
+  para as filas locais; viewers ociosos ficam apenas aguardando a fila (sem polling).
+  Conectar e LISTEN/UNLISTEN (bloqueantes no psycopg2) rodam numa thread, fora
+  do event loop.
+- InProcessEventBackend: fan-out dentro do processo (testes / runserver).
+"""
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+
+import psycopg2
+import psycopg2.extensions
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils.module_loading import import_string
+
+# Intervalo do comentário de keep-alive do SSE (proxies derrubam conexões mudas)
+HEARTBEAT_SECONDS = 25
+
+TASK_EVENTS = ('created', 'moved', 'updated', 'deleted')
+
+
+def tenant_channel(schema_name):
+    """Canal do tenant (identificador válido para LISTEN/NOTIFY, máx. 63 chars)."""
+    return f'kanban_{schema_name}'[:63]
+
+
+class BaseEventBackend:
+    """Interface dos backends de fan-out."""
+
+    def publish(self, channel, message):
+        """Publica `message` (dict) no canal. Chamado a partir das views (sync)."""
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        """
+        Async context manager que entrega uma asyncio.Queue com as mensagens do
+        canal enquanto o bloco `async with` estiver aberto.
+        """
+        raise NotImplementedError
+
+
+class _LocalFanout:
+    """Registro de filas asyncio por canal, compartilhado pelos backends."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def add(self, channel, loop, queue):
+        with self._lock:
+            subscribers = self._subscribers.setdefault(channel, set())
+            subscribers.add((loop, queue))
+            return len(subscribers)
+
+    def remove(self, channel, loop, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(channel, set())
+            subscribers.discard((loop, queue))
+            if not subscribers:
+                self._subscribers.pop(channel, None)
+            return len(subscribers)
+
+    def has(self, channel):
+        with self._lock:
+            return bool(self._subscribers.get(channel))
+
+    def dispatch(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+
+
+class InProcessEventBackend(BaseEventBackend):
+    """Fan-out em memória. Só entrega para viewers do mesmo processo."""
+
+    def __init__(self):
+        self.fanout = _LocalFanout()
+
+    def publish(self, channel, message):
+        # Igual ao NOTIFY: só entrega se a transação for confirmada
+        transaction.on_commit(lambda: self.fanout.dispatch(channel, message))
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        self.fanout.add(channel, loop, queue)
+        try:
+            yield queue
+        finally:
+            self.fanout.remove(channel, loop, queue)
+
+
+class PostgresEventBackend(BaseEventBackend):
+    """
+    Fan-out via LISTEN/NOTIFY. O NOTIFY roda dentro da transação da view, então
+    o evento só é entregue após o commit (e é descartado em caso de rollback).
+    """
+
+    def __init__(self):
+        self.fanout = _LocalFanout()
+        self._listener = None
+        self._listener_fd = None
+        self._listener_loop = None
+        self._listening = set()
+        # Serializa connect/LISTEN/UNLISTEN (cada um espera numa thread)
+        self._lock = asyncio.Lock()
+        self._pending = set()
+
+    def publish(self, channel, message):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [channel, json.dumps(message)])
+
+    def _connect(self):
+        db = settings.DATABASES['default']
+        conn = psycopg2.connect(
+            dbname=db['NAME'], user=db['USER'], password=db['PASSWORD'],
+            host=db['HOST'], port=db['PORT'],
+        )
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    def _execute(self, sql):
+        with self._listener.cursor() as cursor:
+            cursor.execute(sql)
+
+    def _on_notify(self):
+        try:
+            self._listener.poll()
+        except psycopg2.Error:
+            # Conexão de escuta caiu: reconecta e volta a escutar os canais ativos
+            channels = set(self._listening)
+            self._close_listener()
+            for channel in channels:
+                self._sync_later(channel)
+            return
+        while self._listener.notifies:
+            notify = self._listener.notifies.pop(0)
+            self.fanout.dispatch(notify.channel, json.loads(notify.payload))
+
+    def _close_listener(self):
+        if self._listener is not None:
+            self._listener_loop.remove_reader(self._listener_fd)
+            if not self._listener.closed:
+                self._listener.close()
+        self._listener = None
+        self._listening = set()
+
+    async def _sync_channel(self, channel):
+        """
+        Deixa o LISTEN do canal igual às inscrições do processo: escuta se há
+        viewers, para de escutar se não há. Uma conexão de escuta por processo,
+        acordada pelo event loop (add_reader).
+        """
+        async with self._lock:
+            wanted = self.fanout.has(channel)
+            if wanted and self._listener is None:
+                conn = await sync_to_async(self._connect, thread_sensitive=False)()
+                self._listener = conn
+                self._listener_fd = conn.fileno()
+                self._listener_loop = asyncio.get_running_loop()
+                self._listener_loop.add_reader(self._listener_fd, self._on_notify)
+            if wanted and channel not in self._listening:
+                await sync_to_async(self._execute, thread_sensitive=False)(f'LISTEN "{channel}"')
+                self._listening.add(channel)
+            elif not wanted and channel in self._listening:
+                self._listening.discard(channel)
+                await sync_to_async(self._execute, thread_sensitive=False)(f'UNLISTEN "{channel}"')
+
+    def _sync_later(self, channel):
+        # Sem await (finally de um stream cancelado, callback do event loop)
+        task = asyncio.get_running_loop().create_task(self._sync_channel(channel))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        if self.fanout.add(channel, loop, queue) == 1:
+            await self._sync_channel(channel)
+        try:
+            yield queue
+        finally:
+            if self.fanout.remove(channel, loop, queue) == 0:
+                self._sync_later(channel)
+
+
+_backend = None
+
+
+def get_event_backend():
+    global _backend
+    if _backend is None:
+        backend_path = getattr(settings, 'KANBAN_EVENTS_BACKEND', 'projects.events.PostgresEventBackend')
+        _backend = import_string(backend_path)()
+    return _backend
+
+
+def reset_event_backend():
+    """Descarta o backend atual (usado nos testes com override_settings)."""
+    global _backend
+    _backend = None
+
+
+def publish_task_event(event, task, task_id=None):
+    """
+    Notifica os viewers do tenant atual. A mensagem é pequena (cabe no limite do
+    NOTIFY); o navegador busca os dados completos no delta (kanban_changes_api).
+    """
+    if event not in TASK_EVENTS:
+        raise ValueError(f"Evento desconhecido: {event}")
+
+    message = {
+        'event': event,
+        'task_id': task_id or task.pk,
+        'kanban_type': task.kanban_type,
+        'status': task.status,
+        'rank': task.rank,
+    }
+    get_event_backend().publish(tenant_channel(connection.schema_name), message)
+
+
+def release_db_connections():
+    """
+    Fecha as conexões do Django abertas antes do stream (middleware do tenant,
+    login): o SSE fica aberto por horas e não usa o banco. Nunca no meio de uma
+    transação.
+    """
+    for conn in connections.all(initialized_only=True):
+        if not conn.in_atomic_block:
+            conn.close()
+
+
+async def task_event_stream(schema_name, kanban_type):
+    """Gera o corpo do SSE: eventos do quadro + heartbeat, até o cliente desconectar."""
+    yield 'retry: 5000\n\n'
+
+    async with get_event_backend().subscribe(tenant_channel(schema_name)) as queue:
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+
+            if message.get('kanban_type') == kanban_type:
+                yield f"event: {message['event']}\ndata: {json.dumps(message)}\n\n"
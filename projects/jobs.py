@@ -0,0 +1,255 @@
+# projects/jobs.py
+"""
+Fila de tarefas em segundo plano no próprio Postgres (sem broker externo).
+
+Operações lentas (APIs das redes sociais, criação de schema, ...) não rodam
+mais dentro da request: a view enfileira e retorna. As tarefas ficam na tabela
+BackgroundJob (schema public) e são executadas pelo comando run_workers.
+
+    @job(max_attempts=3)
+    def discover_meta_accounts(client_id, intent):
+        ...
+
+    enqueue(discover_meta_accounts, args=[client.pk, intent])
+
+- A linha é gravada na transação de quem enfileirou: rollback = tarefa descartada.
+- A tarefa guarda o schema do tenant atual e roda dentro dele (schema_context).
+- Os workers pegam as próximas com UPDATE ... FOR UPDATE SKIP LOCKED: vários
+  processos (e máquinas) dividem a fila sem pegar a mesma tarefa.
+- Falhou: volta para a fila com espera crescente até esgotar max_attempts.
+- Argumentos precisam ser serializáveis em JSON (passe ids, não objetos) e
+  ficam gravados na tabela: nada de tokens ou senhas, a tarefa lê do banco.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import select
+import signal
+import socket
+import traceback
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django_tenants.utils import get_public_schema_name, schema_context
+
+from accounts.models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# Canal do NOTIFY que acorda os workers ociosos
+JOBS_CHANNEL = 'background_jobs'
+
+# Espera entre tentativas: 30s, 1min, 2min... até 1h
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 60 * 60
+
+
+def job(max_attempts=None, priority=0):
+    """Marca a função como tarefa de segundo plano (só funções marcadas são executadas)."""
+    def decorator(func):
+        func.job_max_attempts = max_attempts or settings.JOBS_MAX_ATTEMPTS
+        func.job_priority = priority
+        return func
+    return decorator
+
+
+def job_name(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def resolve(name):
+    func = import_string(name)
+    if not hasattr(func, 'job_max_attempts'):
+        raise ValueError(f'{name} não é uma tarefa (@job).')
+    return func
+
+
+def enqueue(func, args=(), kwargs=None, priority=None, run_at=None, schema_name=None):
+    """Enfileira `func(*args, **kwargs)` no schema atual (ou em `schema_name`)."""
+    if schema_name is None:
+        schema_name = getattr(connection, 'schema_name', '')
+    if schema_name == get_public_schema_name():
+        schema_name = ''
+    queued = BackgroundJob.objects.create(
+        task=job_name(func),
+        args=list(args),
+        kwargs=kwargs or {},
+        schema_name=schema_name,
+        priority=func.job_priority if priority is None else priority,
+        max_attempts=func.job_max_attempts,
+        run_at=run_at or timezone.now(),
+    )
+    # Entregue só no commit: acorda um worker parado no LISTEN
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [JOBS_CHANNEL, ''])
+    return queued
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'[:100]
+
+
+def claim(worker, limit=1):
+    """
+    Pega até `limit` tarefas vencidas, por prioridade, num único UPDATE. As
+    linhas travadas por outro worker são puladas (SKIP LOCKED).
+    """
+    table = BackgroundJob._meta.db_table
+    now = timezone.now()
+    with schema_context(get_public_schema_name()):
+        claimed = list(BackgroundJob.objects.raw(
+            f'UPDATE "{table}" SET status = %s, locked_at = %s, locked_by = %s, attempts = attempts + 1 '
+            f'WHERE id IN ('
+            f'  SELECT id FROM "{table}" WHERE status = %s AND run_at <= %s '
+            f'  ORDER BY priority DESC, run_at LIMIT %s FOR UPDATE SKIP LOCKED'
+            f') RETURNING *',
+            ['running', now, worker, 'queued', now, limit],
+        ))
+    # O RETURNING não preserva a ordem do SELECT
+    return sorted(claimed, key=lambda queued: (-queued.priority, queued.run_at))
+
+
+def run(queued):
+    """Executa a tarefa no schema dela. Retorna True se concluiu."""
+    try:
+        func = resolve(queued.task)
+        with schema_context(queued.schema_name or get_public_schema_name()):
+            func(*queued.args, **queued.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Tarefa %s #%s falhou (tentativa %s)', queued.task, queued.pk, queued.attempts)
+        with schema_context(get_public_schema_name()):
+            if queued.attempts >= queued.max_attempts:
+                BackgroundJob.objects.filter(pk=queued.pk).update(status='failed', last_error=error, locked_at=None)
+            else:
+                BackgroundJob.objects.filter(pk=queued.pk).update(
+                    status='queued', last_error=error, locked_at=None, locked_by='',
+                    run_at=timezone.now() + retry_delay(queued.attempts),
+                )
+        return False
+
+    with schema_context(get_public_schema_name()):
+        BackgroundJob.objects.filter(pk=queued.pk).delete()
+    return True
+
+
+def requeue_stale():
+    """
+    Tarefas 'running' há mais de JOBS_STALE_SECONDS (worker morreu): de volta
+    para a fila. A que já gastou todas as tentativas falha (uma tarefa que
+    derruba o worker não fica voltando para sempre). Retorna quantas voltaram.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOBS_STALE_SECONDS)
+    with schema_context(get_public_schema_name()):
+        stale = BackgroundJob.objects.filter(status='running', locked_at__lt=cutoff)
+        stale.filter(attempts__gte=F('max_attempts')).update(
+            status='failed', locked_at=None, last_error='Worker interrompido durante a execução (tentativas esgotadas).'
+        )
+        return stale.filter(attempts__lt=F('max_attempts')).update(
+            status='queued', locked_at=None, locked_by='', run_at=timezone.now()
+        )
+
+
+def listen():
+    """LISTEN na conexão do processo (refeito se o Django reconectar). Retorna a conexão crua."""
+    connection.ensure_connection()
+    raw = connection.connection
+    if getattr(connection, '_jobs_listening', None) is not raw:
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{JOBS_CHANNEL}"')
+        connection._jobs_listening = raw
+    return raw
+
+
+def wait_for_jobs(timeout):
+    """Dorme até chegar um NOTIFY de tarefa nova ou até `timeout` segundos."""
+    raw = listen()
+    # NOTIFYs recebidos durante outras queries já estão na lista
+    if not raw.notifies and select.select([raw], [], [], timeout)[0]:
+        raw.poll()
+    raw.notifies.clear()
+
+
+def close_stale_connections():
+    """
+    Como no fim de uma request (close_old_connections): descarta conexões
+    quebradas ou além do CONN_MAX_AGE. Nunca no meio de uma transação.
+    """
+    for conn in connections.all(initialized_only=True):
+        if not conn.in_atomic_block:
+            conn.close_if_unusable_or_obsolete()
+
+
+def work(worker, batch_size=1, sleep=5, burst=False, stop=None):
+    """Loop do worker. `burst`: termina quando a fila esvaziar. Retorna (ok, falhas)."""
+    done = failed = 0
+    last_stale_check = None
+    while not (stop and stop.is_set()):
+        now = timezone.now()
+        if last_stale_check is None or now - last_stale_check > timedelta(minutes=1):
+            # Worker parado também renova a conexão (o LISTEN é refeito no wait_for_jobs)
+            close_stale_connections()
+            requeue_stale()
+            last_stale_check = now
+
+        claimed = claim(worker, batch_size)
+        if not claimed:
+            if burst:
+                break
+            wait_for_jobs(sleep)
+            continue
+        for queued in claimed:
+            if run(queued):
+                done += 1
+            else:
+                failed += 1
+        close_stale_connections()
+    return done, failed
+
+
+def _process_main(batch_size, sleep, burst, stop, results):
+    # Com spawn/forkserver o processo começa do zero; com fork o setup já está feito
+    django.setup()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stop.set())
+    worker = worker_id()
+    done, failed = work(worker, batch_size, sleep, burst, stop)
+    results.put((worker, done, failed))
+
+
+def run_processes(processes, batch_size=1, sleep=5, burst=False, stop=None):
+    """
+    Roda `processes` workers em processos separados (cada um com a própria
+    conexão) e espera todos terminarem. `stop` (multiprocessing.Event) encerra
+    os workers depois da tarefa atual. Retorna [(worker, ok, falhas), ...].
+    """
+    context = multiprocessing.get_context()
+    stop = stop or context.Event()
+    results = context.Queue()
+    # Os filhos não podem herdar as conexões abertas do pai
+    connections.close_all()
+    children = [
+        context.Process(target=_process_main, args=(batch_size, sleep, burst, stop, results))
+        for _ in range(processes)
+    ]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join()
+
+    summary = []
+    while True:
+        try:
+            summary.append(results.get(timeout=0.1))
+        except queue.Empty:
+            return summary
@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django_tenants.utils import get_public_schema_name, get_tenant_model, schema_context
+
+from projects.management.tenant_command import TenantCommand
+from projects.models import MultipartUpload
+from projects.multipart import abort_upload, pending_uploads
+from projects.storage import schedule_deletes
+
+
+class Command(TenantCommand):
+    help = (
+        'Aborta uploads multipart parados há mais de --hours (partes órfãs no R2 '
+        'também são cobradas). Rode periodicamente (cron).'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--hours', type=int, default=settings.MEDIA_MULTIPART_STALE_HOURS,
+            help='Idade mínima (em horas) para considerar um upload parado.'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Só lista, sem abortar.')
+
+    def handle(self, *args, **options):
+        # Uploads abertos no bucket sem registro no banco (ex: registro apagado).
+        # Roda antes dos tenants: os registros ainda existem e separam o que é órfão.
+        if getattr(default_storage, 'bucket', None) is not None and not options['schema']:
+            self.abort_orphans(self.cutoff(options), options['dry_run'])
+        super().handle(*args, **options)
+
+    def cutoff(self, options):
+        return timezone.now() - timedelta(hours=options['hours'])
+
+    def abort_orphans(self, cutoff, dry_run):
+        known = set()
+        for tenant in get_tenant_model().objects.exclude(schema_name=get_public_schema_name()):
+            with schema_context(tenant.schema_name):
+                known.update(MultipartUpload.objects.values_list('upload_id', flat=True))
+
+        aborted = 0
+        for key, upload_id, initiated in pending_uploads(default_storage, initiated_before=cutoff):
+            if upload_id in known:
+                continue
+            self.stdout.write(f"órfão: {key} (iniciado em {initiated:%d/%m/%Y %H:%M})")
+            if not dry_run:
+                abort_upload(default_storage, key, upload_id)
+                aborted += 1
+        self.stdout.write(f"{aborted} uploads órfãos abortados")
+
+    def handle_tenant(self, tenant, **options):
+        has_bucket = getattr(default_storage, 'bucket', None) is not None
+        aborted = 0
+        for upload in MultipartUpload.objects.filter(created_at__lt=self.cutoff(options)):
+            self.stdout.write(f"{upload.key} ({upload.filename})")
+            if options['dry_run']:
+                continue
+            if has_bucket:
+                abort_upload(default_storage, upload.key, upload.upload_id)
+                # Concluído no bucket mas nunca registrado (o complete falhou depois)
+                schedule_deletes([upload.key])
+            aborted += 1
+            upload.delete()
+        return f"{aborted} uploads abortados"
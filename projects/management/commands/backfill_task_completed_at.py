@@ -0,0 +1,17 @@
+from django.db.models import F
+
+from projects.management.tenant_command import TenantCommand
+from projects.models import COMPLETED_STATUSES, Task
+
+
+class Command(TenantCommand):
+    help = (
+        'Preenche o completed_at das tarefas já concluídas antes do campo existir '
+        '(usa o updated_at, melhor estimativa disponível). Rode uma vez após o deploy.'
+    )
+
+    def handle_tenant(self, tenant, **options):
+        total = Task.objects.filter(status__in=COMPLETED_STATUSES, completed_at__isnull=True).update(
+            completed_at=F('updated_at')
+        )
+        return f"{total} tarefas preenchidas"
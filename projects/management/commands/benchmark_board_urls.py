@@ -0,0 +1,67 @@
+import statistics
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django_tenants.utils import get_tenant_model, schema_context
+
+from projects.models import Task
+from projects.storage import CachedURLS3Storage
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a serialização do quadro (Task.to_dict de cada card) com e sem o '
+        'cache de URLs assinadas do storage. Só leitura; rode em um tenant com dados reais.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', required=True, help='Schema (tenant) a medir.')
+        parser.add_argument('--rounds', type=int, default=20, help='Renderizações do quadro por cenário.')
+        parser.add_argument('--limit', type=int, default=500, help='Máximo de cards no quadro.')
+
+    def handle(self, *args, **options):
+        tenant = get_tenant_model().objects.filter(schema_name=options['schema']).first()
+        if tenant is None:
+            raise CommandError(f"Tenant '{options['schema']}' não encontrado.")
+        # default_storage é um LazyObject: os atributos lidos/gravados vão para o storage real
+        storage = default_storage
+        if not isinstance(storage, CachedURLS3Storage):
+            raise CommandError('O storage padrão não é o CachedURLS3Storage (STORAGES["default"]).')
+        if not storage._signs_urls():
+            self.stdout.write(self.style.WARNING(
+                'Atenção: com custom_domain e sem CloudFront signer as URLs não são assinadas '
+                '(o cache fica de fora e os dois cenários devem empatar).'
+            ))
+
+        with schema_context(tenant.schema_name):
+            # Os cards já carregados: mede só a serialização (onde as URLs são geradas)
+            tasks = list(Task.objects.for_board()[:options['limit']])
+            if not tasks:
+                raise CommandError('Nenhuma tarefa neste tenant.')
+
+            storage.url_cache_enabled = False
+            uncached = self.measure(tasks, options['rounds'])
+
+            storage.url_cache_enabled = True
+            cold = self.measure(tasks, 1)
+            warm = self.measure(tasks, options['rounds'])
+
+        self.stdout.write(f"{len(tasks)} cards por renderização")
+        self.report('sem cache', uncached)
+        self.report('cache frio (1ª renderização)', cold)
+        self.report('cache quente', warm)
+
+    def measure(self, tasks, rounds):
+        samples = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for task in tasks:
+                task.to_dict()
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    def report(self, label, samples):
+        times = sorted(samples)
+        p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+        self.stdout.write(f"{label}: mediana {statistics.median(times):.2f} ms | p95 {p95:.2f} ms")
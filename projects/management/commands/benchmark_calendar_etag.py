@@ -0,0 +1,77 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.utils import timezone
+from django_tenants.utils import get_tenant_model, schema_context
+
+from accounts.models import CustomUser
+from projects.views import get_calendar_events
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a troca repetida de mês no calendário com e sem GET condicional '
+        '(If-None-Match). Só leitura; rode em um tenant com dados reais.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', required=True, help='Schema (tenant) a medir.')
+        parser.add_argument('--rounds', type=int, default=20, help='Voltas pelos meses.')
+        parser.add_argument('--months', type=int, default=3, help='Meses alternados por volta.')
+
+    def handle(self, *args, **options):
+        tenant = get_tenant_model().objects.filter(schema_name=options['schema']).first()
+        if tenant is None:
+            raise CommandError(f"Tenant '{options['schema']}' não encontrado.")
+
+        with schema_context(tenant.schema_name):
+            user = CustomUser.objects.filter(agency=tenant).first() or CustomUser.objects.first()
+            if user is None:
+                raise CommandError('Nenhum usuário para autenticar as requisições.')
+
+            today = timezone.now()
+            months = []
+            for offset in range(options['months']):
+                month = (today.month - 1 + offset) % 12 + 1
+                months.append((today.year + (today.month - 1 + offset) // 12, month))
+
+            factory = RequestFactory()
+            etags = {}
+            full, conditional = [], []
+
+            for _ in range(options['rounds']):
+                for year, month in months:
+                    headers = {}
+                    if (year, month) in etags:
+                        headers['HTTP_IF_NONE_MATCH'] = etags[(year, month)]
+                    request = factory.get('/api/calendar/events/', {'year': year, 'month': month}, **headers)
+                    request.user = user
+                    request.tenant = tenant
+
+                    start = time.perf_counter()
+                    response = get_calendar_events(request)
+                    elapsed = (time.perf_counter() - start) * 1000
+
+                    if response.status_code == 304:
+                        conditional.append((elapsed, 0))
+                    else:
+                        full.append((elapsed, len(response.content)))
+                        etags[(year, month)] = response['ETag']
+
+        self.report('200 (payload completo)', full)
+        self.report('304 (If-None-Match)', conditional)
+
+    def report(self, label, samples):
+        if not samples:
+            self.stdout.write(f"{label}: sem amostras")
+            return
+        times = sorted(ms for ms, size in samples)
+        sizes = [size for ms, size in samples]
+        p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+        self.stdout.write(
+            f"{label}: {len(samples)} req | mediana {statistics.median(times):.2f} ms | "
+            f"p95 {p95:.2f} ms | "
+            f"{statistics.mean(sizes):.0f} bytes/resposta"
+        )
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django_tenants.utils import get_public_schema_name, schema_context
+
+from accounts.models import BackgroundJob
+from projects.jobs import enqueue, job, job_name, run_processes, work, worker_id
+
+
+@job(max_attempts=1)
+def noop_job(index=0):
+    """ Tarefa vazia: mede só o custo da fila (claim + execução + remoção) """
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a vazão da fila de tarefas (BackgroundJob) com tarefas vazias: '
+        'enqueue() e run_workers em burst com N processos e lotes de tamanhos diferentes. '
+        'Grava e apaga linhas na tabela real; rode com os workers de produção parados.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=2000, help='Tarefas por cenário.')
+        parser.add_argument('--processes', default='1,2,4', help='Quantidades de processos (separadas por vírgula).')
+        parser.add_argument('--batch-sizes', default='1,10', help='Tamanhos de lote (separados por vírgula).')
+
+    def handle(self, *args, **options):
+        total = options['jobs']
+        process_counts = [int(value) for value in options['processes'].split(',')]
+        batch_sizes = [int(value) for value in options['batch_sizes'].split(',')]
+
+        with schema_context(get_public_schema_name()):
+            start = time.perf_counter()
+            for index in range(total):
+                enqueue(noop_job, kwargs={'index': index})
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"enqueue(): {total / elapsed:.0f} tarefas/s")
+            self.clear()
+
+            for processes in process_counts:
+                for batch_size in batch_sizes:
+                    self.fill(total)
+                    start = time.perf_counter()
+                    if processes <= 1:
+                        work(worker_id(), batch_size, burst=True)
+                    else:
+                        run_processes(processes, batch_size, burst=True)
+                    elapsed = time.perf_counter() - start
+                    left = self.clear()
+                    self.stdout.write(
+                        f"{processes} processo(s), lote {batch_size}: {(total - left) / elapsed:.0f} tarefas/s"
+                        + (f" ({left} não executadas)" if left else '')
+                    )
+
+    def fill(self, total):
+        BackgroundJob.objects.bulk_create(
+            [BackgroundJob(task=job_name(noop_job), kwargs={'index': index}, max_attempts=1) for index in range(total)],
+            batch_size=1000,
+        )
+
+    def clear(self):
+        return BackgroundJob.objects.filter(task=job_name(noop_job)).delete()[0]
@@ -0,0 +1,99 @@
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from projects.zipstream import stream_media_zip
+
+
+class StandInBody:
+    """Corpo do GET: cada read() devolve uma cópia nova, como bytes vindos da rede."""
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.position = 0
+
+    def read(self, amount=-1):
+        end = len(self.data) if amount is None or amount < 0 else self.position + amount
+        chunk = bytes(self.data[self.position:end])
+        self.position += len(chunk)
+        return chunk
+
+    def close(self):
+        pass
+
+
+class StandInBucket:
+    """
+    Substituto local do bucket R2 (mesma interface usada por open_stream):
+    cada GET espera `latency` segundos antes do primeiro byte, como um objeto remoto.
+    """
+
+    def __init__(self, objects, latency):
+        self.objects = objects
+        self.latency = latency
+
+    def Object(self, key):
+        bucket = self
+
+        class _Object:
+            def get(self):
+                time.sleep(bucket.latency)
+                return {'Body': StandInBody(bucket.objects[key])}
+
+        return _Object()
+
+
+class StandInStorage:
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def _normalize_name(self, name):
+        return name
+
+
+class Command(BaseCommand):
+    help = 'Compara o zip em lote sequencial x com prefetch paralelo, contra um R2 simulado com latência.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=40)
+        parser.add_argument('--size-kb', type=int, default=512, help='Tamanho de cada arquivo.')
+        parser.add_argument('--latency-ms', type=int, default=60, help='Latência até o primeiro byte por GET.')
+        parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8])
+        parser.add_argument('--max-mb', type=int, default=64, help='Limite de memória do prefetch.')
+
+    def handle(self, *args, **options):
+        size = options['size_kb'] * 1024
+        objects = {f'bench/{i}.jpg': bytes([i % 256]) * size for i in range(options['files'])}
+        storage = StandInStorage(StandInBucket(objects, options['latency_ms'] / 1000))
+        now = timezone.now()
+        media_files = [
+            SimpleNamespace(
+                filename=name.split('/')[-1], uploaded_at=now, file_size=size,
+                file=SimpleNamespace(storage=storage, name=name),
+            )
+            for name in objects
+        ]
+        total_mb = size * len(media_files) / 1024 / 1024
+
+        self.stdout.write(
+            f"{len(media_files)} arquivos x {options['size_kb']} KB, "
+            f"latência {options['latency_ms']} ms por objeto"
+        )
+        # Sequencial: limite de 1 byte faz todo arquivo ser lido na vez dele (comportamento antigo)
+        runs = [('sequencial', 1, 1)] + [
+            (f'prefetch x{w}', w, options['max_mb'] * 1024 * 1024) for w in options['workers']
+        ]
+        for label, workers, max_bytes in runs:
+            tracemalloc.start()
+            start = time.perf_counter()
+            written = sum(len(chunk) for chunk in stream_media_zip(media_files, workers=workers, max_bytes=max_bytes))
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.stdout.write(
+                f"  {label:<14} {elapsed:6.2f} s | {total_mb / elapsed:7.1f} MB/s | "
+                f"pico de memória {peak / 1024 / 1024:6.1f} MB | zip {written / 1024 / 1024:.1f} MB"
+            )
@@ -0,0 +1,33 @@
+from projects.management.tenant_command import TenantCommand
+from projects.models import MediaFile
+
+
+class Command(TenantCommand):
+    help = (
+        'Calcula o SHA-256 dos arquivos da Central de Mídia que ainda não têm hash '
+        '(legado e uploads diretos grandes) e junta as cópias repetidas em um único '
+        'objeto no R2. Pode rodar periodicamente (cron).'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--limit', type=int, help='Máximo de arquivos por tenant nesta execução.')
+
+    def handle_tenant(self, tenant, **options):
+        files = MediaFile.objects.filter(blob__isnull=True).exclude(file='').order_by('id')
+        if options['limit']:
+            files = files[:options['limit']]
+
+        linked = shared = 0
+        for media_file in files.iterator():
+            key = media_file.file.name
+            try:
+                media_file.deduplicate()
+            except Exception as e:
+                self.stderr.write(f"erro em {key}: {e}")
+                continue
+            linked += 1
+            if media_file.file.name != key:
+                shared += 1
+
+        return f"{linked} arquivos com hash, {shared} cópias removidas"
@@ -0,0 +1,79 @@
+import time
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import PendingObjectDelete
+from projects.storage import DELETE_BATCH_SIZE, delete_objects
+
+# Espera entre tentativas de uma chave que falhou: 30s, 1min, 2min... até 1h
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 60 * 60
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+class Command(BaseCommand):
+    help = (
+        'Drena a fila de remoção do R2 (PendingObjectDelete) com DeleteObjects em '
+        'lotes de até 1000 chaves. Falhas são reagendadas com espera crescente. '
+        'Use --loop para rodar como worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DELETE_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Continua rodando, aguardando novas chaves.')
+        parser.add_argument('--sleep', type=float, default=5, help='Espera (s) com a fila vazia no modo --loop.')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, min(options['batch_size'], DELETE_BATCH_SIZE))
+        total_deleted = total_failed = 0
+
+        while True:
+            deleted, failed = self.drain_batch(batch_size)
+            total_deleted += deleted
+            total_failed += failed
+            if deleted or failed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_deleted} objetos removidos, {total_failed} falhas reagendadas.'
+        ))
+
+    def drain_batch(self, batch_size):
+        """Remove um lote. Retorna (removidos, falhas). Vários workers podem rodar juntos."""
+        now = timezone.now()
+        with transaction.atomic():
+            batch = list(
+                PendingObjectDelete.objects.select_for_update(skip_locked=True)
+                .filter(next_attempt_at__lte=now)
+                .order_by('next_attempt_at', 'id')[:batch_size]
+            )
+            if not batch:
+                return 0, 0
+
+            keys = sorted({pending.key for pending in batch})
+            try:
+                errors = delete_objects(default_storage, keys)
+            except Exception as e:
+                errors = {key: str(e) for key in keys}
+
+            failed = [pending for pending in batch if pending.key in errors]
+            for pending in failed:
+                pending.attempts += 1
+                pending.next_attempt_at = now + retry_delay(pending.attempts)
+                pending.last_error = errors[pending.key][:1000]
+                self.stderr.write(f"  falhou ({pending.attempts}x): {pending.key}: {pending.last_error}")
+
+            PendingObjectDelete.objects.filter(pk__in=[p.pk for p in batch if p.key not in errors]).delete()
+            PendingObjectDelete.objects.bulk_update(failed, ['attempts', 'next_attempt_at', 'last_error'])
+
+        return len(batch) - len(failed), len(failed)
@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+
+from projects.derivatives import is_image_name, run_in_thread
+from projects.management.tenant_command import TenantCommand
+from projects.models import DERIVATIVE_FIELDS
+
+
+class Command(TenantCommand):
+    help = (
+        'Gera a miniatura/prévia WebP das imagens que ainda não têm (artes, '
+        'calendário, posts e Central de Mídia). Rode uma vez após o deploy.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--threads', type=int, default=4, help='Imagens processadas em paralelo por tenant.')
+        parser.add_argument('--retry-errors', action='store_true', help='Tenta de novo as que falharam antes.')
+
+    def handle_tenant(self, tenant, **options):
+        pending = []
+        for model, (field_name, json_field) in DERIVATIVE_FIELDS.items():
+            rows = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            for pk, name, derivatives in rows.values_list('pk', field_name, json_field).iterator():
+                if not is_image_name(name):
+                    continue
+                if derivatives.get('source') == name:
+                    if not (options['retry_errors'] and 'error' in derivatives):
+                        continue
+                    model.objects.filter(pk=pk).update(**{json_field: {}})
+                pending.append((model, pk, field_name, json_field))
+
+        schema_name = connection.schema_name
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            results = list(pool.map(lambda job: run_in_thread(*job, schema_name), pending))
+
+        failed = sum(1 for result in results if not result or 'error' in result)
+        for (model, pk, *_), result in zip(pending, results):
+            if not result or 'error' in result:
+                self.stdout.write(f"  ! {model.__name__} #{pk}: {(result or {}).get('error', 'erro inesperado')}")
+        return f"{len(pending) - failed} imagens processadas, {failed} falhas"
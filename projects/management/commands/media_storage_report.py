@@ -0,0 +1,29 @@
+from django.db.models import Count, Sum
+
+from projects.management.tenant_command import TenantCommand
+from projects.models import MediaBlob, MediaFile
+
+
+def _mb(value):
+    return f"{(value or 0) / (1024 * 1024):,.1f} MB"
+
+
+class Command(TenantCommand):
+    help = 'Relatório de armazenamento da Central de Mídia por tenant (espaço economizado pela deduplicação).'
+
+    def handle_tenant(self, tenant, **options):
+        row = self.tenant_usage()
+        percent = 100 * row['saved'] / row['logical'] if row['logical'] else 0
+        return (
+            f"{row['files']} arquivos, lógico {_mb(row['logical'])}, no R2 {_mb(row['stored'])}, "
+            f"economia {_mb(row['saved'])} ({percent:.1f}%)"
+        )
+
+    def tenant_usage(self):
+        """Bytes vistos pelos usuários (lógico) x bytes realmente guardados no R2."""
+        files = MediaFile.objects.aggregate(files=Count('id'), logical=Sum('file_size'))
+        blobs = MediaBlob.objects.aggregate(size=Sum('size'))['size'] or 0
+        loose = MediaFile.objects.filter(blob__isnull=True).aggregate(size=Sum('file_size'))['size'] or 0
+        logical = files['logical'] or 0
+        stored = blobs + loose
+        return {'files': files['files'], 'logical': logical, 'stored': stored, 'saved': logical - stored}
@@ -0,0 +1,29 @@
+from projects.management.tenant_command import TenantCommand
+from projects.models import Tag, Task, normalize_tag_names
+
+
+class Command(TenantCommand):
+    help = (
+        'Converte o campo legado Task.tags ("Dev,Financeiro") para a relação '
+        'indexada Task.tag_set. Pode ser executado mais de uma vez.'
+    )
+
+    def handle_tenant(self, tenant, **options):
+        legacy = (
+            Task.objects.exclude(tags__isnull=True).exclude(tags='')
+            .values_list('id', 'tags')
+        )
+        task_tags = {task_id: normalize_tag_names(tags.split(',')) for task_id, tags in legacy.iterator()}
+        names = {name for tag_names in task_tags.values() for name in tag_names}
+
+        Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+        tag_ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+
+        Through = Task.tag_set.through
+        links = [
+            Through(task_id=task_id, tag_id=tag_ids[name])
+            for task_id, tag_names in task_tags.items()
+            for name in tag_names
+        ]
+        Through.objects.bulk_create(links, ignore_conflicts=True, batch_size=1000)
+        return f"{len(task_tags)} tarefas, {len(links)} vínculos"
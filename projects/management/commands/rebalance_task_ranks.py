@@ -0,0 +1,36 @@
+from django.db.models import Q
+from django.db.models.functions import Length
+
+from projects.management.tenant_command import TenantCommand
+from projects.models import Task
+from projects.ranking import RANK_REBALANCE_LENGTH
+
+
+class Command(TenantCommand):
+    help = (
+        'Redistribui os ranks do Kanban (colunas com chaves longas ou sem rank). '
+        'Rode uma vez após o deploy para migrar o campo inteiro `order` e depois '
+        'periodicamente (cron) como rebalance em segundo plano.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--max-length', type=int, default=RANK_REBALANCE_LENGTH // 2,
+            help='Rebalanceia colunas com algum rank maior que isso.'
+        )
+        parser.add_argument('--all', action='store_true', help='Rebalanceia todas as colunas.')
+
+    def handle_tenant(self, tenant, **options):
+        tasks = Task.objects.all()
+        if not options['all']:
+            # Só colunas que precisam: sem rank (legado) ou com chave longa
+            tasks = tasks.annotate(rank_length=Length('rank')).filter(
+                Q(rank='') | Q(rank_length__gt=options['max_length'])
+            )
+
+        columns = tasks.order_by().values_list('kanban_type', 'status').distinct()
+        for kanban_type, status in columns:
+            count = Task.objects.rebalance_ranks(kanban_type, status)
+            self.stdout.write(f"{kanban_type}/{status} ({count} cards)")
+        return f"{len(columns)} colunas rebalanceadas"
@@ -0,0 +1,25 @@
+from django.db import connection
+
+from accounts.models import DuePost
+from projects.management.tenant_command import TenantCommand
+from projects.models import Post
+
+
+class Command(TenantCommand):
+    help = (
+        'Reconstrói o índice global de posts agendados (DuePost) a partir dos posts de '
+        'cada tenant. Necessário só na implantação ou se o índice ficar inconsistente.'
+    )
+
+    def handle_tenant(self, tenant, **options):
+        scheduled = Post.objects.filter(approval_status='approved_to_schedule', scheduled_for__isnull=False)
+        rows = [
+            DuePost(schema_name=connection.schema_name, post_id=pk, scheduled_for=scheduled_for)
+            for pk, scheduled_for in scheduled.values_list('pk', 'scheduled_for')
+        ]
+        DuePost.objects.filter(schema_name=connection.schema_name).exclude(post_id__in=[row.post_id for row in rows]).delete()
+        DuePost.objects.bulk_create(
+            rows, batch_size=1000,
+            update_conflicts=True, unique_fields=['schema_name', 'post_id'], update_fields=['scheduled_for'],
+        )
+        return f"{len(rows)} posts agendados"
@@ -0,0 +1,13 @@
+from projects.management.tenant_command import TenantCommand
+from projects.models import MediaFolder
+
+
+class Command(TenantCommand):
+    help = (
+        'Recalcula o caminho materializado (MediaFolder.path) de todas as pastas. '
+        'Rode uma vez após o deploy para preencher as árvores existentes.'
+    )
+
+    def handle_tenant(self, tenant, **options):
+        count = MediaFolder.rebuild_paths()
+        return f"{count} pastas atualizadas"
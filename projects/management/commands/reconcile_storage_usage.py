@@ -0,0 +1,18 @@
+from projects.management.tenant_command import TenantCommand
+from projects.models import StorageUsage
+
+
+class Command(TenantCommand):
+    help = (
+        'Recalcula os contadores de uso da Central de Mídia (pastas, clientes e '
+        'tenant) a partir dos arquivos. Rode periodicamente (cron) e após o deploy '
+        'para preencher os contadores existentes.'
+    )
+
+    def handle_tenant(self, tenant, **options):
+        folder_drift, client_drift = StorageUsage.reconcile()
+        usage = StorageUsage.current()
+        return (
+            f"{usage.files} arquivos, {usage.bytes} bytes "
+            f"({folder_drift} pastas e {client_drift} clientes corrigidos)"
+        )
@@ -0,0 +1,39 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from projects.publishing import dispatch_due_posts
+
+
+class Command(BaseCommand):
+    help = (
+        'Agendador de posts: despacha os posts vencidos (Post.scheduled_for) de todas as '
+        'agências para a fila de publicação. Pode rodar mais de uma instância.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Fica rodando (uma rodada a cada --interval).')
+        parser.add_argument('--interval', type=float, default=settings.SCHEDULER_INTERVAL, help='Segundos entre rodadas.')
+        parser.add_argument('--batch-size', type=int, default=settings.SCHEDULER_BATCH_SIZE, help='Posts por rodada.')
+
+    def handle(self, *args, **options):
+        stopping = []
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stopping.append(True))
+
+        total = 0
+        while not stopping:
+            started = time.monotonic()
+            dispatched = dispatch_due_posts(limit=options['batch_size'])
+            if dispatched:
+                self.stdout.write(f"{dispatched} post(s) despachado(s)")
+            total += dispatched
+            if not options['loop']:
+                break
+            # Rodada cheia: ainda há vencidos, segue sem esperar
+            if dispatched < options['batch_size']:
+                time.sleep(max(0, options['interval'] - (time.monotonic() - started)))
+
+        self.stdout.write(self.style.SUCCESS(f"Agendador encerrado: {total} post(s) despachado(s)."))
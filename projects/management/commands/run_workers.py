@@ -0,0 +1,37 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+
+from projects.jobs import run_processes, work, worker_id
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa as tarefas em segundo plano (BackgroundJob) com N processos. '
+        'Fica rodando até SIGTERM/Ctrl+C; cada processo termina a tarefa atual antes de sair.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Processos worker (1 = no próprio processo).')
+        parser.add_argument('--batch-size', type=int, default=1, help='Tarefas pegas por vez em cada worker.')
+        parser.add_argument('--sleep', type=float, default=5, help='Espera máxima (s) com a fila vazia.')
+        parser.add_argument('--burst', action='store_true', help='Sai quando a fila esvaziar.')
+
+    def handle(self, *args, **options):
+        stop = multiprocessing.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+
+        if options['processes'] <= 1:
+            worker = worker_id()
+            done, failed = work(worker, options['batch_size'], options['sleep'], options['burst'], stop)
+            summary = [(worker, done, failed)]
+        else:
+            summary = run_processes(
+                options['processes'], options['batch_size'], options['sleep'], options['burst'], stop
+            )
+
+        for worker, done, failed in summary:
+            self.stdout.write(f"  {worker}: {done} concluídas, {failed} falhas")
+        self.stdout.write(self.style.SUCCESS('Workers encerrados.'))
@@ -1,48 +1,94 @@
-import os
-from django.core.management.base import BaseCommand
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
 from django.core.files.base import ContentFile
-from projects.models import Client, MediaFolder, MediaFile
-
-class Command(BaseCommand):
-    help = 'Cria pastas padrão para todos os clientes existentes e sincroniza com R2'
-
-    def handle(self, *args, **kwargs):
-        clients = Client.objects.all()
-        
-        self.stdout.write(f"Encontrados {clients.count()} clientes. Iniciando sincronização...")
-
-        # Defina aqui as pastas padrão que todo cliente deve ter
-        DEFAULT_FOLDERS = ['Geral', 'Briefing', 'Entregas', 'Fotos Brutas']
-
-        for client in clients:
-            self.stdout.write(f"Processando: {client.name}...")
-            
-            for folder_name in DEFAULT_FOLDERS:
-                # 1. Cria a pasta no Banco de Dados (se não existir)
-                folder_obj, created = MediaFolder.objects.get_or_create(
-                    name=folder_name,
-                    client=client,
-                    parent=None # Raiz do cliente
+from django.db import models, transaction
+from django.db.models.functions import Cast, Concat
+
+from projects.management.tenant_command import TenantCommand
+from projects.models import Client, MediaFile, MediaFolder, StorageUsage
+from projects.storage import schedule_deletes
+
+# Defina aqui as pastas padrão que todo cliente deve ter
+DEFAULT_FOLDERS = ['Geral', 'Briefing', 'Entregas', 'Fotos Brutas']
+
+# Uploads simultâneos dos arquivos .keep (por tenant)
+KEEP_UPLOAD_THREADS = 8
+
+
+class Command(TenantCommand):
+    help = (
+        'Cria as pastas padrão para todos os clientes de todos os tenants e '
+        'sincroniza com o R2 (um arquivo .keep por pasta nova).'
+    )
+
+    def handle_tenant(self, tenant, **options):
+        existing = set(
+            MediaFolder.objects.filter(parent=None, name__in=DEFAULT_FOLDERS).values_list('client_id', 'name')
+        )
+        folders = [
+            MediaFolder(name=folder_name, client=client)
+            for client in Client.objects.only('id', 'name').order_by('id')
+            for folder_name in DEFAULT_FOLDERS
+            if (client.pk, folder_name) not in existing
+        ]
+        if not folders:
+            return 'nada a criar'
+
+        # O R2/S3 não tem "pastas vazias": um arquivo oculto .keep marca a pasta
+        # para aparecer em clients S3. Os uploads vão em paralelo, antes do banco.
+        keeps = [MediaFile(folder=folder, filename='.keep', file_size=0) for folder in folders]
+        keys = self.upload_keeps(keeps)
+        for folder, keep in zip(folders, keeps):
+            folder.total_files = 1 if keep.file else 0
+
+        try:
+            with transaction.atomic():
+                MediaFolder.objects.bulk_create(folders)
+                # bulk_create não passa pelo save(): pastas raiz têm caminho "/<id>/"
+                MediaFolder.objects.filter(pk__in=[f.pk for f in folders]).update(
+                    path=Concat(models.Value('/'), Cast('pk', models.CharField()), models.Value('/'))
                 )
+                for keep in keeps:
+                    keep.folder_id = keep.folder.pk
+                MediaFile.objects.bulk_create([keep for keep in keeps if keep.file])
+                self.add_usage(folders)
+        except Exception:
+            # Os .keep já subiram: vão para a fila de remoção
+            schedule_deletes(keys)
+            raise
+
+        return f"{len(folders)} pastas criadas, {len(keys)} sincronizadas no R2"
+
+    def upload_keeps(self, keeps):
+        """Envia os .keep em paralelo. Os que falharem ficam sem arquivo (só a pasta é criada)."""
+        field = MediaFile._meta.get_field('file')
+        # O nome depende do tenant atual (connection): calculado aqui, fora das threads
+        names = [field.generate_filename(keep, '.keep') for keep in keeps]
+
+        def upload(name):
+            try:
+                return field.storage.save(name, ContentFile(b''))
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f"  ! Erro ao sync R2 ({name}): {e}"))
+                return None
+
+        with ThreadPoolExecutor(max_workers=KEEP_UPLOAD_THREADS) as pool:
+            saved = list(pool.map(upload, names))
+        for keep, key in zip(keeps, saved):
+            keep.file.name = key or ''
+        return [key for key in saved if key]
 
-                if created:
-                    self.stdout.write(f"  > Pasta '{folder_name}' criada no Banco.")
-                    
-                    # 2. (Opcional) Força a criação no Cloudflare R2
-                    # O R2/S3 não tem "pastas vazias", então criamos um arquivo oculto .keep
-                    # para garantir que a estrutura de diretórios exista visualmente em alguns clients S3.
-                    try:
-                        dummy_file = ContentFile(b"", name=".keep")
-                        
-                        # Cria um arquivo "fantasma" para marcar o território no R2
-                        MediaFile.objects.create(
-                            folder=folder_obj,
-                            file=dummy_file,
-                            filename=".keep",
-                            file_size=0
-                        )
-                        self.stdout.write(f"  > Pasta '{folder_name}' sincronizada no R2.")
-                    except Exception as e:
-                        self.stdout.write(self.style.WARNING(f"  ! Erro ao sync R2: {e}"))
-
-        self.stdout.write(self.style.SUCCESS('Sincronização concluída com sucesso!'))
\ No newline at end of file
+    def add_usage(self, folders):
+        """Contadores de uso (bulk_create não dispara os signals): um UPDATE por tabela."""
+        per_client = Counter()
+        for folder in folders:
+            per_client[folder.client_id] += folder.total_files
+        per_client = {client_id: count for client_id, count in per_client.items() if count}
+        if not per_client:
+            return
+        Client.objects.filter(pk__in=per_client).update(media_files=models.F('media_files') + models.Case(
+            *(models.When(pk=client_id, then=models.Value(count)) for client_id, count in per_client.items()),
+            output_field=models.IntegerField(),
+        ))
+        StorageUsage.add([], None, sum(per_client.values()), 0)
@@ -0,0 +1,26 @@
+from django.db.models import Max
+
+from projects.management.tenant_command import TenantCommand
+from projects.models import Task, task_search_vector
+
+
+class Command(TenantCommand):
+    help = (
+        'Recalcula o search_vector (busca textual) das tarefas. Rode após o deploy '
+        'para preencher as tarefas existentes; depois o signal mantém atualizado.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--batch-size', type=int, default=5000, help='Tarefas por UPDATE.')
+
+    def handle_tenant(self, tenant, **options):
+        batch_size = options['batch_size']
+        # Lotes por faixa de id: transações curtas mesmo com centenas de milhares de linhas
+        last_id = Task.objects.aggregate(last=Max('id'))['last'] or 0
+        total = 0
+        for start in range(0, last_id + 1, batch_size):
+            total += Task.objects.filter(id__gte=start, id__lt=start + batch_size).update(
+                search_vector=task_search_vector()
+            )
+        return f"{total} tarefas indexadas"
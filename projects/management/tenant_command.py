@@ -0,0 +1,109 @@
+# projects/management/tenant_command.py
+"""
+Base para comandos que rodam em todos os tenants.
+
+Cada schema vira uma tarefa de um pool de processos: um worker processa um
+schema por vez, com a própria conexão ao banco. O comando filho só implementa
+handle_tenant(tenant, **options), que já roda dentro do schema do tenant. A
+saída de cada tenant é juntada e impressa com o progresso; tenants com erro
+não interrompem os outros e aparecem no relatório final.
+
+    class Command(TenantCommand):
+        def handle_tenant(self, tenant, **options):
+            ...
+            return '12 pastas criadas'   # resumo da linha de progresso
+"""
+import io
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django_tenants.utils import get_public_schema_name, get_tenant_model, tenant_context
+
+# Opções que não passam para os workers (não são serializáveis)
+LOCAL_OPTIONS = ('stdout', 'stderr')
+
+
+def _init_worker():
+    # Com spawn/forkserver o processo começa do zero; com fork o setup já está feito
+    django.setup()
+
+
+def _run_tenant(command_class, schema_name, options):
+    """Roda handle_tenant em um schema. Executa no worker (ou no próprio processo)."""
+    stdout, stderr = io.StringIO(), io.StringIO()
+    command = command_class(stdout=stdout, stderr=stderr)
+    started = time.monotonic()
+    result = {'schema': schema_name, 'ok': True, 'summary': '', 'error': ''}
+    try:
+        tenant = get_tenant_model().objects.get(schema_name=schema_name)
+        with tenant_context(tenant):
+            result['summary'] = command.handle_tenant(tenant, **options) or ''
+    except Exception:
+        result.update(ok=False, error=traceback.format_exc())
+    result.update(output=stdout.getvalue(), errors=stderr.getvalue(), elapsed=time.monotonic() - started)
+    return result
+
+
+class TenantCommand(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', action='append', help='Processa apenas este schema (pode repetir).')
+        parser.add_argument(
+            '--workers', type=int, default=settings.TENANT_COMMAND_WORKERS,
+            help='Processos em paralelo (1 = sequencial, no próprio processo).'
+        )
+
+    def handle_tenant(self, tenant, **options):
+        raise NotImplementedError('Subclasses de TenantCommand devem implementar handle_tenant().')
+
+    def handle(self, *args, **options):
+        tenants = get_tenant_model().objects.exclude(schema_name=get_public_schema_name())
+        if options['schema']:
+            tenants = tenants.filter(schema_name__in=options['schema'])
+        schemas = list(tenants.order_by('schema_name').values_list('schema_name', flat=True))
+        task_options = {k: v for k, v in options.items() if k not in LOCAL_OPTIONS}
+
+        failed = []
+        for done, result in enumerate(self.run_tenants(schemas, task_options), 1):
+            self.report(result, done, len(schemas))
+            if not result['ok']:
+                failed.append(result)
+
+        if failed:
+            self.stderr.write(f"\n{len(failed)} de {len(schemas)} tenants falharam:")
+            for result in failed:
+                self.stderr.write(f"  {result['schema']}: {result['error'].strip().splitlines()[-1]}")
+            raise CommandError(f"{len(failed)} tenants falharam.")
+        self.stdout.write(self.style.SUCCESS(f"{len(schemas)} tenants processados."))
+
+    def run_tenants(self, schemas, options):
+        """Gera o resultado de cada schema na ordem em que terminam."""
+        workers = min(options['workers'], len(schemas))
+        if workers <= 1:
+            for schema_name in schemas:
+                yield _run_tenant(type(self), schema_name, options)
+            return
+
+        # Os filhos não podem herdar as conexões abertas do pai
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(_run_tenant, type(self), schema_name, options) for schema_name in schemas]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def report(self, result, done, total):
+        status = 'ok' if result['ok'] else self.style.ERROR('ERRO')
+        line = f"[{done}/{total}] {result['schema']}: {status} ({result['elapsed']:.1f}s)"
+        if result['summary']:
+            line += f" {result['summary']}"
+        self.stdout.write(line)
+        for text in (result['output'], result['errors']):
+            for output_line in text.splitlines():
+                self.stdout.write(f"    {output_line}")
+        if not result['ok']:
+            self.stderr.write(result['error'])
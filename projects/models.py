@@ -1,12 +1,28 @@
-from django.db import models
+from django.db import connection, models, transaction
 from django.conf import settings
 import secrets
 import os
 import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
 from django.utils.text import slugify
-from django.db.models.signals import post_delete
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    SearchHeadline, SearchQuery, SearchRank, SearchVector, SearchVectorField
+)
+from django.db.models.functions import Coalesce, Concat, Substr
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.utils import timezone
+from django.utils.html import escape
+from django_tenants.utils import schema_context
+
+from accounts.models import DuePost
+
+from .ranking import RANK_REBALANCE_LENGTH, lock_column, rank_after, rank_between, spaced_ranks
+from .derivatives import derivative_keys, derivative_url, is_image_name, schedule_derivatives
+from .storage import STREAM_CHUNK_SIZE, open_stream, schedule_deletes, sha256_hexdigest
 
 # ==============================================================================
 # 1. ESCOLHAS GLOBAIS E CONSTANTES (KANBAN & REDES)
@@ -33,6 +49,26 @@ ALL_STATUS_CHOICES = [
     ('scheduled', '6. Agendado/Finalizado'),
 ]
 
+# Status que contam como "concluído" nas métricas (Geral e Operacional)
+COMPLETED_STATUSES = ('done', 'scheduled')
+
+# Colunas exibidas em cada quadro (ordem da esquerda para a direita).
+# A primeira coluna recebe tarefas com status legado/desconhecido.
+GENERAL_KANBAN_STAGES = [
+    ('todo', 'A Fazer'),
+    ('doing', 'Em Andamento'),
+    ('done', 'Concluído'),
+]
+
+OPERATIONAL_KANBAN_STAGES = [
+    ('briefing', 'Briefing'),
+    ('copy', 'Copy'),
+    ('design', 'Design'),
+    ('review_internal', 'Aprovação Interna'),
+    ('review_client', 'Aprovação Cliente'),
+    ('scheduled', 'Agendado'),
+]
+
 # --- NOVAS CONSTANTES PARA O KANBAN OPERACIONAL ---
 
 # Redes Sociais (A Plataforma)
@@ -85,9 +121,21 @@ class Client(models.Model):
     meta_access_token = models.CharField(max_length=500, blank=True, null=True)
     meta_user_id = models.CharField(max_length=100, blank=True, null=True)
 
+    # Uso da Central de Mídia (mantido pelos signals de MediaFile; ver StorageUsage)
+    media_files = models.PositiveIntegerField(default=0, editable=False)
+    media_bytes = models.BigIntegerField(default=0, editable=False)
+
     def __str__(self):
         return self.name
 
+    def delete(self, *args, **kwargs):
+        # Pastas e arquivos do cliente saem em lote (fila do R2 + contadores)
+        files, size = Client.objects.filter(pk=self.pk).values_list('media_files', 'media_bytes').get()
+        with bulk_media_delete(MediaFile.objects.filter(folder__client_id=self.pk)):
+            deleted = super().delete(*args, **kwargs)
+            StorageUsage.add([], None, -files, -size)
+        return deleted
+
 # ==============================================================================
 # 3. REDES SOCIAIS (CONEXÕES / API)
 # ==============================================================================
@@ -127,6 +175,241 @@ class SocialAccount(models.Model):
 # 4. TAREFA (KANBAN GERAL E OPERACIONAL UNIFICADO)
 # ==============================================================================
 
+class Tag(models.Model):
+    """Etiqueta de tarefa (uma linha por nome, por tenant)."""
+    name = models.CharField(max_length=50, unique=True, verbose_name="Nome")
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+def normalize_tag_names(names):
+    """Limpa, remove vazios/duplicados e corta no tamanho do campo, mantendo a ordem."""
+    clean = []
+    for name in names:
+        name = (name or '').strip()[:50]
+        if name and name not in clean:
+            clean.append(name)
+    return clean
+
+
+# Busca textual: configuração do Postgres e peso de cada campo (A = mais relevante)
+TASK_SEARCH_CONFIG = 'portuguese'
+TASK_SEARCH_FIELDS = {
+    'title': 'A',
+    'description': 'B',
+    'briefing_text': 'B',
+    'copy_content': 'C',
+    'caption_content': 'C',
+    'script_content': 'D',
+}
+
+# Marcadores do ts_headline: viram <mark> só depois de escapar o texto da tarefa
+HIGHLIGHT_START, HIGHLIGHT_STOP = '\x02', '\x03'
+
+
+def highlight_html(headline):
+    """HTML seguro de um destaque do with_highlights (o texto vem do usuário)."""
+    return escape(headline or '').replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>')
+
+
+def task_search_vector():
+    """Expressão SQL que monta o tsvector da Task a partir dos campos de texto."""
+    vector = None
+    for field, weight in TASK_SEARCH_FIELDS.items():
+        part = SearchVector(field, weight=weight, config=TASK_SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return vector
+
+
+class TaskQuerySet(models.QuerySet):
+    def for_board(self):
+        """Carrega cliente, responsáveis e tags junto, evitando N+1 ao serializar cards."""
+        return self.select_related('client').prefetch_related('assigned_to', 'tag_set')
+
+    def with_tag(self, name):
+        """Filtra pela tag (join indexado em projects_task_tag_set, sem LIKE)."""
+        return self.filter(tag_set__name=name)
+
+    def to_board_payload(self, today=None):
+        """
+        Serializa todas as tarefas do queryset no mesmo formato do Task.to_dict(),
+        com número fixo de queries (tarefas + responsáveis), independente do
+        tamanho do quadro.
+        """
+        today = today or timezone.now().date()
+        return [task.to_dict(today=today) for task in self.for_board()]
+
+    def to_board_columns(self, stages, fallback_status=None, limit=None, today=None):
+        """
+        Monta as colunas do Kanban com UMA query ordenada, agrupando por status em Python.
+
+        - `stages`: lista de (status, rótulo), ex: OPERATIONAL_KANBAN_STAGES.
+        - `fallback_status`: coluna que recebe status legados/desconhecidos
+          (padrão: primeira coluna).
+        - `limit`: máximo de cards serializados por coluna. O total real fica em
+          `count`, então colunas grandes podem ser truncadas sem uma segunda query.
+        """
+        today = today or timezone.now().date()
+        fallback_status = fallback_status or stages[0][0]
+
+        buckets = {key: [] for key, label in stages}
+        for task in self.for_board():
+            buckets.get(task.status, buckets[fallback_status]).append(task)
+
+        columns = []
+        for key, label in stages:
+            stage_tasks = buckets[key]
+            visible = stage_tasks[:limit] if limit is not None else stage_tasks
+            columns.append({
+                'id': key,
+                'title': label,
+                'tasks': [task.to_dict(today=today) for task in visible],
+                'count': len(stage_tasks),
+                'truncated': len(visible) < len(stage_tasks),
+            })
+        return columns
+
+    def scheduled_in_month(self, year, month):
+        """
+        Posts operacionais agendados no mês. Usa um intervalo [início, próximo mês)
+        em vez de __year/__month (EXTRACT), para o Postgres usar o índice de agenda.
+        """
+        start = timezone.make_aware(datetime(year, month, 1))
+        end = timezone.make_aware(datetime(year + month // 12, month % 12 + 1, 1))
+        return self.filter(
+            kanban_type='operational', scheduled_date__gte=start, scheduled_date__lt=end
+        )
+
+    def metrics_rollup(self, weeks=12, today=None):
+        """
+        Todos os números do dashboard de métricas do cliente em UMA query
+        (agregação condicional): totais, contagem por status de cada quadro e as
+        séries semanais de criadas/concluídas. Concluída = status final, datada
+        pelo `completed_at` (o `updated_at` anda em qualquer edição ou rebalance).
+        """
+        today = today or timezone.localdate()
+        first_week = today - timedelta(days=today.weekday(), weeks=weeks - 1)
+        week_starts = [first_week + timedelta(weeks=i) for i in range(weeks + 1)]
+        bounds = [timezone.make_aware(datetime.combine(day, datetime.min.time())) for day in week_starts]
+
+        general = models.Q(kanban_type='general')
+        operational = models.Q(kanban_type='operational')
+        completed = models.Q(status__in=COMPLETED_STATUSES)
+
+        aggregates = {
+            'total_tasks': models.Count('id', filter=general),
+            'total_posts': models.Count('id', filter=operational),
+            'posts_scheduled': models.Count('id', filter=operational & models.Q(status='scheduled')),
+        }
+        for status, label in ALL_STATUS_CHOICES:
+            aggregates[f'general__{status}'] = models.Count('id', filter=general & models.Q(status=status))
+            aggregates[f'operational__{status}'] = models.Count('id', filter=operational & models.Q(status=status))
+        for i in range(weeks):
+            start, end = bounds[i], bounds[i + 1]
+            aggregates[f'created__{i}'] = models.Count(
+                'id', filter=models.Q(created_at__gte=start, created_at__lt=end)
+            )
+            aggregates[f'completed__{i}'] = models.Count(
+                'id', filter=completed & models.Q(completed_at__gte=start, completed_at__lt=end)
+            )
+
+        row = self.aggregate(**aggregates)
+        return {
+            'total_tasks': row['total_tasks'],
+            'total_posts': row['total_posts'],
+            'posts_scheduled': row['posts_scheduled'],
+            # Só status presentes, como o gráfico já esperava
+            'task_chart': {s: row[f'general__{s}'] for s, label in ALL_STATUS_CHOICES if row[f'general__{s}']},
+            'post_chart': {s: row[f'operational__{s}'] for s, label in ALL_STATUS_CHOICES if row[f'operational__{s}']},
+            'weekly': {
+                'labels': [day.strftime('%d/%m') for day in week_starts[:weeks]],
+                'created': [row[f'created__{i}'] for i in range(weeks)],
+                'completed': [row[f'completed__{i}'] for i in range(weeks)],
+            },
+        }
+
+    def search(self, text):
+        """
+        Busca textual (GIN em `search_vector`) ordenada por relevância.
+        Aceita a sintaxe de buscador: "frase exata", -excluir, OR.
+        """
+        query = SearchQuery(text, config=TASK_SEARCH_CONFIG, search_type='websearch')
+        return (
+            self.filter(search_vector=query)
+            .annotate(search_rank=SearchRank(models.F('search_vector'), query))
+            .order_by('-search_rank', 'id')
+        )
+
+    def with_highlights(self, text):
+        """
+        Anota `title_highlight` e `snippet` com os termos entre HIGHLIGHT_START e
+        HIGHLIGHT_STOP, em texto cru: passe por highlight_html antes de mandar
+        para a tela. O ts_headline é caro: aplique só na página de resultados já
+        cortada (ver search_tasks_api).
+        """
+        query = SearchQuery(text, config=TASK_SEARCH_CONFIG, search_type='websearch')
+        options = {'config': TASK_SEARCH_CONFIG, 'start_sel': HIGHLIGHT_START, 'stop_sel': HIGHLIGHT_STOP}
+        space = models.Value(' ', output_field=models.TextField())
+        body = Concat(
+            Coalesce('description', space), space, Coalesce('briefing_text', space), space,
+            'copy_content', space, 'caption_content',
+            output_field=models.TextField(),
+        )
+        return self.annotate(
+            title_highlight=SearchHeadline('title', query, highlight_all=True, **options),
+            snippet=SearchHeadline(body, query, max_words=30, min_words=10, **options),
+        )
+
+    # --- ORDENAÇÃO POR RANK (Drag & Drop) ---
+
+    def next_rank(self, kanban_type, status):
+        """Rank para o fim da coluna. Chame com a coluna travada (lock_column)."""
+        last = (
+            self.filter(kanban_type=kanban_type, status=status)
+            .exclude(rank='')
+            .order_by('-rank')
+            .values_list('rank', flat=True)
+            .first()
+        )
+        return rank_after(last)
+
+    def create_in_column(self, **fields):
+        """Cria a tarefa no fim da coluna, sem corrida com outras criações/movimentos."""
+        kanban_type, status = fields['kanban_type'], fields['status']
+        with transaction.atomic():
+            lock_column(kanban_type, status)
+            fields['rank'] = self.next_rank(kanban_type, status)
+            if len(fields['rank']) > RANK_REBALANCE_LENGTH:
+                self.rebalance_ranks(kanban_type, status)
+                fields['rank'] = self.next_rank(kanban_type, status)
+            return self.create(**fields)
+
+    def rebalance_ranks(self, kanban_type, status):
+        """
+        Redistribui os ranks da coluna com chaves curtas e igualmente espaçadas,
+        mantendo a ordem atual. Tarefas sem rank (legado do campo `order`) entram
+        na ordem do `order`, antes das já ranqueadas.
+        """
+        with transaction.atomic():
+            lock_column(kanban_type, status)
+            tasks = list(
+                self.model.objects.filter(kanban_type=kanban_type, status=status)
+                .order_by('rank', 'order', 'id')
+                .only('id', 'rank', 'updated_at')
+            )
+            now = timezone.now()
+            for task, rank in zip(tasks, spaced_ranks(len(tasks))):
+                task.rank = rank
+                # bulk_update não aplica o auto_now; o delta do Kanban depende dele
+                task.updated_at = now
+            self.model.objects.bulk_update(tasks, ['rank', 'updated_at'], batch_size=500)
+        return len(tasks)
+
+
 class Task(models.Model):
     # --- Controle Geral ---
     kanban_type = models.CharField(max_length=20, choices=KANBAN_TYPES, default='general')
@@ -163,6 +446,8 @@ class Task(models.Model):
 
     # Passo 3: Design
     final_art = models.ImageField(upload_to='designs/', blank=True, null=True, verbose_name="Arte Final / Capa")
+    # Miniatura/prévia WebP da arte (projects/derivatives.py)
+    final_art_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     design_files = models.FileField(upload_to='designs_source/', blank=True, null=True, verbose_name="Editável (PSD/AI)")
 
     # Passo 4 e 5: Aprovação
@@ -178,10 +463,17 @@ class Task(models.Model):
     # --- CAMPOS PADRÃO ---
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    order = models.IntegerField(default=0) 
+    # Quando entrou em um status final (COMPLETED_STATUSES); limpo ao sair dele
+    completed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    order = models.IntegerField(default=0) # Legado: substituído pelo `rank`
+    # Posição na coluna (ordenação fracionária, ver projects/ranking.py)
+    rank = models.CharField(max_length=64, blank=True, default='', db_collation='C')
     deadline = models.DateField(null=True, blank=False, verbose_name="Prazo de Entrega")
-    tags = models.CharField(max_length=255, blank=True, null=True, verbose_name="Tags")
+    tags = models.CharField(max_length=255, blank=True, null=True, verbose_name="Tags") # Legado: substituído por `tag_set`
+    tag_set = models.ManyToManyField(Tag, blank=True, related_name='tasks', verbose_name="Tags")
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    # Busca textual (tsvector em português), mantido pelo signal update_task_search_vector
+    search_vector = SearchVectorField(null=True, editable=False)
     assigned_to = models.ManyToManyField(
         settings.AUTH_USER_MODEL, 
         blank=True, 
@@ -189,15 +481,104 @@ class Task(models.Model):
         verbose_name="Responsáveis"
     )
 
+    objects = TaskQuerySet.as_manager()
+
     class Meta:
-        ordering = ['order']
+        ordering = ['rank', 'order']
+        indexes = [
+            # Colunas do Kanban (next_rank, move_to, rebalance)
+            models.Index(fields=['kanban_type', 'status', 'rank'], name='task_column_rank_idx'),
+            # Quadro inteiro já na ordem de exibição (board views)
+            models.Index(fields=['kanban_type', 'rank', 'order'], name='task_board_order_idx'),
+            models.Index(fields=['kanban_type', 'updated_at'], name='task_board_changes_idx'),
+            # Métricas por cliente (contagens por kanban_type/status)
+            models.Index(fields=['client', 'kanban_type', 'status'], name='task_client_board_idx'),
+            # Calendário: só posts operacionais agendados
+            models.Index(
+                fields=['scheduled_date'], name='task_op_schedule_idx',
+                condition=models.Q(kanban_type='operational', scheduled_date__isnull=False),
+            ),
+            GinIndex(fields=['search_vector'], name='task_search_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Cliente carregado do banco: se a tarefa trocar de cliente, as métricas
+        # dos dois clientes precisam ser invalidadas (ver invalidate_client_metrics)
+        instance._loaded_client_id = dict(zip(field_names, values)).get('client_id')
+        return instance
 
     def save(self, *args, **kwargs):
         # Gera token para aprovação externa se for operacional e ainda não tiver
         if self.kanban_type == 'operational' and not self.approval_token:
             self.approval_token = secrets.token_urlsafe(32)
+
+        # Data de conclusão: marcada ao entrar em status final, limpa ao sair
+        completed = self.status in COMPLETED_STATUSES
+        if completed != (self.completed_at is not None):
+            self.completed_at = timezone.now() if completed else None
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'completed_at'}
         super().save(*args, **kwargs)
 
+    def move_to(self, status=None, after_id=None, before_id=None):
+        """
+        Move o card (Drag & Drop) gravando apenas esta linha.
+
+        - `after_id`: card que fica imediatamente acima (None = topo/fim, ver abaixo).
+        - `before_id`: card que fica imediatamente abaixo (usado se não houver `after_id`).
+        Sem vizinhos o card vai para o fim da coluna.
+        """
+        status = status or self.status
+        manager = type(self).objects
+
+        with transaction.atomic():
+            lock_column(self.kanban_type, status)
+            column = manager.filter(kanban_type=self.kanban_type, status=status).exclude(pk=self.pk)
+
+            # Coluna ainda no formato antigo (só `order`): migra na hora
+            if column.filter(rank='').exists():
+                manager.rebalance_ranks(self.kanban_type, status)
+
+            try:
+                self.rank = self._rank_in_column(column, after_id, before_id)
+            except ValueError:
+                # Ranks duplicados/inconsistentes: redistribui e tenta de novo
+                manager.rebalance_ranks(self.kanban_type, status)
+                self.rank = self._rank_in_column(column, after_id, before_id)
+
+            self.status = status
+            self.save(update_fields=['status', 'rank', 'updated_at'])
+
+            if len(self.rank) > RANK_REBALANCE_LENGTH:
+                manager.rebalance_ranks(self.kanban_type, status)
+                self.refresh_from_db(fields=['rank'])
+
+    def set_tags(self, names):
+        """Substitui as tags da tarefa, criando as que ainda não existem."""
+        names = normalize_tag_names(names)
+        Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+        self.tag_set.set(Tag.objects.filter(name__in=names))
+
+    @staticmethod
+    def _rank_in_column(column, after_id=None, before_id=None):
+        ranks = column.values_list('rank', flat=True)
+
+        if after_id:
+            lo = ranks.filter(pk=after_id).first()
+            if lo is not None:
+                hi = ranks.filter(rank__gt=lo).order_by('rank').first()
+                return rank_between(lo, hi)
+
+        if before_id:
+            hi = ranks.filter(pk=before_id).first()
+            if hi is not None:
+                lo = ranks.filter(rank__lt=hi).order_by('-rank').first()
+                return rank_between(lo, hi)
+
+        return rank_after(ranks.order_by('-rank').first())
+
     def __str__(self):
         return f"[{self.get_kanban_type_display()}] {self.title}"
         
@@ -226,15 +607,22 @@ class Task(models.Model):
             return role == 'client'
         return False
 
-    def to_dict(self):
+    def to_dict(self, today=None):
         """
         Serializa a tarefa contendo TODOS os dados necessários
         tanto para o Kanban Geral quanto para o Operacional.
+
+        `today` permite que serializações em lote usem a mesma data de referência
+        para o `is_late` (ver TaskQuerySet.to_board_payload).
         """
-        
+        if today is None:
+            today = timezone.now().date()
+
         # 1. Lógica de Responsáveis (Para o Kanban Geral)
+        # Lê a relação uma única vez (usa o cache do prefetch_related quando houver)
+        assignees = list(self.assigned_to.all())
         assignees_data = []
-        for user in self.assigned_to.all():
+        for user in assignees:
             initials = ""
             if user.first_name:
                 initials += user.first_name[0]
@@ -249,6 +637,8 @@ class Task(models.Model):
                 'initials': initials.upper(),
             })
 
+        client = self.client
+
         return {
             # --- DADOS COMUNS (Básicos) ---
             'id': self.id,
@@ -257,20 +647,22 @@ class Task(models.Model):
             'status': self.status,
             'priority': self.priority,
             'order': self.order,
+            'rank': self.rank,
+            'tags': [tag.name for tag in self.tag_set.all()],
             
             # --- DADOS DE RESPONSÁVEIS (Geral) ---
             'assignees': assignees_data,
-            'assigned_to': [u.id for u in self.assigned_to.all()],
+            'assigned_to': [u.id for u in assignees],
             
             # --- DADOS DE CLIENTE (Operacional e Geral) ---
-            'client_id': self.client.id if self.client else None,
-            'client_name': self.client.name if self.client else "Sem Cliente",
-            'client_logo': self.client.logo.url if (self.client and self.client.logo) else None,
+            'client_id': client.id if client else None,
+            'client_name': client.name if client else "Sem Cliente",
+            'client_logo': client.logo.url if (client and client.logo) else None,
             
             # --- DATAS ---
             'deadline': self.deadline.strftime('%d/%m/%Y') if self.deadline else None,
             'scheduled_date': self.scheduled_date.strftime('%Y-%m-%d') if self.scheduled_date else None,
-            'is_late': (self.deadline < timezone.now().date()) if self.deadline else False,
+            'is_late': (self.deadline < today) if self.deadline else False,
             
             # --- DADOS ESPECÍFICOS DO OPERACIONAL ---
             'social_network': self.social_network,
@@ -281,7 +673,9 @@ class Task(models.Model):
             'script_content': self.script_content,
             
             # --- ARQUIVOS E IMAGENS ---
-            'art_url': self.final_art.url if self.final_art else None,
+            # Derivados WebP (o original enquanto não forem gerados); `final_art` é o original
+            'art_url': derivative_url(self.final_art, self.final_art_derivatives, 'preview'),
+            'art_thumb_url': derivative_url(self.final_art, self.final_art_derivatives, 'thumb'),
             'final_art': self.final_art.url if self.final_art else None,
             'briefing_files': self.briefing_files.url if self.briefing_files else None,
             'design_files': self.design_files.url if self.design_files else None,
@@ -292,6 +686,109 @@ class Task(models.Model):
             'feedback_image_annotation_url': self.feedback_image_annotation.url if self.feedback_image_annotation else None,
         }
 
+# Por quanto tempo as exclusões ficam disponíveis para o delta do Kanban.
+# Cursores mais antigos que isso recebem o quadro completo (reset).
+TOMBSTONE_RETENTION = timedelta(days=7)
+
+
+class TaskTombstone(models.Model):
+    """Registro de tarefas excluídas, usado pelo delta do Kanban (kanban_changes_api)."""
+    task_id = models.BigIntegerField()
+    kanban_type = models.CharField(max_length=20, choices=KANBAN_TYPES)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kanban_type', 'deleted_at'], name='tombstone_board_idx'),
+        ]
+
+    def __str__(self):
+        return f"Tarefa {self.task_id} excluída em {self.deleted_at:%d/%m/%Y %H:%M}"
+
+
+# Idade máxima da rollup de métricas (as séries semanais andam com o calendário)
+METRICS_ROLLUP_TTL = timedelta(minutes=15)
+
+
+class ClientMetricsRollup(models.Model):
+    """
+    Cache dos números do dashboard de métricas, um registro por cliente.
+    Apagado a cada save/delete de Task do cliente e recalculado na próxima visita.
+    Fica no banco (e não no cache local do processo) para valer em todos os workers.
+    """
+    client = models.OneToOneField(Client, on_delete=models.CASCADE, primary_key=True, related_name='metrics_rollup')
+    data = models.JSONField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Métricas de {self.client} ({self.computed_at:%d/%m/%Y %H:%M})"
+
+    @classmethod
+    def for_client(cls, client):
+        """Retorna a rollup válida do cliente ou recalcula (uma query) e guarda."""
+        now = timezone.now()
+        rollup = cls.objects.filter(client=client, computed_at__gte=now - METRICS_ROLLUP_TTL).first()
+        if rollup:
+            return rollup.data
+
+        data = Task.objects.filter(client=client).metrics_rollup()
+        cls.objects.update_or_create(client=client, defaults={'data': data, 'computed_at': now})
+        return data
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_client_metrics(sender, instance, raw=False, **kwargs):
+    """Descarta a rollup do cliente da tarefa (e do cliente anterior, se mudou)."""
+    if raw:
+        return
+    client_ids = {instance.client_id, getattr(instance, '_loaded_client_id', None)} - {None}
+    if client_ids:
+        ClientMetricsRollup.objects.filter(client_id__in=client_ids).delete()
+    instance._loaded_client_id = instance.client_id
+
+
+@receiver(post_delete, sender=Task)
+def record_task_tombstone(sender, instance, **kwargs):
+    """Guarda a exclusão para os clientes do Kanban e limpa registros expirados."""
+    now = timezone.now()
+    TaskTombstone.objects.create(task_id=instance.pk, kanban_type=instance.kanban_type, deleted_at=now)
+    TaskTombstone.objects.filter(deleted_at__lt=now - TOMBSTONE_RETENTION).delete()
+
+@receiver(post_save, sender=Task)
+def update_task_search_vector(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Recalcula o tsvector no banco quando algum campo de texto pode ter mudado."""
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(TASK_SEARCH_FIELDS):
+        return
+    Task.objects.filter(pk=instance.pk).update(search_vector=task_search_vector())
+
+
+# Relações que entram no card: mudou, o updated_at da tarefa anda junto (ETag do
+# calendário e delta do Kanban comparam só o updated_at)
+TASK_RELATION_FIELDS = {Task.tag_set.through: 'tag_set', Task.assigned_to.through: 'assigned_to'}
+
+
+@receiver(m2m_changed, sender=Task.tag_set.through)
+@receiver(m2m_changed, sender=Task.assigned_to.through)
+def touch_task_on_relation_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Task.objects.filter(pk=instance.pk).update(updated_at=timezone.now())
+        return
+    # Lado da Tag/usuário (tag.tasks.add(...)): pk_set são as tarefas; no clear, antes de limpar
+    if action in ('post_add', 'post_remove') and pk_set:
+        Task.objects.filter(pk__in=pk_set).update(updated_at=timezone.now())
+    elif action == 'pre_clear':
+        Task.objects.filter(**{TASK_RELATION_FIELDS[sender]: instance}).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Tag)
+def touch_tasks_of_deleted_tag(sender, instance, **kwargs):
+    """A exclusão da Tag apaga as ligações sem m2m_changed."""
+    Task.objects.filter(tag_set=instance).update(updated_at=timezone.now())
+
 # ==============================================================================
 # 5. ARQUIVOS E MÍDIA (DRIVE / R2)
 # ==============================================================================
@@ -333,47 +830,552 @@ class MediaFolder(models.Model):
         related_name='subfolders'
     )
     
+    # Caminho materializado com os ids da raiz até a pasta: "/12/45/78/".
+    # Ancestrais, subárvore e movimentação viram uma query só (prefixo indexado).
+    path = models.CharField(max_length=1000, blank=True, default='', editable=False)
+
+    # Arquivos e bytes da pasta + subpastas (incrementais; ver StorageUsage)
+    total_files = models.PositiveIntegerField(default=0, editable=False)
+    total_bytes = models.BigIntegerField(default=0, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['name']
         # Evita criar duas pastas com mesmo nome no mesmo lugar
         unique_together = ['parent', 'name', 'client'] 
+        indexes = [
+            # varchar_pattern_ops: permite usar o índice no LIKE 'prefixo%'
+            models.Index(fields=['path'], name='mediafolder_path_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        path = (self.parent.ensure_path() if self.parent_id else '/') + f'{self.pk}/'
+        if path != self.path:
+            old_path, self.path = self.path, path
+            if old_path:
+                # Mudou de pai (admin/formulário): leva a subárvore junto
+                self._rewrite_subtree(old_path, path)
+            else:
+                MediaFolder.objects.filter(pk=self.pk).update(path=path)
+
+    def delete(self, *args, **kwargs):
+        # Arquivos, chaves do R2 e contadores da subárvore saem de uma vez (os
+        # signals de cada MediaFile não fazem nada durante a deleção em lote).
+        # Pasta legada ganha o caminho antes: o prefixo vazio pegaria o tenant inteiro
+        self.ensure_path()
+        files, size = MediaFolder.objects.filter(pk=self.pk).values_list('total_files', 'total_bytes').get()
+        with bulk_media_delete(MediaFile.objects.filter(folder__path__startswith=self.path)):
+            # A subárvore inteira de uma vez, sem o cascade descer nível a nível
+            deleted = MediaFolder.objects.filter(path__startswith=self.path).delete()
+            StorageUsage.add(self.ancestor_ids(), self.client_id, -files, -size)
+        return deleted
+
+    def ensure_path(self):
+        """
+        Caminho da pasta. Pastas legadas (antes do rebuild_folder_paths) ainda não
+        têm, e as subpastas delas também não: faz o backfill do tenant na hora
+        (uma CTE), senão o prefixo vazio casaria com todas as pastas.
+        """
+        if not self.path:
+            MediaFolder.rebuild_paths()
+            self.path = MediaFolder.objects.filter(pk=self.pk).values_list('path', flat=True).get()
+        return self.path
+
+    @staticmethod
+    def _rewrite_subtree(old_path, new_path, **extra):
+        return MediaFolder.objects.filter(path__startswith=old_path).update(
+            path=Concat(models.Value(new_path), Substr('path', len(old_path) + 1)), **extra
+        )
+
+    def ancestor_ids(self):
+        return [int(pk) for pk in self.ensure_path().strip('/').split('/')[:-1] if pk]
+
+    def ancestors(self):
+        """Pastas acima desta, da raiz para baixo (breadcrumbs), em uma query."""
+        ids = self.ancestor_ids()
+        by_id = MediaFolder.objects.order_by().in_bulk(ids) if ids else {}
+        return [by_id[pk] for pk in ids if pk in by_id]
+
+    def descendants(self):
+        """Todas as pastas abaixo desta (qualquer profundidade)."""
+        return MediaFolder.objects.filter(path__startswith=self.ensure_path()).exclude(pk=self.pk)
+
+    def subtree_stats(self):
+        """Quantidade de arquivos e bytes da pasta e de todas as subpastas."""
+        return MediaFile.objects.filter(folder__path__startswith=self.ensure_path()).aggregate(
+            files=models.Count('id'), size=Coalesce(models.Sum('file_size'), 0)
+        )
+
+    def move_to(self, new_parent):
+        """
+        Move a pasta (com toda a subárvore) para `new_parent` (None = raiz do
+        cliente). Um único UPDATE reescreve os caminhos e o pai da própria pasta.
+        """
+        # Com caminho vazio o UPDATE por prefixo pegaria todas as pastas
+        self.ensure_path()
+        if new_parent is not None:
+            if new_parent.client_id != self.client_id:
+                raise ValueError("A pasta de destino é de outro cliente.")
+            if new_parent.ensure_path().startswith(self.path):
+                raise ValueError("Não é possível mover a pasta para dentro dela mesma.")
+
+        new_path = (new_parent.path if new_parent else '/') + f'{self.pk}/'
+        parent_id = new_parent.pk if new_parent else None
+        old_ancestors = set(self.ancestor_ids())
+        self._rewrite_subtree(self.path, new_path, parent_id=models.Case(
+            models.When(pk=self.pk, then=models.Value(parent_id)),
+            default=models.F('parent_id'),
+            output_field=models.IntegerField(),
+        ))
+        self.parent, self.path = new_parent, new_path
+
+        # Contadores: a subárvore sai dos ancestrais antigos e entra nos novos
+        # (os ancestrais em comum não mudam)
+        new_ancestors = set(self.ancestor_ids())
+        changed = old_ancestors ^ new_ancestors
+        if changed:
+            files, size = MediaFolder.objects.filter(pk=self.pk).values_list('total_files', 'total_bytes').get()
+            sign = models.Case(
+                models.When(pk__in=new_ancestors - old_ancestors, then=1), default=-1,
+                output_field=models.IntegerField(),
+            )
+            MediaFolder.objects.filter(pk__in=changed).update(
+                total_files=models.F('total_files') + sign * files,
+                total_bytes=models.F('total_bytes') + sign * size,
+            )
+
+    @classmethod
+    def rebuild_paths(cls):
+        """Recalcula todos os caminhos do tenant atual (backfill) com uma CTE recursiva."""
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                WITH RECURSIVE tree (id, path) AS (
+                    SELECT id, '/' || id || '/' FROM {table} WHERE parent_id IS NULL
+                    UNION ALL
+                    SELECT f.id, tree.path || f.id || '/'
+                    FROM {table} f JOIN tree ON f.parent_id = tree.id
+                )
+                UPDATE {table} SET path = tree.path
+                FROM tree
+                WHERE {table}.id = tree.id AND {table}.path IS DISTINCT FROM tree.path
+            """)
+            return cursor.rowcount
+
+class MediaBlob(models.Model):
+    """
+    Objeto físico no R2, endereçado pelo SHA-256 do conteúdo. Vários MediaFile
+    (em pastas e clientes diferentes) apontam para o mesmo blob; o objeto só é
+    apagado do R2 quando a última referência sai (ref_count chega a zero).
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    key = models.CharField(max_length=500)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+
+    @classmethod
+    def acquire(cls, sha256, key, size):
+        """
+        Soma uma referência ao conteúdo `sha256` (cria o blob com `key` se for o
+        primeiro). Se o blob já existia, quem chamou deve passar a usar `blob.key`.
+        """
+        with transaction.atomic():
+            blob, created = cls.objects.select_for_update().get_or_create(
+                sha256=sha256, defaults={'key': key, 'size': size, 'ref_count': 1}
+            )
+            if not created:
+                cls.objects.filter(pk=blob.pk).update(ref_count=models.F('ref_count') + 1)
+        return blob
+
+    @classmethod
+    def acquire_existing(cls, sha256):
+        """
+        Soma uma referência ao blob `sha256` só se ele ainda está em uso
+        (ref_count > 0), com a linha travada: um release concorrente não apaga o
+        objeto que quem chamou vai reaproveitar. None: suba o arquivo normalmente.
+        """
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(sha256=sha256, ref_count__gt=0).first()
+            if blob is not None:
+                cls.objects.filter(pk=blob.pk).update(ref_count=models.F('ref_count') + 1)
+        return blob
+
+    @classmethod
+    def release(cls, pk):
+        """
+        Tira uma referência; na última, apaga o blob e agenda a remoção do objeto
+        no R2. Retorna True se era a última.
+        """
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(pk=pk).first()
+            if blob is None:
+                return False
+            if blob.ref_count > 1:
+                cls.objects.filter(pk=pk).update(ref_count=models.F('ref_count') - 1)
+                return False
+            blob.delete()
+            schedule_deletes([blob.key])
+            return True
+
 class MediaFile(models.Model):
     folder = models.ForeignKey(MediaFolder, on_delete=models.CASCADE, related_name='files')
     # O upload_to chama a função acima para decidir o caminho no R2
     file = models.FileField(upload_to=client_r2_path) 
     filename = models.CharField(max_length=255, blank=True)
-    file_size = models.PositiveIntegerField(null=True, blank=True)
+    # BigInteger: vídeos enviados em multipart passam de 2 GB
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+    # Deduplicação: conteúdo igual aponta para o mesmo objeto no R2
+    sha256 = models.CharField(max_length=64, blank=True, default='')
+    blob = models.ForeignKey(MediaBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='files')
+    # Miniatura/prévia WebP das imagens (projects/derivatives.py)
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
+    # Chave do upload direto que criou o registro. Não muda quando a deduplicação
+    # troca `file` pela chave do blob: é ela que torna o "complete" idempotente.
+    upload_key = models.CharField(max_length=255, blank=True, default='', editable=False, db_index=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Estado carregado: update_storage_usage aplica só a diferença
+        row = dict(zip(field_names, values))
+        instance._loaded_usage = (row.get('folder_id'), row.get('file_size') or 0)
+        return instance
+
     def save(self, *args, **kwargs):
         # Salva metadados automaticamente antes de enviar
         if self.file:
             self.filename = os.path.basename(self.file.name)
-            self.file_size = self.file.size
-        super().save(*args, **kwargs)
+            # Upload direto já chega com o tamanho do HEAD: evita outra ida ao R2
+            if self.file_size is None or not self.file._committed:
+                self.file_size = self.file.size
+            if not self.file._committed:
+                # Hash em streaming antes do envio; o blob é conferido no save abaixo
+                self.sha256 = sha256_hexdigest(self.file.chunks())
+        # Mesma transação do post_save (contadores de uso), ver StorageUsage.reconcile
+        with transaction.atomic():
+            if self.file and not self.file._committed and self.sha256:
+                # Conteúdo já no R2: a referência é somada antes de pular o envio
+                # (e desfeita junto se o save falhar)
+                blob = MediaBlob.acquire_existing(self.sha256)
+                if blob is not None:
+                    self.blob = blob
+                    self.file = blob.key
+            super().save(*args, **kwargs)
+        if self.sha256 and self.blob_id is None:
+            self.link_blob()
+
+    def link_blob(self):
+        """Associa o arquivo ao blob do seu SHA-256, descartando a própria cópia se já havia outra."""
+        blob = MediaBlob.acquire(self.sha256, self.file.name, self.file_size)
+        if blob.key != self.file.name:
+            schedule_deletes([self.file.name])
+        self.blob = blob
+        self.file = blob.key
+        MediaFile.objects.filter(pk=self.pk).update(blob=blob, file=blob.key, sha256=self.sha256)
+
+    def deduplicate(self):
+        """
+        Calcula o SHA-256 lendo o objeto do storage e associa ao blob. Usado nos
+        uploads diretos ao R2, em que os bytes não passam pelo Django.
+        """
+        with open_stream(self.file.storage, self.file.name) as stream:
+            self.sha256 = sha256_hexdigest(iter(lambda: stream.read(STREAM_CHUNK_SIZE), b''))
+        self.link_blob()
+
+    @property
+    def thumb_url(self):
+        return derivative_url(self.file, self.derivatives, 'thumb')
 
     def __str__(self):
         return self.filename
     
+# Deleção em lote em andamento (pasta/cliente): os signals de cada MediaFile não
+# mexem no R2 nem nos contadores, quem apagou já tratou tudo de uma vez
+_bulk_media_delete = ContextVar('bulk_media_delete', default=False)
+
+
+def release_media_files(files):
+    """
+    Chamado ANTES de apagar `files` em lote: baixa o ref_count dos blobs com um
+    UPDATE só, agenda no R2 as chaves que deixam de ser usadas (arquivos sem blob
+    e blobs zerados) e retorna os ids dos blobs a apagar depois dos arquivos.
+    """
+    refs = files.filter(blob__isnull=False).order_by().values('blob').annotate(n=models.Count('id'))
+    refs_sql, params = refs.query.sql_with_params()
+    table = MediaBlob._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE "{table}" b SET ref_count = GREATEST(b.ref_count - r.n, 0) '
+            f'FROM ({refs_sql}) r WHERE b.id = r.blob RETURNING b.id, b.key, b.ref_count',
+            params,
+        )
+        released = [(pk, key) for pk, key, ref_count in cursor.fetchall() if ref_count == 0]
+
+    released_ids = {pk for pk, key in released}
+    keys = [key for pk, key in released]
+    for name, blob_id, derivatives in files.exclude(file='').values_list('file', 'blob_id', 'derivatives'):
+        if blob_id is None:
+            keys.append(name)
+        if blob_id is None or blob_id in released_ids:
+            keys.extend(derivative_keys(derivatives))
+    schedule_deletes(list(dict.fromkeys(keys)))
+    return list(released_ids)
+
+
+def schedule_tenant_media_deletes(schema_name):
+    """
+    Agência sendo excluída: agenda a remoção de todos os objetos da Central de
+    Mídia dela e dos derivados WebP (mídia, artes finais, posts e eventos), cujas
+    chaves somem com o schema.
+    """
+    def tenant_keys():
+        files = MediaFile.objects.exclude(file='').order_by().values_list('file', 'derivatives')
+        for name, derivatives in files.iterator():
+            yield name
+            yield from derivative_keys(derivatives)
+        for model, field in ((Task, 'final_art_derivatives'), (Post, 'media_derivatives'),
+                             (CalendarEvent, 'media_derivatives')):
+            rows = model.objects.exclude(**{field: {}}).order_by().values_list(field, flat=True)
+            for derivatives in rows.iterator():
+                yield from derivative_keys(derivatives)
+
+    def unique(keys):
+        # Arquivos deduplicados compartilham a chave do blob (e os derivados)
+        seen = set()
+        for key in keys:
+            if key not in seen:
+                seen.add(key)
+                yield key
+
+    with schema_context(schema_name):
+        schedule_deletes(unique(tenant_keys()), schema_name)
+
+
+@contextmanager
+def bulk_media_delete(files):
+    """
+    Envolve a deleção em lote de `files` (MediaFolder.delete / Client.delete):
+    tudo na mesma transação, com as chaves do R2 indo para a fila de remoção.
+    """
+    token = _bulk_media_delete.set(True)
+    try:
+        with transaction.atomic():
+            released_blobs = release_media_files(files)
+            yield
+            MediaBlob.objects.filter(pk__in=released_blobs).delete()
+    finally:
+        _bulk_media_delete.reset(token)
+
+
 @receiver(post_delete, sender=MediaFile)
 def remove_file_from_storage(sender, instance, **kwargs):
     """
-    Deleta o arquivo físico do storage (R2/S3) quando o objeto MediaFile 
-    é deletado do banco de dados via Django Admin ou Views.
+    Agenda a remoção do arquivo físico no storage (R2/S3) quando o objeto
+    MediaFile é deletado do banco (Admin ou Views). A fila é drenada pelo
+    comando drain_storage_deletes. Arquivos deduplicados só liberam a
+    referência do blob.
     """
+    if _bulk_media_delete.get():
+        return
+    if instance.blob_id:
+        # Derivados ficam ao lado do objeto do blob: saem junto com a última referência
+        if MediaBlob.release(instance.blob_id):
+            schedule_deletes(derivative_keys(instance.derivatives))
+        return
     if instance.file:
-        try:
-            # save=False impede que o Django tente salvar o model novamente após apagar
-            instance.file.delete(save=False) 
-            print(f"--> Arquivo deletado do R2: {instance.filename}")
-        except Exception as e:
-            print(f"--> ERRO ao deletar do R2: {e}")
+        schedule_deletes([instance.file.name] + derivative_keys(instance.derivatives))
+
+class MultipartUpload(models.Model):
+    """
+    Upload multipart em andamento no R2 (vídeos grandes). Guarda o UploadId para
+    o navegador retomar de onde parou após uma queda de conexão; a linha é
+    removida ao concluir ou abortar (comando abort_stale_uploads).
+    """
+    TARGET_CHOICES = [
+        ('media', 'Central de Mídia'),
+        ('final_art', 'Arte Final'),
+        ('design_files', 'Editável'),
+    ]
+
+    key = models.CharField(max_length=500)
+    upload_id = models.CharField(max_length=255, unique=True)
+    target = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    folder = models.ForeignKey(MediaFolder, on_delete=models.CASCADE, null=True, blank=True)
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, null=True, blank=True)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    part_size = models.PositiveIntegerField()
+    content_type = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.filename} ({self.get_target_display()})"
+
+    @property
+    def part_count(self):
+        return max(1, -(-self.size // self.part_size))
+
+class StorageUsage(models.Model):
+    """
+    Uso total da Central de Mídia no tenant (linha única) e a cota de espaço.
+    Junto com MediaFolder.total_* e Client.media_* é mantido de forma incremental
+    pelos signals de MediaFile, então checar a cota é ler UMA linha (sem SUM na
+    tabela de arquivos). O comando reconcile_storage_usage corrige desvios.
+    """
+    files = models.BigIntegerField(default=0)
+    bytes = models.BigIntegerField(default=0)
+    quota_bytes = models.PositiveBigIntegerField(
+        null=True, blank=True, verbose_name="Cota (bytes)",
+        help_text="Vazio = usa o padrão MEDIA_TENANT_QUOTA_BYTES (0 = sem limite)."
+    )
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Uso de armazenamento"
+        verbose_name_plural = "Uso de armazenamento"
+
+    def __str__(self):
+        return f"{self.files} arquivos / {self.bytes} bytes"
+
+    @classmethod
+    def current(cls):
+        usage, _ = cls.objects.get_or_create(pk=1)
+        return usage
+
+    @property
+    def quota(self):
+        quota = self.quota_bytes if self.quota_bytes is not None else settings.MEDIA_TENANT_QUOTA_BYTES
+        return quota or None
+
+    @classmethod
+    def would_exceed(cls, extra_bytes):
+        """True se enviar mais `extra_bytes` passa da cota do tenant (O(1): lê uma linha)."""
+        usage = cls.current()
+        return usage.quota is not None and usage.bytes + extra_bytes > usage.quota
+
+    @classmethod
+    def add(cls, folder_ids, client_id, files, size):
+        """
+        Soma `files`/`size` (negativos na remoção) nas pastas `folder_ids` (a pasta
+        e seus ancestrais), no cliente e no tenant.
+        """
+        if not files and not size:
+            return
+        if folder_ids:
+            MediaFolder.objects.filter(pk__in=folder_ids).update(
+                total_files=models.F('total_files') + files, total_bytes=models.F('total_bytes') + size
+            )
+        if client_id:
+            Client.objects.filter(pk=client_id).update(
+                media_files=models.F('media_files') + files, media_bytes=models.F('media_bytes') + size
+            )
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO "{table}" (id, files, bytes) VALUES (1, %s, %s) '
+                f'ON CONFLICT (id) DO UPDATE SET files = "{table}".files + EXCLUDED.files, '
+                f'bytes = "{table}".bytes + EXCLUDED.bytes',
+                [files, size],
+            )
+
+
+    @classmethod
+    def reconcile(cls):
+        """
+        Recalcula do zero os contadores de pastas, clientes e do tenant (job
+        periódico). Trava a tabela de arquivos em modo SHARE durante o recálculo:
+        uploads e deleções esperam, então nenhum delta se perde no meio.
+        Retorna quantas pastas e clientes estavam divergentes.
+        """
+        folders = MediaFolder._meta.db_table
+        files = MediaFile._meta.db_table
+        clients = Client._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE "{files}" IN SHARE MODE')
+            cursor.execute(f"""
+                WITH totals AS (
+                    SELECT anc.id, COUNT(m.id) AS files, COALESCE(SUM(m.file_size), 0) AS bytes
+                    FROM "{folders}" anc
+                    LEFT JOIN "{folders}" d
+                        ON d.id = anc.id OR (anc.path <> '' AND d.path LIKE anc.path || '%')
+                    LEFT JOIN "{files}" m ON m.folder_id = d.id
+                    GROUP BY anc.id
+                )
+                UPDATE "{folders}" f SET total_files = t.files, total_bytes = t.bytes
+                FROM totals t
+                WHERE f.id = t.id AND (f.total_files <> t.files OR f.total_bytes <> t.bytes)
+            """)
+            folder_drift = cursor.rowcount
+            cursor.execute(f"""
+                WITH totals AS (
+                    SELECT c.id, COUNT(m.id) AS files, COALESCE(SUM(m.file_size), 0) AS bytes
+                    FROM "{clients}" c
+                    LEFT JOIN "{folders}" f ON f.client_id = c.id
+                    LEFT JOIN "{files}" m ON m.folder_id = f.id
+                    GROUP BY c.id
+                )
+                UPDATE "{clients}" c SET media_files = t.files, media_bytes = t.bytes
+                FROM totals t
+                WHERE c.id = t.id AND (c.media_files <> t.files OR c.media_bytes <> t.bytes)
+            """)
+            client_drift = cursor.rowcount
+            totals = MediaFile.objects.aggregate(files=models.Count('id'), size=Coalesce(models.Sum('file_size'), 0))
+            cls.objects.update_or_create(pk=1, defaults={
+                'files': totals['files'], 'bytes': totals['size'], 'reconciled_at': timezone.now(),
+            })
+        return folder_drift, client_drift
+
+
+def _folder_usage_target(folder_id):
+    """(ids da pasta e ancestrais, client_id) de uma pasta, em uma query."""
+    folder = MediaFolder.objects.filter(pk=folder_id).only('path', 'client').first()
+    if folder is None:
+        return [], None
+    # Pasta legada: resolve o caminho antes, senão os ancestrais ficam de fora
+    return folder.ancestor_ids() + [folder.pk], folder.client_id
+
+
+@receiver(post_save, sender=MediaFile)
+def update_storage_usage(sender, instance, created, raw=False, **kwargs):
+    """Aplica o delta do arquivo (novo, tamanho alterado ou trocado de pasta) nos contadores."""
+    if raw:
+        return
+    old_folder_id, old_size = (None, 0) if created else getattr(instance, '_loaded_usage', (None, 0))
+    new_size = instance.file_size or 0
+    instance._loaded_usage = (instance.folder_id, new_size)
+
+    if old_folder_id == instance.folder_id:
+        if new_size != old_size:
+            StorageUsage.add(*_folder_usage_target(instance.folder_id), 0, new_size - old_size)
+        return
+    if old_folder_id is not None:
+        StorageUsage.add(*_folder_usage_target(old_folder_id), -1, -old_size)
+    StorageUsage.add(*_folder_usage_target(instance.folder_id), 1, new_size)
+
+
+@receiver(post_delete, sender=MediaFile)
+def release_storage_usage(sender, instance, **kwargs):
+    """
+    Tira o arquivo dos contadores. Na deleção em lote (pasta ou cliente) quem
+    apagou já descontou a subárvore inteira de uma vez.
+    """
+    if _bulk_media_delete.get():
+        return
+    StorageUsage.add(*_folder_usage_target(instance.folder_id), -1, -(instance.file_size or 0))
 
 # ==============================================================================
 # 6. CALENDÁRIO (SIMPLES / LEGADO)
@@ -414,6 +1416,7 @@ class CalendarEvent(models.Model):
     # Novos campos para o Modal Completo
     caption = models.TextField(blank=True, null=True)
     media = models.ImageField(upload_to='posts_media/', blank=True, null=True)
+    media_derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -466,6 +1469,7 @@ class Post(models.Model):
         ('draft', 'Rascunho'),
         ('pending_approval', 'Aguardando Aprovação'),
         ('approved_to_schedule', 'Agendado'),
+        ('publishing', 'Publicando'),
         ('published', 'Publicado'),
         ('failed', 'Falha na Publicação'),
     ]
@@ -479,6 +1483,7 @@ class Post(models.Model):
     
     # Campo para salvar a mídia caso queira mostrar no painel depois
     media = models.FileField(upload_to='posts_media/', blank=True, null=True, verbose_name="Mídia Principal")
+    media_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     
     scheduled_for = models.DateTimeField(verbose_name="Agendado para")
     approval_status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='draft', verbose_name="Status")
@@ -490,7 +1495,139 @@ class Post(models.Model):
         ordering = ['-scheduled_for']
         verbose_name = "Publicação"
         verbose_name_plural = "Publicações"
+        indexes = [
+            # Posts agendados por horário (rebuild_due_posts / conferência do agendador)
+            models.Index(fields=['approval_status', 'scheduled_for'], name='post_due_idx'),
+        ]
 
     def __str__(self):
         data_formatada = self.scheduled_for.strftime('%d/%m/%Y %H:%M') if self.scheduled_for else "Sem Data"
-        return f"{self.client.name} - {data_formatada}"
\ No newline at end of file
+        return f"{self.client.name} - {data_formatada}"
+
+
+class PostDelivery(models.Model):
+    """
+    Entrega de um Post em uma conta (Post × SocialAccount). Cada entrega é
+    publicada por uma tarefa própria em segundo plano (projects/publishing.py)
+    e guarda o resultado daquele destino: ID na rede ou o erro.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Na fila'),
+        ('publishing', 'Publicando'),
+        ('published', 'Publicado'),
+        ('failed', 'Falhou'),
+    ]
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='deliveries')
+    account = models.ForeignKey(SocialAccount, on_delete=models.CASCADE, related_name='deliveries')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    external_id = models.CharField(max_length=255, blank=True)  # ID do post na rede social
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['post', 'account']
+
+    def __str__(self):
+        return f"{self.post} -> {self.account} ({self.get_status_display()})"
+
+    def to_dict(self):
+        return {
+            'account_id': self.account_id,
+            'platform': self.account.platform,
+            'account_name': self.account.account_name,
+            'status': self.status,
+            'external_id': self.external_id,
+            'attempts': self.attempts,
+            'error': self.last_error,
+            'published_at': self.published_at.isoformat() if self.published_at else None,
+        }
+
+
+@receiver(post_save, sender=Post)
+def sync_due_post(sender, instance, raw=False, **kwargs):
+    """Mantém o índice global de agendados (DuePost, schema public) em dia com o post."""
+    if raw:
+        return
+    if instance.approval_status == 'approved_to_schedule' and instance.scheduled_for:
+        # Upsert: um post reagendado só troca o horário
+        DuePost.objects.bulk_create(
+            [DuePost(schema_name=connection.schema_name, post_id=instance.pk, scheduled_for=instance.scheduled_for)],
+            update_conflicts=True, unique_fields=['schema_name', 'post_id'], update_fields=['scheduled_for'],
+        )
+    else:
+        DuePost.objects.filter(schema_name=connection.schema_name, post_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=Post)
+def remove_due_post(sender, instance, **kwargs):
+    DuePost.objects.filter(schema_name=connection.schema_name, post_id=instance.pk).delete()
+# ==============================================================================
+# 8. VERSÕES DE DADOS (ETag / GET CONDICIONAL)
+# ==============================================================================
+class DataVersion(models.Model):
+    """
+    Contador de versão por conjunto de dados (ex: 'clients'), no schema do tenant.
+    As APIs usam a versão como ETag e respondem 304 sem serializar nada quando o
+    navegador já tem a versão atual. Incrementado pelos signals abaixo.
+    """
+    key = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+    @classmethod
+    def bump(cls, key):
+        """Incrementa a versão (upsert atômico, seguro com requests concorrentes)."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO "{cls._meta.db_table}" (key, version, changed_at) VALUES (%s, 1, %s) '
+                f'ON CONFLICT (key) DO UPDATE SET version = "{cls._meta.db_table}".version + 1, '
+                f'changed_at = EXCLUDED.changed_at',
+                [key, timezone.now()],
+            )
+
+    @classmethod
+    def current(cls, key):
+        """Retorna (versão, changed_at). Conjunto nunca alterado = (0, None)."""
+        row = cls.objects.filter(key=key).values_list('version', 'changed_at').first()
+        return row or (0, None)
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+@receiver(post_save, sender=SocialAccount)
+@receiver(post_delete, sender=SocialAccount)
+def bump_clients_version(sender, raw=False, **kwargs):
+    """Lista/dados de clientes (inclui redes conectadas) mudaram: invalida os ETags."""
+    if not raw:
+        DataVersion.bump('clients')
+
+# ==============================================================================
+# 9. DERIVADOS DE IMAGEM (MINIATURA / PRÉVIA WEBP)
+# ==============================================================================
+# Modelo -> (campo da imagem, JSONField com os derivados)
+DERIVATIVE_FIELDS = {
+    Task: ('final_art', 'final_art_derivatives'),
+    CalendarEvent: ('media', 'media_derivatives'),
+    Post: ('media', 'media_derivatives'),
+    MediaFile: ('file', 'derivatives'),
+}
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=CalendarEvent)
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=MediaFile)
+def generate_image_derivatives(sender, instance, raw=False, **kwargs):
+    """Imagem nova ou trocada: enfileira a geração dos derivados (projects.jobs)."""
+    if raw:
+        return
+    field_name, json_field = DERIVATIVE_FIELDS[sender]
+    fieldfile = getattr(instance, field_name)
+    if fieldfile and is_image_name(fieldfile.name) and getattr(instance, json_field).get('source') != fieldfile.name:
+        schedule_derivatives(sender, instance.pk, field_name, json_field)
@@ -0,0 +1,106 @@
+# projects/multipart.py
+"""
+Upload multipart (S3 API) para vídeos grandes no R2.
+
+O servidor só cria o upload, assina as URLs de cada parte e conclui no final;
+os bytes vão do navegador direto para o bucket, em paralelo e parte por parte.
+Se a conexão cair, o navegador pergunta quais partes já chegaram (ListParts) e
+envia só as que faltam.
+
+Funciona com qualquer storage S3 compatível (R2, MinIO, ...): basta apontar o
+R2_ENDPOINT_URL para ele.
+"""
+from django.conf import settings
+
+# Limites do S3/R2: partes de no mínimo 5 MiB (exceto a última) e até 10.000 partes
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+def _client(storage):
+    return storage.bucket.meta.client
+
+
+def part_size_for(size, preferred=None):
+    """Tamanho de parte para `size` bytes, respeitando o mínimo e o máximo de partes."""
+    part_size = max(preferred or settings.MEDIA_MULTIPART_PART_SIZE, MIN_PART_SIZE)
+    if size > part_size * MAX_PARTS:
+        # Arredonda para MiB cheio para as partes continuarem alinhadas
+        part_size = -(-size // MAX_PARTS)
+        part_size = -(-part_size // (1024 * 1024)) * 1024 * 1024
+    return part_size
+
+
+def create_upload(storage, name, content_type=''):
+    """Inicia o upload multipart e retorna o UploadId."""
+    params = {'Bucket': storage.bucket_name, 'Key': storage._normalize_name(name)}
+    if content_type:
+        params['ContentType'] = content_type
+    return _client(storage).create_multipart_upload(**params)['UploadId']
+
+
+def presigned_part_urls(storage, name, upload_id, part_numbers, expires=3600):
+    """URLs assinadas de PUT para cada número de parte (1..10000)."""
+    client = _client(storage)
+    key = storage._normalize_name(name)
+    return {
+        number: client.generate_presigned_url(
+            'upload_part',
+            Params={'Bucket': storage.bucket_name, 'Key': key, 'UploadId': upload_id, 'PartNumber': number},
+            ExpiresIn=expires,
+            HttpMethod='PUT',
+        )
+        for number in part_numbers
+    }
+
+
+def uploaded_parts(storage, name, upload_id):
+    """Partes já recebidas pelo bucket: [{'PartNumber', 'ETag', 'Size'}, ...] em ordem."""
+    client = _client(storage)
+    key = storage._normalize_name(name)
+    parts = []
+    marker = 0
+    while True:
+        page = client.list_parts(
+            Bucket=storage.bucket_name, Key=key, UploadId=upload_id, PartNumberMarker=marker
+        )
+        parts.extend(
+            {'PartNumber': p['PartNumber'], 'ETag': p['ETag'], 'Size': p['Size']}
+            for p in page.get('Parts', [])
+        )
+        if not page.get('IsTruncated'):
+            return parts
+        marker = page['NextPartNumberMarker']
+
+
+def complete_upload(storage, name, upload_id, parts):
+    """
+    Conclui o upload com as partes listadas no bucket (os ETags vêm do ListParts,
+    então o navegador não precisa ler headers das respostas de PUT).
+    """
+    _client(storage).complete_multipart_upload(
+        Bucket=storage.bucket_name,
+        Key=storage._normalize_name(name),
+        UploadId=upload_id,
+        MultipartUpload={'Parts': [{'PartNumber': p['PartNumber'], 'ETag': p['ETag']} for p in parts]},
+    )
+
+
+def abort_upload(storage, name, upload_id):
+    """Aborta o upload e libera as partes já enviadas (ignora upload inexistente)."""
+    client = _client(storage)
+    try:
+        client.abort_multipart_upload(
+            Bucket=storage.bucket_name, Key=storage._normalize_name(name), UploadId=upload_id
+        )
+    except client.exceptions.NoSuchUpload:
+        pass
+
+
+def pending_uploads(storage, initiated_before=None):
+    """Gera (key, upload_id, initiated) dos uploads multipart abertos no bucket."""
+    paginator = _client(storage).get_paginator('list_multipart_uploads')
+    for page in paginator.paginate(Bucket=storage.bucket_name):
+        for upload in page.get('Uploads', []):
+            if initiated_before is None or upload['Initiated'] < initiated_before:
+                yield upload['Key'], upload['UploadId'], upload['Initiated']
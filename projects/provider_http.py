@@ -0,0 +1,138 @@
+# projects/provider_http.py
+"""
+Cliente HTTP compartilhado das integrações com as redes sociais (services.py).
+
+Os serviços chamavam requests.get/post soltos: um handshake TCP+TLS novo por
+chamada e nenhum timeout (um provedor travado segurava o worker até o limite
+do servidor). Aqui cada processo/thread tem uma Session com:
+
+- pool keep-alive por host (graph.facebook.com, api.linkedin.com, ...):
+  conexões HTTP/1.1 reaproveitadas entre chamadas e entre tarefas do worker;
+- timeout padrão de conexão e leitura (PROVIDER_HTTP_*_TIMEOUT);
+- novas tentativas limitadas, com espera exponencial + jitter: falhas de
+  conexão sempre (a request nem saiu) e 429/5xx só em métodos idempotentes
+  (um POST de publicação nunca é repetido aqui; quem decide é a fila). Timeout
+  de leitura não se repete: esperar de novo um provedor travado só dobra a espera;
+- métricas de latência por chamada: log (WARNING acima de PROVIDER_HTTP_SLOW_MS)
+  e agregados por host em stats().
+
+    from . import provider_http
+    response = provider_http.get(url, params=..., timeout=(5, 60))
+"""
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_local = threading.local()
+_stats = defaultdict(lambda: {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+_stats_lock = threading.Lock()
+
+
+class ProviderSession(requests.Session):
+    """Session com timeout padrão e métrica de latência em cada chamada."""
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', (settings.PROVIDER_HTTP_CONNECT_TIMEOUT, settings.PROVIDER_HTTP_READ_TIMEOUT))
+        host = urlsplit(url).hostname or ''
+        started = time.perf_counter()
+        response = None
+        try:
+            response = super().request(method, url, **kwargs)
+            return response
+        finally:
+            record(host, method, response, (time.perf_counter() - started) * 1000)
+
+
+def build_session():
+    retries = Retry(
+        total=settings.PROVIDER_HTTP_RETRIES,
+        connect=settings.PROVIDER_HTTP_RETRIES,
+        read=False,  # Timeout de leitura (provedor travado) não se repete: sobe como ReadTimeout
+        status=settings.PROVIDER_HTTP_RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,  # Sem POST
+        backoff_factor=0.5,
+        backoff_jitter=0.5,
+        backoff_max=10,
+        respect_retry_after_header=True,
+        raise_on_status=False,  # Esgotou: devolve a última resposta para o serviço tratar
+    )
+    adapter = HTTPAdapter(
+        pool_connections=settings.PROVIDER_HTTP_POOL_HOSTS,
+        pool_maxsize=settings.PROVIDER_HTTP_POOL_SIZE,
+        max_retries=retries,
+    )
+    session = ProviderSession()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def session():
+    """Session da thread atual (recriada depois de um fork: conexões não são compartilhadas)."""
+    current = getattr(_local, 'session', None)
+    if current is None or _local.pid != os.getpid():
+        current = _local.session = build_session()
+        _local.pid = os.getpid()
+    return current
+
+
+def request(method, url, **kwargs):
+    return session().request(method, url, **kwargs)
+
+
+def get(url, params=None, **kwargs):
+    return request('GET', url, params=params, **kwargs)
+
+
+def post(url, data=None, json=None, **kwargs):
+    return request('POST', url, data=data, json=json, **kwargs)
+
+
+# ==============================================================================
+# MÉTRICAS
+# ==============================================================================
+
+def record(host, method, response, elapsed_ms):
+    status = response.status_code if response is not None else 'erro'
+    failed = response is None or response.status_code >= 400
+    with _stats_lock:
+        entry = _stats[host]
+        entry['calls'] += 1
+        entry['errors'] += int(failed)
+        entry['total_ms'] += elapsed_ms
+        entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+
+    level = logging.WARNING if elapsed_ms >= settings.PROVIDER_HTTP_SLOW_MS else logging.DEBUG
+    logger.log(level, '%s %s -> %s em %.0f ms', method, host, status, elapsed_ms)
+
+
+def stats():
+    """Agregados por host neste processo: chamadas, erros, latência média e máxima (ms)."""
+    with _stats_lock:
+        return {
+            host: {
+                'calls': entry['calls'],
+                'errors': entry['errors'],
+                'avg_ms': round(entry['total_ms'] / entry['calls'], 1),
+                'max_ms': round(entry['max_ms'], 1),
+            }
+            for host, entry in _stats.items() if entry['calls']
+        }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
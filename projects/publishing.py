@@ -0,0 +1,239 @@
+# projects/publishing.py
+"""
+Motor de publicação dos Posts nas redes sociais.
+
+O create_post_api publicava no LinkedIn dentro da request (chamadas em
+sequência, sem timeout). Agora cada par Post × SocialAccount vira uma entrega
+(PostDelivery) com a sua própria tarefa na fila (projects.jobs): os workers
+publicam as contas em paralelo e cada uma tem as suas tentativas e o seu erro.
+
+    dispatch_post(post)   # na transação que salvou o Post; retorna na hora
+
+- Só volta para a fila (com espera crescente) o erro em que a publicação
+  comprovadamente não aconteceu: falha de conexão (a request nem saiu) e
+  429/503 (o provedor recusou antes de processar). Recusas da rede
+  (PublishError: token inválido, conteúdo recusado) falham na hora.
+- Erro ambíguo (timeout de leitura, 500/502/504, conexão caída no meio, worker
+  que morreu com a entrega em 'publishing') falha com aviso para conferir na rede:
+  repetir poderia publicar o post duas vezes.
+- Quando todas as entregas terminam, o Post vira 'published' (todas ok) ou
+  'failed' (alguma falhou; o detalhe fica em cada entrega).
+
+Posts agendados para o futuro ficam no índice global DuePost (schema public) e
+são despachados na hora certa pelo agendador (dispatch_due_posts / run_scheduler).
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django_tenants.utils import get_public_schema_name, get_tenant_model, schema_context
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import ConnectTimeout, HTTPError, ReadTimeout
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from accounts.models import BackgroundJob, DuePost
+
+from .derivatives import is_image_name
+from .jobs import enqueue, job, job_name
+from .models import Post, PostDelivery
+from .services import LinkedInService, MetaService, PublishError, XService
+
+logger = logging.getLogger(__name__)
+
+# Tentativas por entrega (erros temporários); depois disso a entrega falha
+DELIVERY_MAX_ATTEMPTS = 4
+
+# Adaptador de cada rede: (serviço, método). O método recebe (account, caption,
+# media) e retorna o ID do post publicado na rede.
+PUBLISHERS = {
+    'linkedin': (LinkedInService, 'publish_post'),
+    'facebook': (MetaService, 'publish_facebook_post'),
+    'instagram': (MetaService, 'publish_instagram_post'),
+    'x': (XService, 'publish_post'),
+}
+
+FINAL_STATUSES = ('published', 'failed')
+
+# Respostas que garantem que o post não foi criado. 500/502/504 chegaram ao
+# provedor (o POST de publicação não é idempotente): tratados como timeout de leitura
+PUBLISH_RETRY_STATUSES = (429, 503)
+
+UNCERTAIN_ERROR = "Sem confirmação da rede ({}). Confira se o post saiu antes de publicar de novo."
+
+# Tenant que falhou ao despachar: tenta de novo depois de
+DISPATCH_RETRY_DELAY = timedelta(minutes=1)
+
+
+def dispatch_post(post):
+    """
+    Cria as entregas que faltam para as contas do post e enfileira as pendentes.
+    Roda na transação de quem chamou: rollback = nada enfileirado.
+    """
+    existing = set(post.deliveries.values_list('account_id', flat=True))
+    PostDelivery.objects.bulk_create([
+        PostDelivery(post=post, account_id=account_id)
+        for account_id in post.accounts.values_list('id', flat=True)
+        if account_id not in existing
+    ])
+
+    # Despachado agora: sai do índice do agendador
+    DuePost.objects.filter(schema_name=connection.schema_name, post_id=post.pk).delete()
+
+    pending = list(post.deliveries.exclude(status__in=FINAL_STATUSES).values_list('id', flat=True))
+    for delivery_id in pending:
+        enqueue(deliver_post, args=[delivery_id])
+    if pending:
+        Post.objects.filter(pk=post.pk).update(approval_status='publishing', updated_at=timezone.now())
+        post.approval_status = 'publishing'
+    return len(pending)
+
+
+def publish(delivery):
+    """Publica a entrega na rede da conta. Retorna o ID do post na rede."""
+    platform = delivery.account.platform
+    if platform not in PUBLISHERS:
+        raise PublishError(f"Publicação automática não disponível para {delivery.account.get_platform_display()}.")
+
+    media = delivery.post.media or None
+    if media and not is_image_name(media.name):
+        raise PublishError("Só imagens são publicadas automaticamente por enquanto.")
+
+    service_class, method = PUBLISHERS[platform]
+    return getattr(service_class(), method)(delivery.account, delivery.post.caption, media)
+
+
+def is_safe_to_retry(error):
+    """True só quando a publicação comprovadamente não chegou ao provedor."""
+    if isinstance(error, HTTPError):
+        return error.response is not None and error.response.status_code in PUBLISH_RETRY_STATUSES
+    if isinstance(error, ConnectTimeout):
+        return True
+    if isinstance(error, RequestsConnectionError) and not isinstance(error, ReadTimeout):
+        # Conexão recusada / DNS: o urllib3 nem abriu o socket. Conexão caída
+        # depois de enviar (RemoteDisconnected, reset) é ambígua
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+    return False
+
+
+@job(max_attempts=DELIVERY_MAX_ATTEMPTS)
+def deliver_post(delivery_id):
+    """Tarefa de uma entrega. Só erros comprovadamente sem efeito sobem para a fila tentar de novo."""
+    delivery = PostDelivery.objects.select_related('post', 'account').filter(pk=delivery_id).first()
+    if delivery is None or delivery.status in FINAL_STATUSES:
+        return
+    if delivery.status == 'publishing':
+        # Worker morreu no meio da publicação (requeue_stale): o post pode ter saído
+        finish(delivery, 'failed', error=UNCERTAIN_ERROR.format('publicação interrompida'))
+        return
+
+    delivery.attempts += 1
+    PostDelivery.objects.filter(pk=delivery.pk).update(status='publishing', attempts=F('attempts') + 1)
+    try:
+        external_id = publish(delivery)
+    except PublishError as e:
+        finish(delivery, 'failed', error=str(e))
+        return
+    except Exception as e:
+        logger.warning('Entrega #%s (%s) falhou: %s', delivery.pk, delivery.account.platform, e)
+        error = f"{type(e).__name__}: {e}"
+        if not is_safe_to_retry(e):
+            finish(delivery, 'failed', error=UNCERTAIN_ERROR.format(error))
+            return
+        if delivery.attempts >= DELIVERY_MAX_ATTEMPTS:
+            finish(delivery, 'failed', error=error)
+            return
+        PostDelivery.objects.filter(pk=delivery.pk).update(status='pending', last_error=error)
+        raise
+
+    finish(delivery, 'published', external_id=external_id or '')
+
+
+def finish(delivery, status, external_id='', error=''):
+    """Grava o resultado da entrega e, se era a última, o status final do Post."""
+    with transaction.atomic():
+        PostDelivery.objects.filter(pk=delivery.pk).update(
+            status=status,
+            external_id=external_id[:255],
+            last_error=error,
+            published_at=timezone.now() if status == 'published' else None,
+            updated_at=timezone.now(),
+        )
+        # Trava o Post: entregas terminando juntas não decidem o status em paralelo
+        list(Post.objects.select_for_update().filter(pk=delivery.post_id).values_list('pk'))
+        statuses = set(PostDelivery.objects.filter(post_id=delivery.post_id).values_list('status', flat=True))
+        if statuses <= set(FINAL_STATUSES):
+            Post.objects.filter(pk=delivery.post_id).update(
+                approval_status='failed' if 'failed' in statuses else 'published',
+                updated_at=timezone.now(),
+            )
+
+
+# ==============================================================================
+# AGENDADOR (POSTS VENCIDOS EM TODOS OS TENANTS)
+# ==============================================================================
+
+def in_flight_deliveries():
+    return BackgroundJob.objects.filter(task=job_name(deliver_post), status__in=['queued', 'running']).count()
+
+
+def dispatch_due_posts(now=None, limit=None):
+    """
+    Uma rodada do agendador. Pega os posts vencidos no DuePost (FOR UPDATE SKIP
+    LOCKED: vários agendadores não pegam o mesmo) e despacha cada um no seu
+    tenant. Só entra no schema dos tenants com posts vencidos. Enquanto houver
+    SCHEDULER_MAX_IN_FLIGHT entregas na fila, não despacha mais nada.
+    Retorna quantos posts foram despachados.
+    """
+    now = now or timezone.now()
+    limit = min(limit or settings.SCHEDULER_BATCH_SIZE, settings.SCHEDULER_MAX_IN_FLIGHT - in_flight_deliveries())
+    if limit <= 0:
+        return 0
+
+    dispatched = 0
+    with schema_context(get_public_schema_name()), transaction.atomic():
+        due = list(
+            DuePost.objects.select_for_update(skip_locked=True)
+            .filter(scheduled_for__lte=now).order_by('scheduled_for')[:limit]
+        )
+        by_schema = defaultdict(list)
+        for entry in due:
+            by_schema[entry.schema_name].append(entry)
+        tenants = set(get_tenant_model().objects.filter(schema_name__in=by_schema).values_list('schema_name', flat=True))
+
+        for schema_name, entries in by_schema.items():
+            ids = [entry.pk for entry in entries]
+            if schema_name in tenants:
+                try:
+                    # Savepoint: um tenant com erro não desfaz o despacho dos outros
+                    with transaction.atomic(), schema_context(schema_name):
+                        count, locked = dispatch_scheduled([entry.post_id for entry in entries], now)
+                except Exception:
+                    logger.exception('Agendador: erro ao despachar posts de %s', schema_name)
+                    DuePost.objects.filter(pk__in=ids).update(scheduled_for=now + DISPATCH_RETRY_DELAY)
+                    continue
+                dispatched += count
+                # Post travado por outra transação (edição, finish): fica para a próxima rodada
+                retry = [entry.pk for entry in entries if entry.post_id in locked]
+                DuePost.objects.filter(pk__in=retry).update(scheduled_for=now + DISPATCH_RETRY_DELAY)
+                ids = [pk for pk in ids if pk not in retry]
+            # Agência apagada ou posts já despachados/alterados: sai do índice
+            # (os despachados já saíram no dispatch_post)
+            DuePost.objects.filter(pk__in=ids).delete()
+    return dispatched
+
+
+def dispatch_scheduled(post_ids, now):
+    """
+    Despacha, no tenant atual, os posts ainda agendados e vencidos. Retorna
+    (quantos foram despachados, ids dos elegíveis travados por outra transação).
+    """
+    eligible = Post.objects.filter(pk__in=post_ids, approval_status='approved_to_schedule', scheduled_for__lte=now)
+    posts = list(eligible.select_for_update(skip_locked=True))
+    # SELECT sem FOR UPDATE não espera a trava: só descobre quem foi pulado
+    locked = set(eligible.values_list('pk', flat=True)) - {post.pk for post in posts}
+    return sum(1 for post in posts if dispatch_post(post)), locked
@@ -0,0 +1,107 @@
+# projects/ranking.py
+"""
+Ordenação fracionária (estilo LexoRank) para os cards do Kanban.
+
+Cada Task tem um `rank` (string base-36). Para mover um card basta gerar uma
+chave entre os ranks dos vizinhos, então um drag & drop grava UMA linha, em vez
+de reescrever o `order` de todos os cards da coluna.
+"""
+import zlib
+
+from django.db import connection
+
+RANK_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+RANK_BASE = len(RANK_DIGITS)
+
+# Quando uma chave passa deste tamanho a coluna é redistribuída (rebalance)
+RANK_REBALANCE_LENGTH = 32
+
+# Casas mínimas das chaves geradas no fim da coluna (rank_after)
+RANK_APPEND_WIDTH = 2
+
+
+def _midpoint(lo, hi):
+    """
+    Gera uma chave estritamente entre `lo` e `hi` (hi=None = sem limite superior).
+    As chaves nunca terminam em '0', o que garante que sempre existe espaço antes delas.
+    """
+    if hi is not None:
+        # Prefixo comum (completando `lo` com zeros à direita)
+        n = 0
+        while n < len(hi) and (lo[n] if n < len(lo) else '0') == hi[n]:
+            n += 1
+        if n > 0:
+            return hi[:n] + _midpoint(lo[n:], hi[n:])
+
+    digit_lo = RANK_DIGITS.index(lo[0]) if lo else 0
+    digit_hi = RANK_DIGITS.index(hi[0]) if hi is not None else RANK_BASE
+
+    if digit_hi - digit_lo > 1:
+        return RANK_DIGITS[(digit_lo + digit_hi + 1) // 2]
+
+    # Dígitos consecutivos: desce uma casa
+    if hi is not None and len(hi) > 1:
+        return hi[:1]
+    return RANK_DIGITS[digit_lo] + _midpoint(lo[1:], None)
+
+
+def rank_between(lo=None, hi=None):
+    """Retorna uma chave entre `lo` e `hi`. Use None para início/fim da coluna."""
+    lo = lo or ''
+    hi = hi or None
+    if hi is not None and lo >= hi:
+        raise ValueError(f"Rank inválido: '{lo}' não é menor que '{hi}'.")
+    return _midpoint(lo, hi)
+
+
+def rank_after(last=None):
+    """
+    Chave logo depois de `last`, para o fim da coluna. Em vez do ponto médio
+    (que ganha uma casa a cada poucos cards) soma 1 na última casa, com no
+    mínimo RANK_APPEND_WIDTH casas: a chave só cresce depois de ~36^n criações.
+    """
+    if not last:
+        return rank_between(None, None)
+    digits = list(last.ljust(RANK_APPEND_WIDTH, '0'))
+    for i in range(len(digits) - 1, -1, -1):
+        if digits[i] != RANK_DIGITS[-1]:
+            # Incrementa e descarta o resto: continua maior que `last` e nunca termina em '0'
+            return ''.join(digits[:i]) + RANK_DIGITS[RANK_DIGITS.index(digits[i]) + 1]
+    # Só 'z': não há como incrementar sem ganhar uma casa
+    return rank_between(last, None)
+
+
+def spaced_ranks(count):
+    """
+    Gera `count` chaves curtas e igualmente espaçadas (usadas no rebalance e na
+    migração do campo inteiro `order`).
+    """
+    width = 1
+    while RANK_BASE ** width <= count + 1:
+        width += 1
+    # Uma casa extra de folga para os próximos movimentos
+    width += 1
+    step = RANK_BASE ** width // (count + 1)
+
+    ranks = []
+    for i in range(1, count + 1):
+        value = step * i
+        digits = []
+        for _ in range(width):
+            value, remainder = divmod(value, RANK_BASE)
+            digits.append(RANK_DIGITS[remainder])
+        ranks.append(''.join(reversed(digits)).rstrip('0'))
+    return ranks
+
+
+def lock_column(kanban_type, status):
+    """
+    Trava (até o fim da transação) a coluna `kanban_type`/`status` do tenant atual.
+    Movimentos concorrentes na mesma coluna ficam serializados e nunca geram ranks duplicados.
+    Deve ser chamado dentro de `transaction.atomic()`.
+    """
+    schema = getattr(connection, 'schema_name', 'public')
+    namespace = zlib.crc32(b'task_rank') - 2 ** 31
+    key = zlib.crc32(f'{schema}:{kanban_type}:{status}'.encode('utf-8')) - 2 ** 31
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [namespace, key])
@@ -1,10 +1,48 @@
 # projects/services.py
 import requests
 from django.conf import settings
-from .models import SocialAccount
+from .models import Client, SocialAccount
+from . import provider_http
+from .jobs import job
+from .storage import open_stream
 import urllib.parse
 from requests.auth import HTTPBasicAuth
 
+# Timeout (conexão, leitura) das chamadas de publicação
+PUBLISH_TIMEOUT = (5, 60)
+
+
+class PublishError(Exception):
+    """ Falha definitiva da publicação (token inválido, conteúdo recusado...): não adianta repetir """
+
+
+def publish_response_json(response, platform):
+    """ JSON da resposta. 429/5xx sobem como HTTPError (a fila só repete 429/503, ver is_safe_to_retry) """
+    if response.status_code == 429 or response.status_code >= 500:
+        response.raise_for_status()
+    try:
+        data = response.json()
+    except ValueError:
+        data = {}
+    if response.status_code >= 400:
+        raise PublishError(f"{platform} recusou a publicação ({response.status_code}): {data or response.text[:300]}")
+    return data
+
+
+class SizedStream:
+    """ Corpo de upload lido em blocos direto do R2, com Content-Length (sem carregar o arquivo na memória) """
+
+    def __init__(self, stream, size):
+        self.stream = stream
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def read(self, amount=-1):
+        return self.stream.read(amount)
+
+
 class MetaService:
     BASE_URL = "https://graph.facebook.com/v19.0"
 
@@ -27,13 +65,13 @@ class MetaService:
             f"client_secret={settings.META_APP_SECRET}&"
             f"code={code}"
         )
-        response = requests.get(url)
+        response = provider_http.get(url)
         return response.json()
 
     def save_only_facebook_pages(self, user_access_token, client_obj):
         """ Salva APENAS páginas do Facebook (Ignora Instagram) """
         url = f"{self.BASE_URL}/me/accounts?access_token={user_access_token}&fields=id,name,access_token"
-        response = requests.get(url)
+        response = provider_http.get(url)
         data = response.json()
         
         # DEBUG: Imprime no console o que a Meta retornou para te ajudar a investigar
@@ -63,7 +101,7 @@ class MetaService:
     def save_only_instagram_accounts(self, user_access_token, client_obj):
         """ Salva APENAS contas do Instagram (Ignora Páginas soltas) """
         url = f"{self.BASE_URL}/me/accounts?access_token={user_access_token}&fields=id,name,access_token,instagram_business_account"
-        response = requests.get(url)
+        response = provider_http.get(url)
         data = response.json()
         
         # DEBUG: Imprime no console o que a Meta retornou
@@ -93,11 +131,39 @@ class MetaService:
                 count += 1
         return count
 
+    def publish_facebook_post(self, account, caption, media=None):
+        """ Publica na Página (foto com legenda, ou só texto). Retorna o ID do post """
+        if media:
+            url = f"{self.BASE_URL}/{account.account_id}/photos"
+            payload = {'url': media.url, 'caption': caption}
+        else:
+            url = f"{self.BASE_URL}/{account.account_id}/feed"
+            payload = {'message': caption}
+        payload['access_token'] = account.access_token  # Token da própria Página
+        data = publish_response_json(provider_http.post(url, data=payload, timeout=PUBLISH_TIMEOUT), 'Facebook')
+        return data.get('post_id') or data.get('id', '')
+
+    def publish_instagram_post(self, account, caption, media=None):
+        """ Publica no Instagram: cria o container da imagem e publica. Retorna o ID da mídia """
+        if not media:
+            raise PublishError("O Instagram exige uma imagem no post.")
+        container = publish_response_json(provider_http.post(
+            f"{self.BASE_URL}/{account.account_id}/media",
+            data={'image_url': media.url, 'caption': caption, 'access_token': account.access_token},
+            timeout=PUBLISH_TIMEOUT,
+        ), 'Instagram')
+        data = publish_response_json(provider_http.post(
+            f"{self.BASE_URL}/{account.account_id}/media_publish",
+            data={'creation_id': container['id'], 'access_token': account.access_token},
+            timeout=PUBLISH_TIMEOUT,
+        ), 'Instagram')
+        return data.get('id', '')
+
     def get_instagram_details(self, ig_id, access_token):
         """ Pega o @usuario e foto do perfil """
         url = f"{self.BASE_URL}/{ig_id}?fields=username,profile_picture_url&access_token={access_token}"
         try:
-            return requests.get(url).json()
+            return provider_http.get(url).json()
         except:
             return {}
 
@@ -106,6 +172,7 @@ class LinkedInService:
     AUTH_URL = "https://www.linkedin.com/oauth/v2/authorization"
     TOKEN_URL = "https://www.linkedin.com/oauth/v2/accessToken"
     USER_INFO_URL = "https://api.linkedin.com/v2/userinfo"
+    API_URL = "https://api.linkedin.com/v2"
 
     def get_auth_url(self, state_token, redirect_uri):
         """ Gera a URL do botão 'Conectar LinkedIn' """
@@ -132,13 +199,13 @@ class LinkedInService:
         }
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
         
-        response = requests.post(self.TOKEN_URL, data=payload, headers=headers)
+        response = provider_http.post(self.TOKEN_URL, data=payload, headers=headers)
         return response.json()
 
     def get_user_profile(self, access_token):
         """ Busca dados do usuário (Nome, Foto, Sub/ID) """
         headers = {'Authorization': f'Bearer {access_token}'}
-        response = requests.get(self.USER_INFO_URL, headers=headers)
+        response = provider_http.get(self.USER_INFO_URL, headers=headers)
         return response.json()
 
     def save_account(self, token_data, client_obj):
@@ -172,6 +239,61 @@ class LinkedInService:
         )
         return account
 
+    def publish_post(self, account, caption, media=None):
+        """ Publica TEXTO (+ IMAGEM) no perfil da conta. Retorna o URN do post """
+        headers = {
+            'Authorization': f'Bearer {account.access_token}',
+            'Content-Type': 'application/json',
+            'X-Restli-Protocol-Version': '2.0.0'
+        }
+
+        # Descobre o URN do usuário caso ainda não esteja salvo
+        urn = account.account_id
+        if not urn or not urn.startswith('urn:li:'):
+            profile = publish_response_json(
+                provider_http.get(self.USER_INFO_URL, headers=headers, timeout=PUBLISH_TIMEOUT), 'LinkedIn'
+            )
+            urn = f"urn:li:person:{profile.get('sub')}"
+            account.account_id = urn
+            account.save(update_fields=['account_id'])
+
+        share = {"shareCommentary": {"text": caption}, "shareMediaCategory": "NONE"}
+        if media:
+            # ETAPA A: Registrar o Upload
+            reg_data = {
+                "registerUploadRequest": {
+                    "recipes": ["urn:li:digitalmediaRecipe:feedshare-image"],
+                    "owner": urn,
+                    "serviceRelationships": [{"relationshipType": "OWNER", "identifier": "urn:li:userGeneratedContent"}]
+                }
+            }
+            registered = publish_response_json(provider_http.post(
+                f"{self.API_URL}/assets?action=registerUpload", headers=headers, json=reg_data, timeout=PUBLISH_TIMEOUT
+            ), 'LinkedIn')['value']
+            upload_url = registered['uploadMechanism']['com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest']['uploadUrl']
+
+            # ETAPA B: Enviar o binário em streaming, direto do R2
+            with open_stream(media.storage, media.name) as stream:
+                response = provider_http.post(
+                    upload_url,
+                    headers={'Authorization': f'Bearer {account.access_token}'},
+                    data=SizedStream(stream, media.size),
+                    timeout=PUBLISH_TIMEOUT,
+                )
+            publish_response_json(response, 'LinkedIn')
+            share.update({"shareMediaCategory": "IMAGE", "media": [{"status": "READY", "media": registered['asset']}]})
+
+        # ETAPA C: Post final
+        post_data = {
+            "author": urn,
+            "lifecycleState": "PUBLISHED",
+            "specificContent": {"com.linkedin.ugc.ShareContent": share},
+            "visibility": {"com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"}
+        }
+        response = provider_http.post(f"{self.API_URL}/ugcPosts", headers=headers, json=post_data, timeout=PUBLISH_TIMEOUT)
+        data = publish_response_json(response, 'LinkedIn')
+        return response.headers.get('x-restli-id') or data.get('id', '')
+
 class TikTokService:
     # Endpoints da API V2 do TikTok
     AUTH_URL = "https://www.tiktok.com/v2/auth/authorize/"
@@ -221,7 +343,7 @@ class TikTokService:
         }
 
         try:
-            response = requests.post(self.TOKEN_URL, data=data, headers=headers)
+            response = provider_http.post(self.TOKEN_URL, data=data, headers=headers)
             response.raise_for_status() # Levanta erro se não for 200 OK
             return response.json() # Retorna o JSON com access_token e open_id
             
@@ -238,7 +360,7 @@ class TikTokService:
         headers = {"Authorization": f"Bearer {access_token}"}
 
         try:
-            response = requests.get(self.USER_INFO_URL, params=params, headers=headers)
+            response = provider_http.get(self.USER_INFO_URL, params=params, headers=headers)
             if response.status_code == 200:
                 data = response.json().get('data', {})
                 return {
@@ -309,7 +431,7 @@ class PinterestService:
         auth = HTTPBasicAuth(settings.PINTEREST_APP_ID, settings.PINTEREST_APP_SECRET)
 
         try:
-            response = requests.post(self.TOKEN_URL, data=data, auth=auth)
+            response = provider_http.post(self.TOKEN_URL, data=data, auth=auth)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -325,7 +447,7 @@ class PinterestService:
         }
         
         try:
-            response = requests.get(self.USER_INFO_URL, headers=headers)
+            response = provider_http.get(self.USER_INFO_URL, headers=headers)
             if response.status_code == 200:
                 return response.json() # Retorna {username, profile_image, etc}
             return None
@@ -385,7 +507,7 @@ class YouTubeService:
             "grant_type": "authorization_code",
             "redirect_uri": redirect_uri,
         }
-        response = requests.post(url, data=data)
+        response = provider_http.post(url, data=data)
         return response.json()
 
     def save_account(self, token_data, client):
@@ -405,7 +527,7 @@ class YouTubeService:
             "Authorization": f"Bearer {access_token}"
         }
         
-        response = requests.get(channel_url, headers=headers, params=params)
+        response = provider_http.get(channel_url, headers=headers, params=params)
         channel_data = response.json()
 
         if 'items' in channel_data and len(channel_data['items']) > 0:
@@ -452,7 +574,7 @@ class XService:
         }
         # O X exige autenticação básica com o ID e Secret na hora de pegar o token
         auth = HTTPBasicAuth(settings.X_CLIENT_ID, settings.X_CLIENT_SECRET)
-        response = requests.post(url, data=data, auth=auth)
+        response = provider_http.post(url, data=data, auth=auth)
         return response.json()
 
     def save_account(self, token_data, client):
@@ -466,7 +588,7 @@ class XService:
         user_url = "https://api.twitter.com/2/users/me"
         headers = {"Authorization": f"Bearer {access_token}"}
         
-        response = requests.get(user_url, headers=headers)
+        response = provider_http.get(user_url, headers=headers)
         user_data = response.json()
 
         if 'data' in user_data:
@@ -485,4 +607,41 @@ class XService:
                 }
             )
             return account
-        return None
\ No newline at end of file
+        return None
+
+    def publish_post(self, account, caption, media=None):
+        """ Publica um post de texto. Retorna o ID """
+        if media:
+            # Imagens no X passam pelo upload da API v1.1 (OAuth 1.0a), que não usamos
+            raise PublishError("Imagens no X ainda não são publicadas automaticamente.")
+        response = provider_http.post(
+            "https://api.twitter.com/2/tweets",
+            headers={"Authorization": f"Bearer {account.access_token}"},
+            json={"text": caption},
+            timeout=PUBLISH_TIMEOUT,
+        )
+        return publish_response_json(response, 'X').get('data', {}).get('id', '')
+
+
+# ==============================================================================
+# TAREFAS EM SEGUNDO PLANO (projects.jobs)
+# ==============================================================================
+
+@job(max_attempts=3)
+def discover_meta_accounts(client_id, intent='both'):
+    """
+    Busca e salva as Páginas/Instagrams do token do cliente (era feito dentro do
+    callback OAuth). O token é lido do Client: não vai para os args da fila.
+    """
+    client = Client.objects.filter(pk=client_id).first()
+    if client is None or not client.meta_access_token:
+        return 0
+    access_token = client.meta_access_token
+
+    service = MetaService()
+    count = 0
+    if intent != 'instagram_only':
+        count += service.save_only_facebook_pages(access_token, client)
+    if intent != 'facebook_only':
+        count += service.save_only_instagram_accounts(access_token, client)
+    return count
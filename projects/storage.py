@@ -0,0 +1,190 @@
+# projects/storage.py
+"""
+Utilitários de storage (Cloudflare R2 via django-storages / S3).
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.db import connection
+from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+
+# Tamanho padrão dos blocos lidos do R2 em downloads/streams
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def open_stream(storage, name):
+    """
+    Abre o arquivo para leitura sequencial em blocos, sem baixá-lo inteiro.
+
+    O `File.open()` do S3Boto3Storage copia o objeto todo para um arquivo
+    temporário em memória antes do primeiro read(); aqui, no R2, lemos direto o
+    corpo do GET (StreamingBody). Outros storages (ex: FileSystemStorage nos
+    testes) usam o open() normal. Use com `with`.
+    """
+    bucket = getattr(storage, 'bucket', None)
+    if bucket is None:
+        return storage.open(name, 'rb')
+    body = bucket.Object(storage._normalize_name(name)).get()['Body']
+    return closing(body)
+
+
+def sha256_hexdigest(chunks):
+    """SHA-256 (hex) calculado em streaming a partir de um iterável de blocos."""
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def presigned_put_url(storage, name, content_type='', expires=3600):
+    """
+    URL assinada para o navegador enviar o objeto direto ao R2 (PUT), sem passar
+    pelos workers. Se `content_type` for informado, o PUT precisa mandar o mesmo
+    header Content-Type (ele entra na assinatura).
+    """
+    params = {'Bucket': storage.bucket_name, 'Key': storage._normalize_name(name)}
+    if content_type:
+        params['ContentType'] = content_type
+    return storage.bucket.meta.client.generate_presigned_url(
+        'put_object', Params=params, ExpiresIn=expires, HttpMethod='PUT'
+    )
+
+
+def head_object(storage, name):
+    """
+    Confere se o objeto existe e retorna {'size', 'content_type'} (ou None).
+    No R2 é um HEAD; nos outros storages usa exists()/size().
+    """
+    bucket = getattr(storage, 'bucket', None)
+    if bucket is None:
+        if not storage.exists(name):
+            return None
+        return {'size': storage.size(name), 'content_type': ''}
+
+    try:
+        head = bucket.meta.client.head_object(Bucket=bucket.name, Key=storage._normalize_name(name))
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    return {'size': head['ContentLength'], 'content_type': head.get('ContentType', '')}
+
+
+# Limite do DeleteObjects (S3/R2) por chamada
+DELETE_BATCH_SIZE = 1000
+
+
+def schedule_deletes(keys, schema_name=None):
+    """
+    Agenda a remoção das chaves no R2 (fila PendingObjectDelete, schema public).
+    Roda na transação de quem chamou: se ela sofrer rollback, nada é apagado.
+    """
+    from accounts.models import PendingObjectDelete
+
+    schema_name = schema_name if schema_name is not None else getattr(connection, 'schema_name', '')
+    PendingObjectDelete.objects.bulk_create(
+        (PendingObjectDelete(key=key, schema_name=schema_name) for key in keys if key),
+        batch_size=DELETE_BATCH_SIZE,
+    )
+
+
+def delete_objects(storage, keys):
+    """
+    Apaga as chaves com um DeleteObjects (até 1000). Retorna {chave: erro} das que
+    falharam; exceções de rede/credencial sobem (o lote inteiro é reagendado).
+    Storages sem bucket (testes/dev) apagam uma a uma.
+    """
+    bucket = getattr(storage, 'bucket', None)
+    if bucket is None:
+        for key in keys:
+            storage.delete(key)
+        return {}
+
+    response = bucket.meta.client.delete_objects(
+        Bucket=bucket.name,
+        Delete={'Objects': [{'Key': storage._normalize_name(key)} for key in keys], 'Quiet': True},
+    )
+    return {error['Key']: f"{error.get('Code')}: {error.get('Message')}" for error in response.get('Errors', [])}
+
+
+# ==============================================================================
+# CACHE DE URLS ASSINADAS
+# ==============================================================================
+
+class CachedURLS3Storage(S3Boto3Storage):
+    """
+    S3Boto3Storage que reaproveita as URLs assinadas (querystring_auth).
+
+    Cada `.url` assinado calcula uma assinatura SigV4. Um card do Kanban chega a
+    pedir seis, e o logo do cliente é assinado de novo em todas as tarefas dele.
+    Aqui a URL de cada chave fica num LRU em memória (por processo; o projeto não
+    tem um cache compartilhado entre workers). Ela vale por
+    querystring_expire - url_cache_margin segundos, então uma URL servida do
+    cache ainda tem pelo menos `url_cache_margin` segundos de validade.
+
+    Só entram no cache as chamadas padrão (sem parameters/expire/http_method) e
+    apenas quando a URL é de fato assinada: sem querystring_auth, ou com
+    custom_domain sem CloudFront signer, a URL é pública (montar a string não
+    custa nada) e o cache fica de fora.
+    """
+
+    def get_default_settings(self):
+        return {
+            **super().get_default_settings(),
+            'url_cache_max_entries': settings.MEDIA_URL_CACHE_MAX_ENTRIES,
+            'url_cache_margin': settings.MEDIA_URL_CACHE_MARGIN,
+        }
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.url_cache_enabled = True
+        self._url_lru = OrderedDict()
+        self._url_lock = threading.Lock()
+
+    @property
+    def url_cache_ttl(self):
+        return self.querystring_expire - self.url_cache_margin
+
+    def _signs_urls(self):
+        if not self.querystring_auth:
+            return False
+        return not self.custom_domain or bool(self.cloudfront_signer)
+
+    def _url_cache_key(self, name):
+        identity = f'{self.endpoint_url}|{self.bucket_name}|{self._normalize_name(clean_name(name))}'
+        return 'media-url:' + hashlib.sha1(identity.encode()).hexdigest()
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
+        if (
+            parameters or expire is not None or http_method or not self.url_cache_enabled
+            or self.url_cache_ttl <= 0 or not self._signs_urls()
+        ):
+            return super().url(name, parameters, expire, http_method)
+
+        key = self._url_cache_key(name)
+        now = time.time()
+        with self._url_lock:
+            entry = self._url_lru.get(key)
+            if entry and entry[1] > now:
+                self._url_lru.move_to_end(key)
+                return entry[0]
+
+        entry = (super().url(name), now + self.url_cache_ttl)
+        with self._url_lock:
+            self._url_lru[key] = entry
+            self._url_lru.move_to_end(key)
+            while len(self._url_lru) > self.url_cache_max_entries:
+                self._url_lru.popitem(last=False)
+        return entry[0]
+
+    def delete(self, name):
+        super().delete(name)
+        key = self._url_cache_key(name)
+        with self._url_lock:
+            self._url_lru.pop(key, None)
@@ -1,3 +1,1942 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest.mock import patch
+from urllib.parse import urlencode
 
-# Create your tests here.
+import requests
+from asgiref.sync import async_to_sync
+from botocore.stub import ANY, Stubber
+from PIL import Image
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_tenants.test.cases import TenantTestCase
+from django_tenants.test.client import TenantClient
+from storages.backends.s3boto3 import S3Boto3Storage
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from accounts.models import Agency, BackgroundJob, CustomUser, DuePost, PendingObjectDelete
+from .models import (
+    Client, MediaBlob, MediaFile, MediaFolder, MultipartUpload, Post, SocialAccount, StorageUsage, Tag, Task, TaskTombstone,
+    OPERATIONAL_KANBAN_STAGES, schedule_tenant_media_deletes, task_search_vector,
+)
+from .management.tenant_command import TenantCommand
+from .derivatives import derivative_keys
+from .events import PostgresEventBackend, reset_event_backend, task_event_stream
+from .jobs import claim, enqueue, job, requeue_stale, work
+from . import provider_http
+from .multipart import MAX_PARTS, part_size_for
+from .publishing import dispatch_due_posts, is_safe_to_retry
+from .storage import CachedURLS3Storage, open_stream, presigned_put_url
+from .views import DIRECT_UPLOAD_SALT
+from .ranking import RANK_REBALANCE_LENGTH, rank_after, rank_between, spaced_ranks
+from .services import LinkedInService, MetaService, PublishError
+from .zipstream import prefetch_media, stream_media_zip
+
+
+class BrainHubTenantTestCase(TenantTestCase):
+    """Base dos testes: cria o tenant de teste com os campos obrigatórios da Agency."""
+
+    def _pre_setup(self):
+        super()._pre_setup()
+        # Mídia num diretório temporário por teste: nada vai para o R2 nem sobra em disco
+        media_root = tempfile.mkdtemp(prefix='brainhub-media-')
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        storages_override = override_settings(STORAGES={
+            **settings.STORAGES,
+            'default': {
+                'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                'OPTIONS': {'location': media_root, 'base_url': '/media/'},
+            },
+        })
+        storages_override.enable()
+        self.addCleanup(storages_override.disable)
+
+    @classmethod
+    def setup_tenant(cls, tenant):
+        tenant.name = 'Agência Teste'
+
+    def login(self):
+        """Retorna um TenantClient autenticado com um usuário da agência de teste."""
+        user = CustomUser.objects.create_user(username='equipe', password='x' * 12, agency=self.tenant)
+        http = TenantClient(self.tenant)
+        http.force_login(user)
+        return http
+
+
+# ==============================================================================
+# KANBAN: SERIALIZAÇÃO EM LOTE
+# ==============================================================================
+
+class BoardPayloadTests(BrainHubTenantTestCase):
+
+    def setUp(self):
+        self.client_obj = Client.objects.create(name='Cliente Teste')
+        self.user = CustomUser.objects.create_user(
+            username='designer', first_name='Ana', last_name='Souza', password='x' * 12
+        )
+
+    def _create_tasks(self, count):
+        for i in range(count):
+            task = Task.objects.create(
+                title=f'Card {i}', kanban_type='operational', status='briefing',
+                client=self.client_obj, order=i,
+            )
+            task.assigned_to.add(self.user)
+
+    def _count_payload_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            payload = Task.objects.filter(kanban_type='operational').to_board_payload()
+        return len(ctx.captured_queries), payload
+
+    def test_query_count_does_not_grow_with_board_size(self):
+        self._create_tasks(3)
+        small_queries, small_payload = self._count_payload_queries()
+
+        self._create_tasks(30)
+        big_queries, big_payload = self._count_payload_queries()
+
+        self.assertEqual(len(small_payload), 3)
+        self.assertEqual(len(big_payload), 33)
+        self.assertEqual(small_queries, big_queries)
+
+    def test_payload_matches_to_dict(self):
+        self._create_tasks(2)
+        payload = Task.objects.filter(kanban_type='operational').to_board_payload()
+        expected = [t.to_dict() for t in Task.objects.filter(kanban_type='operational')]
+
+        self.assertEqual(payload, expected)
+        self.assertEqual(payload[0]['assignees'][0]['initials'], 'AS')
+        self.assertEqual(payload[0]['client_name'], 'Cliente Teste')
+
+
+class BoardColumnsTests(BrainHubTenantTestCase):
+
+    def setUp(self):
+        for i, status in enumerate(['briefing', 'design', 'design', 'design', 'status_antigo']):
+            Task.objects.create(title=f'Card {i}', kanban_type='operational', status=status, order=i)
+
+    def test_columns_are_built_from_a_single_task_query(self):
+        tasks = Task.objects.filter(kanban_type='operational').order_by('order')
+        with CaptureQueriesContext(connection) as ctx:
+            columns = tasks.to_board_columns(OPERATIONAL_KANBAN_STAGES)
+
+        task_queries = [q for q in ctx.captured_queries if 'FROM "projects_task"' in q['sql']]
+        self.assertEqual(len(task_queries), 1)
+        self.assertEqual([c['id'] for c in columns], [key for key, label in OPERATIONAL_KANBAN_STAGES])
+
+    def test_unknown_status_goes_to_fallback_column(self):
+        columns = Task.objects.filter(kanban_type='operational').order_by('order').to_board_columns(
+            OPERATIONAL_KANBAN_STAGES
+        )
+        briefing = columns[0]
+        self.assertEqual([t['title'] for t in briefing['tasks']], ['Card 0', 'Card 4'])
+
+    def test_limit_truncates_but_keeps_real_count(self):
+        columns = Task.objects.filter(kanban_type='operational').order_by('order').to_board_columns(
+            OPERATIONAL_KANBAN_STAGES, limit=2
+        )
+        design = dict((c['id'], c) for c in columns)['design']
+        self.assertEqual(design['count'], 3)
+        self.assertEqual(len(design['tasks']), 2)
+        self.assertTrue(design['truncated'])
+
+    @override_settings(KANBAN_COLUMN_MAX_CARDS=2)
+    def test_operational_view_applies_the_column_limit(self):
+        response = self.login().get('/kanban/operational/')
+
+        design = dict((c['id'], c) for c in response.context['kanban_columns'])['design']
+        self.assertEqual((len(design['tasks']), design['count']), (2, 3))
+        self.assertContains(response, 'Exibindo 2 de 3 cards')
+
+
+# ==============================================================================
+# KANBAN: ORDENAÇÃO POR RANK
+# ==============================================================================
+
+class RankingTests(BrainHubTenantTestCase):
+
+    def _column(self):
+        return list(
+            Task.objects.filter(kanban_type='general', status='todo').values_list('title', flat=True)
+        )
+
+    def test_rank_between_and_spaced_ranks_are_ordered(self):
+        ranks = spaced_ranks(50)
+        self.assertEqual(ranks, sorted(ranks))
+        self.assertEqual(len(set(ranks)), 50)
+
+        key = rank_between(ranks[0], ranks[1])
+        self.assertTrue(ranks[0] < key < ranks[1])
+        self.assertTrue(rank_between(None, ranks[0]) < ranks[0])
+        self.assertTrue(rank_between(ranks[-1], None) > ranks[-1])
+        self.assertEqual([rank_after('i'), rank_after('i1'), rank_after('iz'), rank_after('a3z')], ['i1', 'i2', 'j', 'a4'])
+        self.assertTrue(rank_after('zz') > 'zz')
+
+    def test_create_in_column_appends_to_the_end(self):
+        for title in ['A', 'B', 'C']:
+            Task.objects.create_in_column(title=title, kanban_type='general', status='todo')
+        self.assertEqual(self._column(), ['A', 'B', 'C'])
+
+    def test_appending_hundreds_of_cards_keeps_keys_short(self):
+        for i in range(500):
+            Task.objects.create_in_column(title=f'Card {i:03}', kanban_type='general', status='todo')
+
+        ranks = list(Task.objects.filter(kanban_type='general').order_by('rank').values_list('rank', flat=True))
+        self.assertEqual(len(set(ranks)), 500)
+        self.assertLessEqual(max(len(rank) for rank in ranks), 3)
+        self.assertEqual(self._column(), [f'Card {i:03}' for i in range(500)])
+
+        # Coluna com chaves longas (legado): a criação redistribui antes de passar do limite
+        Task.objects.filter(title='Card 499').update(rank='z' * RANK_REBALANCE_LENGTH)
+        last = Task.objects.create_in_column(title='Último', kanban_type='general', status='todo')
+        self.assertLessEqual(len(last.rank), RANK_REBALANCE_LENGTH)
+        self.assertEqual(self._column()[-2:], ['Card 499', 'Último'])
+
+    def test_move_writes_only_the_moved_card(self):
+        tasks = [
+            Task.objects.create_in_column(title=title, kanban_type='general', status='todo')
+            for title in ['A', 'B', 'C', 'D']
+        ]
+
+        with CaptureQueriesContext(connection) as ctx:
+            tasks[3].move_to('todo', after_id=tasks[0].id)
+
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self._column(), ['A', 'D', 'B', 'C'])
+
+    def test_legacy_order_column_is_migrated_on_first_move(self):
+        for i, title in enumerate(['A', 'B', 'C']):
+            Task.objects.create(title=title, kanban_type='general', status='todo', order=i)
+
+        c = Task.objects.get(title='C')
+        c.move_to('todo', before_id=Task.objects.get(title='A').id)
+
+        self.assertEqual(self._column(), ['C', 'A', 'B'])
+        self.assertFalse(Task.objects.filter(rank='').exists())
+
+    def test_repeated_moves_into_same_gap_trigger_rebalance(self):
+        a = Task.objects.create_in_column(title='A', kanban_type='general', status='todo')
+        b = Task.objects.create_in_column(title='B', kanban_type='general', status='todo')
+        for i in range(300):
+            task = Task.objects.create_in_column(title=f'N{i}', kanban_type='general', status='todo')
+            task.move_to('todo', before_id=b.id)
+
+        ranks = list(Task.objects.filter(kanban_type='general').values_list('rank', flat=True))
+        self.assertEqual(len(set(ranks)), len(ranks))
+        self.assertTrue(all(len(rank) <= 64 for rank in ranks))
+        self.assertEqual(self._column()[0], 'A')
+        self.assertEqual(self._column()[-1], 'B')
+
+
+class RankingConcurrencyTests(TransactionTestCase):
+    """Vários movimentos simultâneos para o mesmo ponto da coluna não geram ranks duplicados."""
+
+    MOVES = 12
+
+    def setUp(self):
+        self.tenant = Agency(schema_name='rank_concurrency', name='Concorrência')
+        self.tenant.save(verbosity=0)
+        connection.set_tenant(self.tenant)
+        self.anchor = Task.objects.create_in_column(title='Topo', kanban_type='operational', status='design')
+        Task.objects.create_in_column(title='Fim', kanban_type='operational', status='design')
+        self.movers = [
+            Task.objects.create_in_column(title=f'Card {i}', kanban_type='operational', status='briefing')
+            for i in range(self.MOVES)
+        ]
+
+    def tearDown(self):
+        connection.set_schema_to_public()
+        self.tenant.delete(force_drop=True)
+
+    def test_concurrent_moves_never_duplicate_ranks(self):
+        barrier = threading.Barrier(self.MOVES)
+        errors = []
+
+        def move(task_id):
+            try:
+                connection.set_tenant(self.tenant)
+                barrier.wait()
+                Task.objects.get(pk=task_id).move_to('design', after_id=self.anchor.id)
+            except Exception as e:  # pragma: no cover - só para o relatório do teste
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=move, args=(task.id,)) for task in self.movers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        ranks = list(Task.objects.filter(status='design').values_list('rank', flat=True))
+        self.assertEqual(len(ranks), self.MOVES + 2)
+        self.assertEqual(len(set(ranks)), len(ranks))
+
+
+# ==============================================================================
+# KANBAN: DELTA (changes since cursor)
+# ==============================================================================
+
+class KanbanChangesTests(BrainHubTenantTestCase):
+
+    def setUp(self):
+        self.http = self.login()
+        self.url = '/api/kanban/general/changes/'
+        self.tasks = [
+            Task.objects.create_in_column(title=f'Card {i}', kanban_type='general', status='todo')
+            for i in range(5)
+        ]
+
+    def test_without_cursor_returns_full_board(self):
+        data = self.http.get(self.url).json()
+        self.assertTrue(data['reset'])
+        self.assertEqual(len(data['tasks']), 5)
+        self.assertTrue(data['cursor'])
+
+    def test_returns_only_changes_since_cursor(self):
+        cursor = self.http.get(self.url).json()['cursor']
+        # Tira as tarefas da janela de tolerância do cursor
+        Task.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        TaskTombstone.objects.all().delete()
+
+        deleted_id = self.tasks[3].id
+        self.tasks[1].move_to('doing')
+        self.tasks[3].delete()
+
+        data = self.http.get(self.url, {'since': cursor}).json()
+        self.assertFalse(data['reset'])
+        self.assertEqual([t['id'] for t in data['tasks']], [self.tasks[1].id])
+        self.assertEqual(data['tasks'][0]['status'], 'doing')
+        self.assertEqual(data['deleted'], [deleted_id])
+
+    def test_invalid_cursor_and_board_type(self):
+        self.assertEqual(self.http.get(self.url, {'since': 'abc'}).status_code, 400)
+        self.assertEqual(self.http.get('/api/kanban/xyz/changes/').status_code, 404)
+
+
+# ==============================================================================
+# KANBAN: EVENTOS EM TEMPO REAL (SSE)
+# ==============================================================================
+
+class KanbanEventsTests(BrainHubTenantTestCase):
+
+    def setUp(self):
+        # O TenantTestCase não aplica override_settings de classe; ativa aqui
+        self.addCleanup(reset_event_backend)
+        settings_override = override_settings(KANBAN_EVENTS_BACKEND='projects.events.InProcessEventBackend')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        reset_event_backend()
+        self.http = self.login()
+        self.task = Task.objects.create_in_column(title='Card', kanban_type='operational', status='briefing')
+
+    def test_move_is_pushed_to_open_streams(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        stream = task_event_stream(self.tenant.schema_name, 'operational')
+        self.assertEqual(loop.run_until_complete(stream.__anext__()), 'retry: 5000\n\n')
+
+        # Deixa o stream inscrito e aguardando o próximo evento
+        frame = loop.create_task(stream.__anext__())
+        loop.run_until_complete(asyncio.sleep(0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.http.post(
+                '/api/kanban/update/', json.dumps({'task_id': self.task.id, 'status': 'design'}),
+                content_type='application/json',
+            )
+        self.assertEqual(response.json()['status'], 'success')
+
+        text = loop.run_until_complete(asyncio.wait_for(frame, timeout=2))
+        loop.run_until_complete(stream.aclose())
+
+        event, data = text.strip().split('\n')
+        self.assertEqual(event, 'event: moved')
+        message = json.loads(data[len('data: '):])
+        self.assertEqual(message['task_id'], self.task.id)
+        self.assertEqual(message['status'], 'design')
+
+    def test_postgres_listener_connects_off_the_event_loop(self):
+        backend = PostgresEventBackend()
+        threads = []
+        connect = backend._connect
+
+        def recording_connect():
+            threads.append(threading.get_ident())
+            return connect()
+
+        async def scenario():
+            async with backend.subscribe('kanban_test'):
+                self.assertEqual(backend._listening, {'kanban_test'})
+            await asyncio.gather(*backend._pending)
+            self.assertEqual(backend._listening, set())
+            backend._close_listener()
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        with patch.object(backend, '_connect', recording_connect):
+            loop.run_until_complete(scenario())
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+    def test_stream_releases_request_connections(self):
+        with patch('projects.views.release_db_connections') as release, \
+                patch('projects.views.task_event_stream', return_value=iter(['retry: 5000\n\n'])):
+            response = self.http.get('/api/kanban/operational/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        release.assert_called_once()
+
+    def test_card_fragment_renders_single_card(self):
+        response = self.http.get(f'/api/kanban/card/{self.task.id}/')
+        self.assertContains(response, f'data-id="{self.task.id}"')
+        self.assertContains(response, 'Card')
+
+
+# ==============================================================================
+# TAGS
+# ==============================================================================
+
+class TaskTagTests(BrainHubTenantTestCase):
+
+    def setUp(self):
+        self.http = self.login()
+        self.dev = Task.objects.create(title='Deploy', kanban_type='general', status='todo')
+        self.dev.set_tags(['Dev', ' Dev ', 'Financeiro', ''])
+        self.fin = Task.objects.create(title='Notas', kanban_type='general', status='todo', tags='Financeiro,Reuniões')
+
+    def test_set_tags_filter_and_usage(self):
+        self.assertEqual(self.dev.to_dict()['tags'], ['Dev', 'Financeiro'])
+        self.assertEqual(list(Task.objects.with_tag('Dev')), [self.dev])
+
+        board = json.loads(self.http.get('/kanban/general/', {'tag': 'Dev'}).context['kanban_data_json'])
+        self.assertEqual([t['id'] for t in board['todo']], [self.dev.id])
+
+        data = self.http.get('/api/tasks/tags/').json()
+        self.assertEqual(data['tags'], [{'name': 'Dev', 'count': 1}, {'name': 'Financeiro', 'count': 1}])
+
+    def test_legacy_tags_are_migrated(self):
+        call_command('migrate_task_tags', schema=[self.tenant.schema_name], workers=1, stdout=io.StringIO())
+        call_command('migrate_task_tags', schema=[self.tenant.schema_name], workers=1, stdout=io.StringIO())
+
+        self.assertEqual(self.fin.to_dict()['tags'], ['Financeiro', 'Reuniões'])
+        counts = {t['name']: t['count'] for t in self.http.get('/api/tasks/tags/').json()['tags']}
+        self.assertEqual(counts, {'Dev': 1, 'Financeiro': 2, 'Reuniões': 1})
+
+
+# ==============================================================================
+# BUSCA TEXTUAL
+# ==============================================================================
+
+class TaskSearchTests(BrainHubTenantTestCase):
+
+    def setUp(self):
+        self.http = self.login()
+        self.in_title = Task.objects.create(title='Campanha de verão', kanban_type='operational', status='copy')
+        self.in_caption = Task.objects.create(
+            title='Post institucional', kanban_type='operational', status='copy',
+            caption_content='Chegou a nova campanha da loja',
+        )
+        Task.objects.create(title='Relatório mensal', kanban_type='general', status='todo')
+
+    def test_search_is_ranked_stemmed_and_highlighted(self):
+        data = self.http.get('/api/tasks/search/', {'q': 'campanhas'}).json()
+
+        self.assertEqual([r['id'] for r in data['results']], [self.in_title.id, self.in_caption.id])
+        self.assertEqual(data['results'][0]['title_highlight'], '<mark>Campanha</mark> de verão')
+        self.assertIn('<mark>campanha</mark>', data['results'][1]['snippet'])
+
+    def test_highlights_escape_the_task_text(self):
+        Task.objects.create(title='<img src=x onerror=alert(1)> campanha', kanban_type='general', status='todo')
+
+        results = self.http.get('/api/tasks/search/', {'q': 'campanha'}).json()['results']
+        highlight = next(r['title_highlight'] for r in results if 'img' in r['title_highlight'])
+        self.assertEqual(highlight, '&lt;img src=x onerror=alert(1)&gt; <mark>campanha</mark>')
+
+    def test_limit_is_parsed_defensively(self):
+        for limit, expected in [('-5', 1), ('abc', 2), ('1000', 2)]:
+            with self.subTest(limit=limit):
+                response = self.http.get('/api/tasks/search/', {'q': 'campanha', 'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()['results']), expected)
+
+    def test_vector_follows_edits(self):
+        self.in_caption.caption_content = 'Texto sem o termo'
+        self.in_caption.save()
+        self.in_title.move_to('design')  # Movimento não recalcula o vetor, mas mantém o resultado
+
+        ids = list(Task.objects.search('campanha').values_list('id', flat=True))
+        self.assertEqual(ids, [self.in_title.id])
+
+
+# ==============================================================================
+# MÉTRICAS DO CLIENTE
+# ==============================================================================
+
+class ClientMetricsTests(BrainHubTenantTestCase):
+
+    def setUp(self):
+        self.http = self.login()
+        self.client_obj = Client.objects.create(name='Cliente Métricas')
+        for status in ['todo', 'done', 'done']:
+            Task.objects.create(title='Tarefa', kanban_type='general', status=status, client=self.client_obj)
+        for status in ['briefing', 'scheduled']:
+            Task.objects.create(title='Post', kanban_type='operational', status=status, client=self.client_obj)
+        self.url = f'/clients/{self.client_obj.pk}/metrics/'
+
+    def test_dashboard_numbers_come_from_one_query_and_are_cached(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.http.get(self.url)
+        task_queries = [q for q in ctx.captured_queries if 'FROM "projects_task"' in q['sql']]
+        self.assertEqual(len(task_queries), 1)
+
+        self.assertEqual(response.context['total_tasks'], 3)
+        self.assertEqual(response.context['total_posts'], 2)
+        self.assertEqual(response.context['posts_scheduled'], 1)
+        self.assertEqual(json.loads(response.context['task_chart_data']), {'todo': 1, 'done': 2})
+        weekly = json.loads(response.context['weekly_chart_data'])
+        self.assertEqual((weekly['created'][-1], weekly['completed'][-1]), (5, 3))
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.http.get(self.url)
+        self.assertFalse([q for q in ctx.captured_queries if 'FROM "projects_task"' in q['sql']])
+
+    def test_task_changes_invalidate_the_rollup(self):
+        self.http.get(self.url)
+        other = Client.objects.create(name='Outro')
+
+        task = Task.objects.get(status='todo')
+        task.client = other
+        task.save()
+        self.assertEqual(self.http.get(self.url).context['total_tasks'], 2)
+
+        Task.objects.filter(status='briefing').get().delete()
+        self.assertEqual(self.http.get(self.url).context['total_posts'], 1)
+
+    def test_completion_week_survives_reorders_and_edits(self):
+        done = Task.objects.filter(kanban_type='general', status='done')
+        done.update(completed_at=timezone.now() - timedelta(weeks=6))
+        weekly = lambda: Task.objects.filter(kanban_type='general').metrics_rollup()['weekly']['completed']
+        self.assertEqual((weekly()[5], weekly()[-1]), (2, 0))
+
+        first, second = done.order_by('pk')
+        Task.objects.filter(pk__in=[first.pk, second.pk]).update(rank='')
+        first.move_to(after_id=second.pk)  # Coluna legada: rebalanceia todos os cards
+        second.refresh_from_db()
+        second.title = 'Editada'
+        second.save()
+        self.assertEqual((weekly()[5], weekly()[-1]), (2, 0))
+
+        first.move_to('todo')
+        first.refresh_from_db()
+        self.assertIsNone(first.completed_at)
+        first.move_to('done')
+        self.assertEqual((weekly()[5], weekly()[-1]), (1, 1))
+
+
+# ==============================================================================
+# GET CONDICIONAL (ETag)
+# ==============================================================================
+
+class ConditionalGetTests(BrainHubTenantTestCase):
+
+    def setUp(self):
+        self.http = self.login()
+        self.task = Task.objects.create(
+            title='Post', kanban_type='operational', status='briefing', scheduled_date=timezone.now()
+        )
+        today = timezone.now()
+        self.calendar = ('/api/calendar/events/', {'year': today.year, 'month': today.month})
+
+    def test_calendar_answers_304_until_a_task_changes(self):
+        first = self.http.get(*self.calendar)
+        self.assertEqual(first.status_code, 200)
+
+        with CaptureQueriesContext(connection) as ctx:
+            again = self.http.get(*self.calendar, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(len([q for q in ctx.captured_queries if 'projects_task' in q['sql']]), 1)
+
+        self.task.title = 'Post editado'
+        self.task.save()
+        changed = self.http.get(*self.calendar, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()[0]['title'], 'Post editado')
+
+    def test_tags_and_assignees_change_the_calendar_etag(self):
+        tag = Tag.objects.create(name='Urgente')
+        user = CustomUser.objects.create_user(username='designer', password='x' * 12, agency=self.tenant)
+        changes = [
+            lambda: self.task.tag_set.add(tag),
+            lambda: self.task.assigned_to.set([user]),
+            lambda: tag.tasks.clear(),
+            lambda: self.task.tag_set.add(tag),
+            lambda: tag.delete(),
+        ]
+        etag = self.http.get(*self.calendar)['ETag']
+        for change in changes:
+            change()
+            response = self.http.get(*self.calendar, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+
+    def test_clients_list_is_versioned_by_signals(self):
+        Client.objects.create(name='Cliente Antigo')
+        first = self.http.get('/api/clients/list-simple/')
+        self.assertTrue(first.has_header('ETag') and first.has_header('Last-Modified'))
+        self.assertEqual(self.http.get('/api/clients/list-simple/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        Client.objects.create(name='Novo Cliente')
+        response = self.http.get('/api/clients/list-simple/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['clients']), 2)
+
+
+# ==============================================================================
+# MÍDIA: DOWNLOAD EM LOTE (ZIP EM STREAMING)
+# ==============================================================================
+
+class DownloadBatchTests(BrainHubTenantTestCase):
+
+    def setUp(self):
+        self.http = self.login()
+        client = Client.objects.create(name='Cliente Zip')
+        folder = MediaFolder.objects.create(name='Fotos', client=client)
+        self.files = [
+            MediaFile.objects.create(folder=folder, file=ContentFile(b'\xff\xd8' * 5000, name='foto.jpg')),
+            MediaFile.objects.create(folder=folder, file=ContentFile(b'texto ' * 5000, name='roteiro.txt')),
+            MediaFile.objects.create(folder=folder, file=ContentFile(b'outra', name='foto.jpg')),
+        ]
+        self.addCleanup(lambda: [f.file.delete(save=False) for f in self.files])
+
+    def test_streams_zip_with_stored_media_and_token_cookie(self):
+        response = self.http.post('/media/download-batch/', {
+            'selected_files': [f.id for f in self.files], 'download_token': '123',
+        })
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response.cookies['download_token'].value, '123')
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ['foto.jpg', 'roteiro.txt', 'foto (2).jpg'])
+        self.assertEqual(archive.getinfo('foto.jpg').compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(archive.getinfo('roteiro.txt').compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(archive.read('roteiro.txt'), b'texto ' * 5000)
+        self.assertIsNone(archive.testzip())
+
+    def test_prefetch_keeps_order_and_respects_limits(self):
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        class SlowStorage:
+            def open(self, name, mode='rb'):
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+                return io.BytesIO(name.encode())
+
+        files = [
+            SimpleNamespace(file_size=10, file=SimpleNamespace(storage=SlowStorage(), name=f'arquivo-{i}'))
+            for i in range(12)
+        ]
+        names = []
+        for media_file, open_source in prefetch_media(files, workers=4, max_bytes=30):
+            with open_source() as source:
+                names.append(source.read().decode())
+
+        self.assertEqual(names, [f'arquivo-{i}' for i in range(12)])
+        self.assertLessEqual(peak[0], 3)  # 30 bytes de orçamento / 10 por arquivo
+
+    def test_chunks_are_bounded(self):
+        chunks = list(stream_media_zip(MediaFile.objects.order_by('id'), chunk_size=1024))
+        self.assertGreater(len(chunks), 3)
+        self.assertLess(max(len(c) for c in chunks), 64 * 1024)
+
+    def test_large_members_stream_and_failures_skip_or_abort(self):
+        real_open_stream = open_stream
+        opened = []
+
+        class BrokenStream(io.BytesIO):
+            def read(self, size=-1):
+                if self.tell():
+                    raise OSError('conexão caiu')
+                return super().read(size)
+
+        def unreachable_jpg(storage, name):
+            opened.append(name)
+            if name.endswith('.jpg') and len(opened) == 1:
+                raise OSError('R2 fora do ar')
+            return real_open_stream(storage, name)
+
+        # max_bytes mínimo: nada entra no prefetch, tudo vem direto do open_stream
+        with patch('projects.zipstream.open_stream', unreachable_jpg):
+            data = b''.join(stream_media_zip(MediaFile.objects.order_by('id'), chunk_size=1024, max_bytes=1))
+
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        self.assertEqual(archive.namelist(), ['roteiro.txt', 'foto (2).jpg'])
+        self.assertEqual(archive.read('roteiro.txt'), b'texto ' * 5000)
+        self.assertEqual(len(opened), 3)
+
+        # Falha no meio de uma entrada: o zip não sai com o arquivo truncado
+        def flaky_open_stream(storage, name):
+            if name.endswith('.txt'):
+                return BrokenStream(b'texto ' * 5000)
+            return real_open_stream(storage, name)
+
+        chunks = []
+        with patch('projects.zipstream.open_stream', flaky_open_stream), self.assertRaises(OSError):
+            for chunk in stream_media_zip(MediaFile.objects.order_by('id'), chunk_size=1024, max_bytes=1):
+                chunks.append(chunk)
+        with self.assertRaises(zipfile.BadZipFile):
+            zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+    def test_asgi_sends_chunks_while_the_zip_is_built(self):
+        progress = {'finished': False, 'first_chunk_after_end': None}
+
+        def tracked(*args, **kwargs):
+            yield from stream_media_zip(*args, **kwargs)
+            progress['finished'] = True
+
+        token = 'a' * 32
+        body = urlencode(
+            {'selected_files': [f.id for f in self.files], 'csrfmiddlewaretoken': token}, doseq=True
+        ).encode()
+        cookies = f"sessionid={self.http.cookies['sessionid'].value}; csrftoken={token}"
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+            'method': 'POST', 'path': '/media/download-batch/', 'raw_path': b'/media/download-batch/',
+            'query_string': b'', 'root_path': '', 'client': ('127.0.0.1', 5000), 'server': ('testserver', 80),
+            'headers': [
+                (b'host', self.domain.domain.encode()),
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'cookie', cookies.encode()),
+            ],
+        }
+        disconnected = asyncio.Event()
+        requests_received = []
+
+        async def receive():
+            if not requests_received:
+                requests_received.append(True)
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await disconnected.wait()  # Cliente nunca desconecta
+            return {'type': 'http.disconnect'}
+
+        messages = []
+
+        async def send(message):
+            if message['type'] == 'http.response.body' and message.get('body') and progress['first_chunk_after_end'] is None:
+                progress['first_chunk_after_end'] = progress['finished']
+            messages.append(message)
+
+        # Como o test client: a conexão do teste (transação aberta) não pode ser fechada
+        for signal_ in (request_started, request_finished):
+            signal_.disconnect(close_old_connections)
+            self.addCleanup(signal_.connect, close_old_connections)
+        with patch('projects.views.stream_media_zip', tracked):
+            async_to_sync(ASGIHandler())(scope, receive, send)
+
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIs(progress['first_chunk_after_end'], False)
+        bodies = [message for message in messages if message['type'] == 'http.response.body']
+        self.assertGreater(len(bodies), 3)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(message.get('body', b'') for message in bodies)))
+        self.assertEqual(archive.namelist(), ['foto.jpg', 'roteiro.txt', 'foto (2).jpg'])
+
+
+
+class DirectUploadTests(BrainHubTenantTestCase):
+
+    def setUp(self):
+        self.http = self.login()
+        self.client_obj = Client.objects.create(name='Cliente Upload')
+        self.folder = MediaFolder.objects.create(name='Vídeos', client=self.client_obj)
+
+    def _token(self, key):
+        return signing.dumps({'key': key, 'folder_id': self.folder.pk}, salt=DIRECT_UPLOAD_SALT)
+
+    def _complete(self, token):
+        return self.http.post('/api/media/upload/complete/', json.dumps({'token': token}),
+                              content_type='application/json')
+
+    def test_presigned_put_url_is_signed_for_the_key(self):
+        storage = S3Boto3Storage(
+            access_key='teste', secret_key='teste', bucket_name='midia',
+            endpoint_url='https://conta.r2.cloudflarestorage.com', region_name='auto',
+            signature_version='s3v4',
+        )
+        url = presigned_put_url(storage, 'agencia/cliente/videos/aula_ab12.mp4', 'video/mp4', expires=600)
+
+        self.assertIn('/midia/agencia/cliente/videos/aula_ab12.mp4?', url)
+        self.assertIn('X-Amz-Signature=', url)
+        self.assertIn('X-Amz-Expires=600', url)
+
+    def test_register_checks_object_and_is_idempotent(self):
+        storage = MediaFile._meta.get_field('file').storage
+        key = storage.save('agencia-teste/cliente-upload/videos/aula_ab12.mp4', ContentFile(b'0' * 2048))
+        self.addCleanup(storage.delete, key)
+
+        first = self._complete(self._token(key)).json()
+        second = self._complete(self._token(key)).json()
+
+        self.assertEqual(first['status'], 'success')
+        self.assertEqual(first['file_id'], second['file_id'])
+        media_file = MediaFile.objects.get()
+        self.assertEqual((media_file.file.name, media_file.file_size), (key, 2048))
+
+    def test_register_is_idempotent_after_deduplication(self):
+        storage = MediaFile._meta.get_field('file').storage
+        original = MediaFile.objects.create(folder=self.folder, file=ContentFile(b'1' * 2048, name='original.mp4'))
+        self.addCleanup(storage.delete, original.file.name)
+        key = storage.save('agencia-teste/cliente-upload/videos/copia_ab12.mp4', ContentFile(b'1' * 2048))
+        self.addCleanup(storage.delete, key)
+
+        first = self._complete(self._token(key)).json()
+        copy = MediaFile.objects.get(pk=first['file_id'])
+        # A cópia passou a apontar para o objeto do blob; o retry ainda a encontra
+        self.assertEqual(copy.file.name, original.file.name)
+        second = self._complete(self._token(key)).json()
+
+        self.assertEqual(second['file_id'], first['file_id'])
+        self.assertEqual(MediaFile.objects.count(), 2)
+
+    def test_register_checks_quota_against_the_real_size(self):
+        storage = MediaFile._meta.get_field('file').storage
+        key = storage.save('agencia-teste/cliente-upload/videos/grande_ab12.mp4', ContentFile(b'0' * 4096))
+        StorageUsage.objects.update_or_create(pk=1, defaults={'quota_bytes': 1000})
+
+        response = self._complete(self._token(key))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MediaFile.objects.exists())
+        self.assertFalse(storage.exists(key))
+
+    def test_register_rejects_missing_object_and_forged_token(self):
+        response = self._complete(self._token('agencia-teste/cliente-upload/videos/nunca-enviado.mp4'))
+        self.assertEqual(response.status_code, 400)
+
+        forged = signing.dumps({'key': 'outra/chave.mp4', 'folder_id': self.folder.pk}, salt='outro')
+        self.assertEqual(self._complete(forged).status_code, 400)
+        self.assertFalse(MediaFile.objects.exists())
+
+    def test_presign_without_bucket_falls_back(self):
+        response = self.http.post('/api/media/upload/url/', json.dumps({
+            'client_id': self.client_obj.pk, 'folder_id': self.folder.pk,
+            'filename': 'aula.mp4', 'size': 1024, 'content_type': 'video/mp4',
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 501)
+
+    def test_legacy_upload_rejects_large_body_before_reading_it(self):
+        with override_settings(MEDIA_PROXY_UPLOAD_MAX_BYTES=1024):
+            response = self.http.post('/api/media/upload/', {
+                'foto': ContentFile(b'0' * 4096, name='grande.jpg'),
+                'client_id': self.client_obj.pk, 'folder_id': self.folder.pk,
+            })
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(MediaFile.objects.exists())
+
+
+class FolderTreeTests(BrainHubTenantTestCase):
+
+    def setUp(self):
+        self.client_obj = Client.objects.create(name='Cliente Árvore')
+        self.chain = []
+        parent = None
+        for depth in range(6):
+            parent = MediaFolder.objects.create(name=f'Nível {depth}', client=self.client_obj, parent=parent)
+            self.chain.append(parent)
+        self.root, self.leaf = self.chain[0], self.chain[-1]
+        MediaFile.objects.create(folder=self.leaf, file_size=700, file='x/a.jpg')
+        MediaFile.objects.create(folder=self.chain[2], file_size=300, file='x/b.jpg')
+
+    def assertOneQuery(self):
+        """assertNumQueries(1) ignorando o SET search_path do django-tenants."""
+        test = self
+
+        class _Context(CaptureQueriesContext):
+            def __exit__(self, *exc):
+                super().__exit__(*exc)
+                queries = [q['sql'] for q in self.captured_queries if not q['sql'].startswith('SET search_path')]
+                test.assertEqual(len(queries), 1, queries)
+
+        return _Context(connection)
+
+    def test_paths_breadcrumbs_and_stats_take_one_query(self):
+        self.assertEqual(self.leaf.path, ''.join(f'/{f.pk}' for f in self.chain) + '/')
+
+        with self.assertOneQuery():
+            self.assertEqual(self.leaf.ancestors(), self.chain[:-1])
+        with self.assertOneQuery():
+            self.assertEqual(len(self.root.descendants()), 5)
+        with self.assertOneQuery():
+            self.assertEqual(self.chain[1].subtree_stats(), {'files': 2, 'size': 1000})
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn('mediafolder_path_idx', self.root.descendants().explain())
+
+    def test_move_rewrites_subtree_in_one_update(self):
+        other = MediaFolder.objects.create(name='Arquivo Morto', client=self.client_obj)
+        middle = self.chain[3]
+
+        with CaptureQueriesContext(connection) as ctx:
+            middle.move_to(other)
+        # Um UPDATE reescreve caminhos e pai (os demais só ajustam contadores de uso)
+        self.assertEqual(len([q for q in ctx.captured_queries if 'SET "path"' in q['sql']]), 1)
+
+        self.leaf.refresh_from_db()
+        middle.refresh_from_db()
+        self.assertEqual(middle.parent, other)
+        self.assertTrue(self.leaf.path.startswith(f'/{other.pk}/{middle.pk}/'))
+        self.assertEqual(self.leaf.ancestors(), [other, middle, self.chain[4]])
+
+        with self.assertRaises(ValueError):
+            other.move_to(self.leaf)
+
+    def test_delete_removes_whole_subtree(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chain[1].delete()
+        self.assertEqual(list(MediaFolder.objects.all()), [self.root])
+        self.assertFalse(MediaFile.objects.exists())
+
+    def test_rebuild_paths_backfills_existing_trees(self):
+        MediaFolder.objects.update(path='')
+        call_command('rebuild_folder_paths', schema=[self.tenant.schema_name], workers=1, stdout=io.StringIO())
+        self.leaf.refresh_from_db()
+        self.assertEqual(self.leaf.path, ''.join(f'/{f.pk}' for f in self.chain) + '/')
+
+    def test_child_of_legacy_folder_gets_a_full_path(self):
+        MediaFolder.objects.update(path='')
+        parent = MediaFolder.objects.get(pk=self.leaf.pk)
+        child = MediaFolder.objects.create(name='Nova', client=parent.client, parent=parent)
+
+        expected = ''.join(f'/{f.pk}' for f in self.chain) + '/'
+        self.assertEqual(child.path, f'{expected}{child.pk}/')
+        self.leaf.refresh_from_db()
+        self.assertEqual(self.leaf.path, expected)
+
+    def test_legacy_folders_never_match_the_whole_tenant(self):
+        other = MediaFolder.objects.create(name='Outra Raiz', client=self.client_obj)
+        MediaFile.objects.create(folder=other, file_size=50, file='x/c.jpg')
+        MediaFolder.objects.update(path='')
+        middle, leaf = MediaFolder.objects.get(pk=self.chain[1].pk), MediaFolder.objects.get(pk=self.leaf.pk)
+
+        self.assertEqual(middle.subtree_stats(), {'files': 2, 'size': 1000})
+        self.assertEqual(set(middle.descendants()), set(self.chain[2:]))
+        self.assertEqual(leaf.ancestors(), self.chain[:-1])
+
+
+class StorageUsageTests(BrainHubTenantTestCase):
+
+    def setUp(self):
+        self.client_obj = Client.objects.create(name='Cliente Cota')
+        self.root = MediaFolder.objects.create(name='Campanhas', client=self.client_obj)
+        self.child = MediaFolder.objects.create(name='Verão', client=self.client_obj, parent=self.root)
+        self.other = MediaFolder.objects.create(name='Outros', client=self.client_obj)
+
+    def _add(self, folder, size):
+        return MediaFile.objects.create(folder=folder, file=f'x/{folder.pk}-{size}.jpg', file_size=size)
+
+    def _totals(self):
+        folders = {f.pk: (f.total_files, f.total_bytes) for f in MediaFolder.objects.all()}
+        self.client_obj.refresh_from_db()
+        usage = StorageUsage.current()
+        return folders, (self.client_obj.media_files, self.client_obj.media_bytes), (usage.files, usage.bytes)
+
+    def test_counters_roll_up_and_follow_changes(self):
+        big = self._add(self.child, 1000)
+        self._add(self.root, 200)
+        self._add(self.other, 50)
+
+        folders, client, tenant = self._totals()
+        self.assertEqual(folders[self.root.pk], (2, 1200))
+        self.assertEqual(folders[self.child.pk], (1, 1000))
+        self.assertEqual((client, tenant), ((3, 1250), (3, 1250)))
+
+        big.file_size = 400
+        big.save()
+        self.child.move_to(self.other)
+        folders, client, tenant = self._totals()
+        self.assertEqual((folders[self.root.pk], folders[self.other.pk]), ((1, 200), (2, 450)))
+        self.assertEqual(tenant, (3, 650))
+
+        self.other.delete()
+        folders, client, tenant = self._totals()
+        self.assertEqual(folders, {self.root.pk: (1, 200)})
+        self.assertEqual((client, tenant), ((1, 200), (1, 200)))
+
+    def test_legacy_folder_rolls_up_to_its_ancestors(self):
+        MediaFolder.objects.update(path='')
+        self._add(self.child, 300)
+
+        folders, client, tenant = self._totals()
+        self.assertEqual((folders[self.root.pk], folders[self.child.pk]), ((1, 300), (1, 300)))
+        self.assertEqual(folders[self.other.pk], (0, 0))
+        self.assertEqual(MediaFolder.objects.get(pk=self.child.pk).path, f'/{self.root.pk}/{self.child.pk}/')
+
+    def test_reconcile_fixes_drift(self):
+        self._add(self.child, 1000)
+        MediaFolder.objects.update(total_files=0, total_bytes=0)
+        StorageUsage.objects.update(bytes=7)
+
+        call_command('reconcile_storage_usage', schema=[self.tenant.schema_name], workers=1, stdout=io.StringIO())
+
+        folders, client, tenant = self._totals()
+        self.assertEqual((folders[self.root.pk], folders[self.child.pk]), ((1, 1000), (1, 1000)))
+        self.assertEqual((client, tenant), ((1, 1000), (1, 1000)))
+
+    def test_quota_blocks_upload_with_single_row_check(self):
+        self._add(self.root, 900)
+        StorageUsage.objects.filter(pk=1).update(quota_bytes=1000)
+        http = self.login()
+
+        response = http.post('/api/media/upload/', {
+            'foto': ContentFile(b'0' * 500, name='nova.jpg'),
+            'client_id': self.client_obj.pk, 'folder_id': self.root.pk,
+        })
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(MediaFile.objects.count(), 1)
+
+
+class MediaDedupTests(BrainHubTenantTestCase):
+
+    def setUp(self):
+        client_a = Client.objects.create(name='Marca A')
+        client_b = Client.objects.create(name='Marca B')
+        self.folder_a = MediaFolder.objects.create(name='Logos', client=client_a)
+        self.folder_b = MediaFolder.objects.create(name='Logos', client=client_b)
+        self.storage = MediaFile._meta.get_field('file').storage
+
+    def test_same_content_shares_one_object_until_last_reference(self):
+        logo = b'\x89PNG' + b'logo' * 1000
+        with self.captureOnCommitCallbacks(execute=True):
+            first = MediaFile.objects.create(folder=self.folder_a, file=ContentFile(logo, name='logo.png'))
+            second = MediaFile.objects.create(folder=self.folder_b, file=ContentFile(logo, name='marca.png'))
+        key = first.file.name
+        self.addCleanup(lambda: self.storage.exists(key) and self.storage.delete(key))
+
+        self.assertEqual(second.file.name, key)
+        self.assertEqual(second.filename, 'marca.png')
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(self.storage.exists(key))
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(MediaBlob.objects.exists())
+        # A remoção no R2 fica na fila até o worker passar
+        self.assertTrue(self.storage.exists(key))
+        self.assertEqual(list(PendingObjectDelete.objects.values_list('key', flat=True)), [key])
+
+        call_command('drain_storage_deletes', stdout=io.StringIO())
+        self.assertFalse(self.storage.exists(key))
+        self.assertFalse(PendingObjectDelete.objects.exists())
+
+    def test_reuse_takes_the_reference_in_the_save_transaction(self):
+        logo = b'\x89PNG' + b'reuso' * 500
+        with self.captureOnCommitCallbacks(execute=True):
+            first = MediaFile.objects.create(folder=self.folder_a, file=ContentFile(logo, name='logo.png'))
+        key = first.file.name
+        self.addCleanup(lambda: self.storage.exists(key) and self.storage.delete(key))
+
+        # Save que falha não deixa referência sobrando no blob
+        with patch('django.db.models.Model.save', side_effect=RuntimeError('falhou')), self.assertRaises(RuntimeError):
+            MediaFile.objects.create(folder=self.folder_b, file=ContentFile(logo, name='marca.png'))
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+
+        # Blob sendo liberado por outra transação (contador já zerado): não é reaproveitado
+        MediaBlob.objects.update(ref_count=0)
+        self.assertIsNone(MediaBlob.acquire_existing(first.sha256))
+        MediaBlob.objects.update(ref_count=1)
+
+        second = MediaFile.objects.create(folder=self.folder_b, file=ContentFile(logo, name='marca.png'))
+        self.assertEqual((second.file.name, second.blob_id), (key, first.blob_id))
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+
+    def test_command_merges_direct_uploads_and_reports_savings(self):
+        photo = b'\xff\xd8' + b'ensaio' * 2000
+        with self.captureOnCommitCallbacks(execute=True):
+            original = MediaFile.objects.create(folder=self.folder_a, file=ContentFile(photo, name='ensaio.jpg'))
+        copy_key = self.storage.save('agencia-teste/marca-b/logos/ensaio.jpg', ContentFile(photo))
+        copy = MediaFile(folder=self.folder_b)
+        copy.file.name = copy_key
+        copy.save()
+        self.addCleanup(self.storage.delete, original.file.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('dedupe_media_files', schema=[self.tenant.schema_name], workers=1, stdout=io.StringIO())
+
+        copy.refresh_from_db()
+        self.assertEqual(copy.file.name, original.file.name)
+        call_command('drain_storage_deletes', stdout=io.StringIO())
+        self.assertFalse(self.storage.exists(copy_key))
+
+        out = io.StringIO()
+        call_command('media_storage_report', schema=[self.tenant.schema_name], workers=1, stdout=out)
+        self.assertIn('50.0%', out.getvalue())
+
+
+MIB = 1024 * 1024
+
+S3_TEST_STORAGES = {
+    'default': {
+        'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage',
+        'OPTIONS': {
+            'access_key': 'teste', 'secret_key': 'teste', 'bucket_name': 'midia',
+            'endpoint_url': 'https://conta.r2.cloudflarestorage.com', 'region_name': 'auto',
+        },
+    },
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class MultipartUploadTests(BrainHubTenantTestCase):
+    """Fluxo multipart contra um bucket S3 simulado (botocore Stubber)."""
+
+    def setUp(self):
+        self.http = self.login()
+        self.user = CustomUser.objects.get(username='equipe')
+        self.client_obj = Client.objects.create(name='Cliente Vídeo')
+        self.folder = MediaFolder.objects.create(name='Reels', client=self.client_obj)
+
+        storages_override = override_settings(STORAGES=S3_TEST_STORAGES)
+        storages_override.enable()
+        self.addCleanup(storages_override.disable)
+        self.s3 = Stubber(default_storage.bucket.meta.client)
+        self.s3.activate()
+        self.addCleanup(self.s3.deactivate)
+
+    def _post(self, url, payload=None):
+        return self.http.post(url, json.dumps(payload or {}), content_type='application/json')
+
+    def _upload(self, **kwargs):
+        fields = {
+            'key': 'agencia-teste/cliente-video/reels/reels_ab12.mp4', 'upload_id': 'up-1',
+            'target': 'media', 'folder': self.folder, 'filename': 'reels.mp4',
+            'size': 40 * MIB, 'part_size': 16 * MIB, 'created_by': self.user,
+        }
+        fields.update(kwargs)
+        return MultipartUpload.objects.create(**fields)
+
+    def _parts(self, numbers):
+        return {
+            'Parts': [{'PartNumber': n, 'ETag': f'"etag-{n}"', 'Size': 16 * MIB} for n in numbers],
+            'IsTruncated': False,
+        }
+
+    def test_part_size_respects_part_limit(self):
+        self.assertEqual(part_size_for(40 * MIB), 16 * MIB)
+        size = 500 * 1024 * MIB
+        part_size = part_size_for(size)
+        self.assertLessEqual(-(-size // part_size), MAX_PARTS)
+        self.assertEqual(part_size % MIB, 0)
+
+    def test_start_creates_upload_and_signs_parts(self):
+        self.s3.add_response(
+            'create_multipart_upload', {'UploadId': 'up-1'},
+            {'Bucket': 'midia', 'Key': ANY, 'ContentType': 'video/mp4'},
+        )
+        start = self._post('/api/media/multipart/start/', {
+            'target': 'media', 'client_id': self.client_obj.pk, 'folder_id': self.folder.pk,
+            'filename': 'reels.mp4', 'size': 40 * MIB, 'content_type': 'video/mp4',
+        }).json()
+
+        self.assertEqual((start['part_count'], start['part_size'], start['uploaded_parts']), (3, 16 * MIB, []))
+        self.assertTrue(start['key'].startswith('agencia-teste/cliente-video/reels/'))
+
+        urls = self._post(f"/api/media/multipart/{start['upload']}/parts/", {'part_numbers': [1, 2, 3]}).json()['urls']
+        self.assertIn('partNumber=2', urls['2'])
+        self.assertIn('uploadId=up-1', urls['2'])
+        response = self._post(f"/api/media/multipart/{start['upload']}/parts/", {'part_numbers': [4]})
+        self.assertEqual(response.status_code, 400)
+        self.s3.assert_no_pending_responses()
+
+    def test_start_resumes_with_parts_already_in_bucket(self):
+        upload = self._upload()
+        self.s3.add_response('list_parts', self._parts([1, 2]), {
+            'Bucket': 'midia', 'Key': upload.key, 'UploadId': 'up-1', 'PartNumberMarker': 0,
+        })
+
+        start = self._post('/api/media/multipart/start/', {
+            'target': 'media', 'client_id': self.client_obj.pk, 'folder_id': self.folder.pk,
+            'filename': 'reels.mp4', 'size': 40 * MIB,
+        }).json()
+
+        self.assertEqual((start['upload'], start['uploaded_parts']), (upload.pk, [1, 2]))
+        self.s3.assert_no_pending_responses()
+
+    def test_complete_requires_all_parts_and_registers_file(self):
+        upload = self._upload()
+        self.s3.add_response('list_parts', self._parts([1, 2]))
+        response = self._post(f'/api/media/multipart/{upload.pk}/complete/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['missing_parts'], [3])
+
+        self.s3.add_response('list_parts', self._parts([1, 2, 3]))
+        self.s3.add_response('complete_multipart_upload', {}, {
+            'Bucket': 'midia', 'Key': upload.key, 'UploadId': 'up-1',
+            'MultipartUpload': {'Parts': [{'PartNumber': n, 'ETag': f'"etag-{n}"'} for n in (1, 2, 3)]},
+        })
+        self.s3.add_response('head_object', {'ContentLength': 40 * MIB, 'ContentType': 'video/mp4'})
+        data = self._post(f'/api/media/multipart/{upload.pk}/complete/').json()
+
+        media_file = MediaFile.objects.get(pk=data['file_id'])
+        self.assertEqual((media_file.file.name, media_file.file_size), (upload.key, 40 * MIB))
+        self.assertFalse(MultipartUpload.objects.exists())
+        self.s3.assert_no_pending_responses()
+
+    def test_complete_retry_after_lost_response_registers_once(self):
+        upload = self._upload()
+        # O complete anterior juntou as partes, mas a resposta não chegou ao navegador
+        self.s3.add_client_error('list_parts', service_error_code='NoSuchUpload', http_status_code=404)
+        self.s3.add_response('head_object', {'ContentLength': 40 * MIB, 'ContentType': 'video/mp4'})
+        data = self._post(f'/api/media/multipart/{upload.pk}/complete/').json()
+
+        self.assertEqual(MediaFile.objects.get().pk, data['file_id'])
+        self.assertFalse(MultipartUpload.objects.exists())
+        self.s3.assert_no_pending_responses()
+
+    def test_complete_without_object_drops_the_upload(self):
+        upload = self._upload()
+        self.s3.add_client_error('list_parts', service_error_code='NoSuchUpload', http_status_code=404)
+        self.s3.add_client_error('head_object', service_error_code='404', http_status_code=404)
+        response = self._post(f'/api/media/multipart/{upload.pk}/complete/')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MediaFile.objects.exists() or MultipartUpload.objects.exists())
+        self.s3.assert_no_pending_responses()
+
+    def test_complete_over_quota_aborts_the_upload(self):
+        upload = self._upload(size=MIB)  # Declarou 1 MiB, enviou 48 MiB
+        StorageUsage.objects.update_or_create(pk=1, defaults={'quota_bytes': 10 * MIB})
+        self.s3.add_response('list_parts', self._parts([1]))
+        self.s3.add_response('abort_multipart_upload', {}, {'Bucket': 'midia', 'Key': upload.key, 'UploadId': 'up-1'})
+        response = self._post(f'/api/media/multipart/{upload.pk}/complete/')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MediaFile.objects.exists() or MultipartUpload.objects.exists())
+        self.s3.assert_no_pending_responses()
+
+    def test_cleanup_aborts_stale_and_orphan_uploads(self):
+        old = timezone.now() - timedelta(days=2)
+        upload = self._upload()
+        MultipartUpload.objects.filter(pk=upload.pk).update(created_at=old)
+        self._upload(upload_id='up-recente', filename='outro.mp4')
+
+        # Primeiro os órfãos do bucket (sem registro em nenhum tenant), depois os parados de cada tenant
+        self.s3.add_response('list_multipart_uploads', {'Uploads': [
+            {'Key': upload.key, 'UploadId': 'up-1', 'Initiated': old},
+            {'Key': 'agencia/perdido.mp4', 'UploadId': 'up-orfao', 'Initiated': old},
+            {'Key': 'agencia/atual.mp4', 'UploadId': 'up-recente', 'Initiated': timezone.now()},
+        ], 'IsTruncated': False})
+        self.s3.add_response(
+            'abort_multipart_upload', {}, {'Bucket': 'midia', 'Key': 'agencia/perdido.mp4', 'UploadId': 'up-orfao'}
+        )
+        self.s3.add_response('abort_multipart_upload', {}, {'Bucket': 'midia', 'Key': upload.key, 'UploadId': 'up-1'})
+
+        call_command('abort_stale_uploads', workers=1, stdout=io.StringIO())
+
+        self.assertEqual(list(MultipartUpload.objects.values_list('upload_id', flat=True)), ['up-recente'])
+        # Pode ter sido concluído sem registro: a chave vai para a fila de remoção
+        self.assertEqual(list(PendingObjectDelete.objects.values_list('key', flat=True)), [upload.key])
+        self.s3.assert_no_pending_responses()
+
+
+class StorageDeleteQueueTests(BrainHubTenantTestCase):
+    """Remoção assíncrona no R2: a deleção só enfileira; o worker apaga em lote."""
+
+    def setUp(self):
+        storages_override = override_settings(STORAGES=S3_TEST_STORAGES)
+        storages_override.enable()
+        self.addCleanup(storages_override.disable)
+        # Sem respostas cadastradas: qualquer chamada ao bucket fora do esperado falha
+        self.s3 = Stubber(default_storage.bucket.meta.client)
+        self.s3.activate()
+        self.addCleanup(self.s3.deactivate)
+
+        client_obj = Client.objects.create(name='Cliente Arquivo')
+        self.root = MediaFolder.objects.create(name='2024', client=client_obj)
+        child = MediaFolder.objects.create(name='Janeiro', client=client_obj, parent=self.root)
+        blob = MediaBlob.objects.create(sha256='a' * 64, key='x/compartilhado.jpg', size=10, ref_count=2)
+        MediaFile.objects.create(folder=child, file='x/compartilhado.jpg', file_size=10, blob=blob)
+        MediaFile.objects.create(folder=child, file='x/solto.jpg', file_size=10)
+        MediaFile.objects.create(
+            folder=MediaFolder.objects.create(name='Ativos', client=client_obj),
+            file='x/compartilhado.jpg', file_size=10, blob=blob,
+        )
+
+    def test_folder_delete_only_enqueues_unreferenced_keys(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.root.delete()
+
+        self.assertEqual(list(PendingObjectDelete.objects.values_list('key', flat=True)), ['x/solto.jpg'])
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MediaFolder.objects.get(name='Ativos').delete()
+        self.assertEqual(
+            sorted(PendingObjectDelete.objects.values_list('key', flat=True)), ['x/compartilhado.jpg', 'x/solto.jpg']
+        )
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_legacy_folder_delete_releases_the_whole_subtree(self):
+        MediaFolder.objects.update(path='')
+        with self.captureOnCommitCallbacks(execute=True):
+            MediaFolder.objects.get(pk=self.root.pk).delete()
+
+        self.assertEqual(list(PendingObjectDelete.objects.values_list('key', flat=True)), ['x/solto.jpg'])
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+        self.assertEqual(list(MediaFolder.objects.values_list('name', flat=True)), ['Ativos'])
+
+    def test_drain_deletes_in_batch_and_reschedules_errors(self):
+        PendingObjectDelete.objects.bulk_create(
+            PendingObjectDelete(key=key) for key in ('x/a.jpg', 'x/b.jpg', 'x/c.jpg')
+        )
+        self.s3.add_response(
+            'delete_objects',
+            {'Errors': [{'Key': 'x/b.jpg', 'Code': 'InternalError', 'Message': 'tente de novo'}]},
+            {'Bucket': 'midia', 'Delete': {
+                'Objects': [{'Key': 'x/a.jpg'}, {'Key': 'x/b.jpg'}, {'Key': 'x/c.jpg'}], 'Quiet': True,
+            }},
+        )
+
+        call_command('drain_storage_deletes', stdout=io.StringIO(), stderr=io.StringIO())
+
+        pending = PendingObjectDelete.objects.get()
+        self.assertEqual((pending.key, pending.attempts), ('x/b.jpg', 1))
+        self.assertIn('InternalError', pending.last_error)
+        self.assertGreater(pending.next_attempt_at, timezone.now())
+        self.s3.assert_no_pending_responses()
+
+class SignedURLCacheTests(SimpleTestCase):
+    """URLs assinadas do R2 reaproveitadas (LRU por processo)."""
+
+    def _storage(self, **options):
+        storage = CachedURLS3Storage(**{**S3_TEST_STORAGES['default']['OPTIONS'], **options})
+        client = storage.bucket.meta.client
+        storage.signed = patch.object(client, 'generate_presigned_url', wraps=client.generate_presigned_url).start()
+        self.addCleanup(patch.stopall)
+        return storage
+
+    def test_signed_url_is_reused_across_calls(self):
+        storage = self._storage()
+        url = storage.url('logos_clientes/marca.png')
+
+        self.assertIn('X-Amz-Signature=', url)
+        self.assertEqual(storage.url('logos_clientes/marca.png'), url)
+        self.assertEqual(storage.signed.call_count, 1)
+
+        # Pedidos fora do padrão (expire/parameters) são sempre assinados
+        storage.url('logos_clientes/marca.png', expire=60)
+        self.assertEqual(storage.signed.call_count, 2)
+
+    def test_lru_evicts_oldest_and_public_urls_skip_cache(self):
+        storage = self._storage(url_cache_max_entries=2)
+        for name in ('a.png', 'b.png', 'c.png'):
+            storage.url(name)
+        self.assertEqual(list(storage._url_lru), [storage._url_cache_key('b.png'), storage._url_cache_key('c.png')])
+
+        for options in ({'custom_domain': 'midia.exemplo.com'},
+                        {'custom_domain': 'midia.exemplo.com', 'querystring_auth': False}):
+            public = self._storage(**options)
+            self.assertEqual(public.url('a.png'), 'https://midia.exemplo.com/a.png')
+            self.assertFalse(public._url_lru)
+
+        unsigned = self._storage(querystring_auth=False)
+        self.assertNotIn('X-Amz-Signature=', unsigned.url('a.png'))
+        self.assertFalse(unsigned._url_lru)
+
+
+# ==============================================================================
+# MÍDIA: DERIVADOS DE IMAGEM (MINIATURA / PRÉVIA WEBP)
+# ==============================================================================
+
+def png_bytes(size=(2000, 1500), color=(200, 30, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ImageDerivativeTests(BrainHubTenantTestCase):
+
+    def setUp(self):
+        self.storage = MediaFile._meta.get_field('file').storage
+        client_obj = Client.objects.create(name='Cliente Arte')
+        self.folder = MediaFolder.objects.create(name='Artes', client=client_obj)
+
+    def _cleanup(self, *names):
+        for name in names:
+            self.addCleanup(lambda n=name: self.storage.exists(n) and self.storage.delete(n))
+
+    def test_task_art_gets_webp_derivatives_from_the_queue(self):
+        task = Task.objects.create(title='Post', final_art=ContentFile(png_bytes(), name='arte.png'))
+        updated_at = task.updated_at
+        self.assertEqual(BackgroundJob.objects.get().task, 'projects.derivatives.refresh_image_derivatives')
+
+        self.assertEqual(work('teste', burst=True), (1, 0))
+        task.refresh_from_db()
+        # Miniatura nova invalida o ETag do calendário e aparece no delta do Kanban
+        self.assertGreater(task.updated_at, updated_at)
+        derivatives = task.final_art_derivatives
+        self._cleanup(task.final_art.name, *derivative_keys(derivatives))
+
+        self.assertEqual(derivatives['source'], task.final_art.name)
+        self.assertTrue(derivatives['thumb'].startswith(task.final_art.name + '.thumb.'))
+        with self.storage.open(derivatives['thumb']) as thumb, Image.open(thumb) as image:
+            self.assertEqual((image.format, max(image.size)), ('WEBP', 400))
+        with self.storage.open(derivatives['preview']) as preview, Image.open(preview) as image:
+            self.assertEqual(max(image.size), 1280)
+
+        card = task.to_dict()
+        self.assertEqual(card['art_thumb_url'], self.storage.url(derivatives['thumb']))
+        self.assertEqual(card['art_url'], self.storage.url(derivatives['preview']))
+        self.assertEqual(card['final_art'], task.final_art.url)
+
+    def test_falls_back_to_original_until_generated_or_on_error(self):
+        task = Task.objects.create(title='Post', final_art=ContentFile(b'nao e imagem', name='quebrada.png'))
+        self._cleanup(task.final_art.name)
+        self.assertEqual(BackgroundJob.objects.count(), 1)
+        self.assertEqual(task.to_dict()['art_thumb_url'], task.final_art.url)
+
+        self.assertEqual(work('teste', burst=True), (1, 0))
+        task.refresh_from_db()
+        self.assertIn('error', task.final_art_derivatives)
+        self.assertEqual(task.to_dict()['art_thumb_url'], task.final_art.url)
+
+        # Reprocessar sem trocar a imagem não tenta de novo
+        task.save()
+        self.assertFalse(BackgroundJob.objects.exists())
+
+    def test_deleting_media_file_enqueues_its_derivatives(self):
+        media = MediaFile.objects.create(folder=self.folder, file=ContentFile(png_bytes(), name='foto.png'))
+        work('teste', burst=True)
+        media.refresh_from_db()
+        keys = [media.file.name] + derivative_keys(media.derivatives)
+        self._cleanup(*keys)
+        self.assertEqual(len(keys), 3)
+        self.assertEqual(media.thumb_url, self.storage.url(media.derivatives['thumb']))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            media.delete()
+        self.assertEqual(sorted(PendingObjectDelete.objects.values_list('key', flat=True)), sorted(keys))
+
+    def test_agency_removal_enqueues_every_derivative(self):
+        media = MediaFile.objects.create(folder=self.folder, file=ContentFile(png_bytes(), name='foto.png'))
+        task = Task.objects.create(title='Post', final_art=ContentFile(png_bytes(), name='arte.png'))
+        work('teste', burst=True)
+        media.refresh_from_db()
+        task.refresh_from_db()
+        art_keys = derivative_keys(task.final_art_derivatives)
+        keys = [media.file.name] + derivative_keys(media.derivatives) + art_keys
+        self._cleanup(*keys, task.final_art.name)
+        self.assertEqual(len(keys), 5)
+
+        schedule_tenant_media_deletes(self.tenant.schema_name)
+        self.assertEqual(sorted(PendingObjectDelete.objects.values_list('key', flat=True)), sorted(keys))
+
+
+# ==============================================================================
+# COMANDOS EM TODOS OS TENANTS
+# ==============================================================================
+
+class FailingTenantCommand(TenantCommand):
+
+    def handle_tenant(self, tenant, **options):
+        self.stdout.write('antes do erro')
+        raise RuntimeError('falhou de propósito')
+
+
+class TenantCommandTests(BrainHubTenantTestCase):
+
+    def test_sync_client_folders_creates_missing_folders_in_bulk(self):
+        first = Client.objects.create(name='Marca Um')
+        second = Client.objects.create(name='Marca Dois')
+        MediaFolder.objects.create(name='Geral', client=first)
+        storage = MediaFile._meta.get_field('file').storage
+        out = io.StringIO()
+
+        call_command('sync_client_folders', schema=[self.tenant.schema_name], workers=1, stdout=out)
+
+        keeps = list(MediaFile.objects.filter(filename='.keep').values_list('file', flat=True))
+        for key in keeps:
+            self.addCleanup(storage.delete, key)
+        self.assertIn('[1/1] ' + self.tenant.schema_name + ': ok', out.getvalue())
+        self.assertIn('7 pastas criadas, 7 sincronizadas no R2', out.getvalue())
+        self.assertEqual(len(keeps), 7)
+        self.assertTrue(all(storage.exists(key) for key in keeps))
+        for folder in MediaFolder.objects.all():
+            self.assertEqual(folder.path, f'/{folder.pk}/')
+        second.refresh_from_db()
+        self.assertEqual((second.media_files, StorageUsage.current().files), (4, 7))
+
+        out = io.StringIO()
+        call_command('sync_client_folders', schema=[self.tenant.schema_name], workers=1, stdout=out)
+        self.assertIn('nada a criar', out.getvalue())
+        self.assertEqual(MediaFolder.objects.count(), 8)
+
+    def test_failures_are_reported_per_tenant(self):
+        out, err = io.StringIO(), io.StringIO()
+        with self.assertRaisesMessage(CommandError, '1 tenants falharam'):
+            call_command(FailingTenantCommand(), workers=1, stdout=out, stderr=err)
+
+        self.assertIn(f'{self.tenant.schema_name}: ', out.getvalue())
+        self.assertIn('    antes do erro', out.getvalue())
+        self.assertIn('RuntimeError: falhou de propósito', err.getvalue())
+
+
+# ==============================================================================
+# FILA DE TAREFAS EM SEGUNDO PLANO
+# ==============================================================================
+
+@job(max_attempts=2)
+def create_client_job(name):
+    Client.objects.create(name=name)
+
+
+@job(max_attempts=2)
+def failing_job():
+    raise RuntimeError('falhou de propósito')
+
+
+class BackgroundJobTests(BrainHubTenantTestCase):
+
+    def test_job_runs_in_tenant_schema_and_leaves_the_queue(self):
+        queued = enqueue(create_client_job, args=['Cliente da Fila'])
+        self.assertEqual((queued.schema_name, queued.task), (self.tenant.schema_name, 'projects.tests.create_client_job'))
+
+        self.assertEqual(work('teste', burst=True), (1, 0))
+        self.assertTrue(Client.objects.filter(name='Cliente da Fila').exists())
+        self.assertFalse(BackgroundJob.objects.exists())
+
+    def test_claim_orders_by_priority_and_skips_future_jobs(self):
+        low = enqueue(create_client_job, args=['A'])
+        high = enqueue(create_client_job, args=['B'], priority=5)
+        enqueue(create_client_job, args=['C'], run_at=timezone.now() + timedelta(hours=1))
+
+        claimed = claim('teste', limit=5)
+        self.assertEqual([job.pk for job in claimed], [high.pk, low.pk])
+        self.assertEqual({(job.status, job.attempts, job.locked_by) for job in claimed}, {('running', 1, 'teste')})
+        self.assertEqual(claim('teste', limit=5), [])
+
+    def test_failure_backs_off_then_gives_up(self):
+        queued = enqueue(failing_job)
+
+        self.assertEqual(work('teste', burst=True), (0, 1))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('queued', 1))
+        self.assertGreater(queued.run_at, timezone.now() + timedelta(seconds=20))
+        self.assertIn('RuntimeError: falhou de propósito', queued.last_error)
+
+        BackgroundJob.objects.update(run_at=timezone.now())
+        self.assertEqual(work('teste', burst=True), (0, 1))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 2))
+
+    def test_stale_running_jobs_return_to_the_queue(self):
+        enqueue(create_client_job, args=['Perdido'])
+        claim('worker-morto')
+        BackgroundJob.objects.update(locked_at=timezone.now() - timedelta(seconds=settings.JOBS_STALE_SECONDS + 1))
+
+        self.assertEqual(requeue_stale(), 1)
+        self.assertEqual(work('teste', burst=True), (1, 0))
+
+    def test_stale_job_without_attempts_left_fails(self):
+        queued = enqueue(create_client_job, args=['Derruba o worker'])
+        BackgroundJob.objects.update(attempts=1)
+        claim('worker-morto')
+        BackgroundJob.objects.update(locked_at=timezone.now() - timedelta(seconds=settings.JOBS_STALE_SECONDS + 1))
+
+        self.assertEqual(requeue_stale(), 0)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 2))
+        self.assertEqual(work('teste', burst=True), (0, 0))
+
+    def test_meta_callback_keeps_the_token_out_of_the_queue(self):
+        http = self.login()
+        client_obj = Client.objects.create(name='Marca Meta')
+        session = http.session
+        session.update({'meta_oauth_state': 'estado', 'meta_client_id': client_obj.pk, 'meta_intent': 'facebook_only'})
+        session.save()
+
+        long_lived = SimpleNamespace(json=lambda: {'access_token': 'token-longo'})
+        with patch.object(MetaService, 'exchange_code_for_token', return_value={'access_token': 'token-curto'}), \
+                patch('projects.views.provider_http.get', return_value=long_lived):
+            http.get('/meta-callback/', {'code': 'c', 'state': 'estado'})
+
+        queued = BackgroundJob.objects.get()
+        self.assertEqual(queued.args, [client_obj.pk, 'facebook_only'])
+        with patch.object(MetaService, 'save_only_facebook_pages', return_value=2) as pages:
+            self.assertEqual(work('teste', burst=True), (1, 0))
+        pages.assert_called_once_with('token-longo', client_obj)
+
+    def test_tenant_is_blocked_until_its_schema_is_ready(self):
+        http = self.login()
+        Agency.objects.filter(pk=self.tenant.pk).update(schema_ready=False)
+
+        response = http.get('/')
+        self.assertEqual(response.status_code, 503)
+        self.assertContains(response, 'Preparando o Ambiente', status_code=503)
+
+        Agency.objects.filter(pk=self.tenant.pk).update(schema_ready=True)
+        self.assertNotEqual(http.get('/').status_code, 503)
+
+
+# ==============================================================================
+# PUBLICAÇÃO NAS REDES (ENTREGAS EM SEGUNDO PLANO)
+# ==============================================================================
+
+class PostPublishingTests(BrainHubTenantTestCase):
+
+    def setUp(self):
+        self.http = self.login()
+        self.client_obj = Client.objects.create(name='Marca Social')
+        self.linkedin = SocialAccount.objects.create(
+            client=self.client_obj, platform='linkedin', account_name='Perfil', account_id='urn:li:person:1', access_token='t'
+        )
+        self.instagram = SocialAccount.objects.create(
+            client=self.client_obj, platform='instagram', account_name='@marca', account_id='17841', access_token='t'
+        )
+
+    def _create_post(self, *accounts):
+        response = self.http.post('/api/social/create_post/', {
+            'client_id': self.client_obj.pk,
+            'caption': 'Lançamento!',
+            'scheduled_for': timezone.now().isoformat(),
+            'platforms': [account.pk for account in accounts],
+        })
+        self.assertEqual(response.status_code, 200)
+        return Post.objects.get(pk=response.json()['post_id'])
+
+    def test_api_enqueues_one_delivery_per_account_and_aggregates_status(self):
+        post = self._create_post(self.linkedin, self.instagram)
+        self.assertEqual(post.approval_status, 'publishing')
+        self.assertEqual(BackgroundJob.objects.filter(task='projects.publishing.deliver_post').count(), 2)
+
+        with patch.object(LinkedInService, 'publish_post', return_value='urn:li:share:9') as linkedin, \
+                patch.object(MetaService, 'publish_instagram_post', side_effect=PublishError('exige imagem')):
+            self.assertEqual(work('teste', burst=True), (2, 0))
+        linkedin.assert_called_once_with(self.linkedin, 'Lançamento!', None)
+
+        payload = self.http.get(f'/api/social/posts/{post.pk}/status/').json()['post']
+        self.assertEqual(payload['approval_status'], 'failed')
+        by_platform = {delivery['platform']: delivery for delivery in payload['deliveries']}
+        self.assertEqual(
+            (by_platform['linkedin']['status'], by_platform['linkedin']['external_id']), ('published', 'urn:li:share:9')
+        )
+        self.assertEqual((by_platform['instagram']['status'], by_platform['instagram']['error']), ('failed', 'exige imagem'))
+
+    def test_missing_or_malformed_date_is_rejected(self):
+        for scheduled_for in ('', 'amanhã às 10h', '2026-13-40T10:00'):
+            response = self.http.post('/api/social/create_post/', {
+                'client_id': self.client_obj.pk, 'caption': 'Sem data', 'scheduled_for': scheduled_for,
+                'platforms': [self.linkedin.pk],
+            })
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['status'], 'error')
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(BackgroundJob.objects.exists())
+
+    def test_temporary_errors_are_retried_by_the_queue(self):
+        post = self._create_post(self.linkedin)
+
+        with patch.object(LinkedInService, 'publish_post', side_effect=[requests.ConnectTimeout('timeout'), 'urn:li:share:2']):
+            self.assertEqual(work('teste', burst=True), (0, 1))
+            delivery = post.deliveries.get()
+            self.assertEqual((delivery.status, delivery.attempts), ('pending', 1))
+            self.assertIn('ConnectTimeout: timeout', delivery.last_error)
+            post.refresh_from_db()
+            self.assertEqual(post.approval_status, 'publishing')
+
+            BackgroundJob.objects.update(run_at=timezone.now())
+            self.assertEqual(work('teste', burst=True), (1, 0))
+
+        post.refresh_from_db()
+        self.assertEqual((post.approval_status, post.deliveries.get().attempts), ('published', 2))
+
+    def test_only_errors_that_never_reached_the_provider_are_retried(self):
+        refused = requests.ConnectionError(MaxRetryError(None, '/', NewConnectionError(None, 'Connection refused')))
+        unavailable = requests.HTTPError(response=SimpleNamespace(status_code=503))
+        dropped = requests.ConnectionError(ProtocolError('Connection aborted.', ConnectionResetError()))
+        for error, safe in [(refused, True), (unavailable, True), (requests.ReadTimeout('lento'), False), (dropped, False)]:
+            with self.subTest(error=error):
+                self.assertIs(is_safe_to_retry(error), safe)
+
+        # O provedor recebeu o POST: o post pode já estar no ar
+        for status in (429, 500, 502, 503, 504):
+            with self.subTest(status=status):
+                error = requests.HTTPError(response=SimpleNamespace(status_code=status))
+                self.assertIs(is_safe_to_retry(error), status in (429, 503))
+
+    def test_read_timeout_fails_instead_of_publishing_twice(self):
+        post = self._create_post(self.linkedin)
+
+        with patch.object(LinkedInService, 'publish_post', side_effect=requests.ReadTimeout('lento')) as publish:
+            self.assertEqual(work('teste', burst=True), (1, 0))
+        publish.assert_called_once()
+
+        delivery = post.deliveries.get()
+        self.assertEqual(delivery.status, 'failed')
+        self.assertIn('Confira se o post saiu', delivery.last_error)
+        self.assertFalse(BackgroundJob.objects.exists())
+
+    def test_delivery_interrupted_while_publishing_is_not_retried(self):
+        post = self._create_post(self.linkedin)
+        post.deliveries.update(status='publishing', attempts=1)
+
+        with patch.object(LinkedInService, 'publish_post') as publish:
+            self.assertEqual(work('teste', burst=True), (1, 0))
+        publish.assert_not_called()
+
+        post.refresh_from_db()
+        self.assertEqual(post.approval_status, 'failed')
+        self.assertIn('publicação interrompida', post.deliveries.get().last_error)
+
+
+class DuePostSchedulerTests(BrainHubTenantTestCase):
+
+    def setUp(self):
+        self.client_obj = Client.objects.create(name='Marca Agendada')
+        self.account = SocialAccount.objects.create(
+            client=self.client_obj, platform='linkedin', account_name='Perfil', account_id='urn:li:person:1', access_token='t'
+        )
+
+    def _post(self, when, **fields):
+        post = Post.objects.create(
+            client=self.client_obj, caption='Agendado', scheduled_for=when, approval_status='approved_to_schedule', **fields
+        )
+        post.accounts.add(self.account)
+        return post
+
+    def test_due_index_follows_post_status_and_time(self):
+        post = self._post(timezone.now() + timedelta(days=1))
+        entry = DuePost.objects.get()
+        self.assertEqual((entry.schema_name, entry.post_id), (self.tenant.schema_name, post.pk))
+
+        post.scheduled_for = timezone.now() + timedelta(days=2)
+        post.save()
+        self.assertEqual(DuePost.objects.get().scheduled_for, post.scheduled_for)
+
+        post.approval_status = 'draft'
+        post.save()
+        self.assertFalse(DuePost.objects.exists())
+
+    def test_scheduler_dispatches_only_due_posts(self):
+        due = self._post(timezone.now() - timedelta(minutes=1))
+        future = self._post(timezone.now() + timedelta(hours=1))
+        DuePost.objects.create(schema_name='agencia_apagada', post_id=1, scheduled_for=timezone.now())
+
+        self.assertEqual(dispatch_due_posts(), 1)
+
+        due.refresh_from_db()
+        self.assertEqual(due.approval_status, 'publishing')
+        self.assertEqual(list(due.deliveries.values_list('status', flat=True)), ['pending'])
+        self.assertEqual(BackgroundJob.objects.filter(task='projects.publishing.deliver_post').count(), 1)
+        self.assertEqual(list(DuePost.objects.values_list('post_id', flat=True)), [future.pk])
+        self.assertEqual(dispatch_due_posts(), 0)
+
+    def test_post_locked_by_another_transaction_stays_scheduled(self):
+        free = self._post(timezone.now() - timedelta(minutes=2))
+        busy = self._post(timezone.now() - timedelta(minutes=1))
+        select_for_update = QuerySet.select_for_update
+
+        def skip_busy(queryset, **kwargs):
+            # Simula o skip_locked pulando o post que uma edição está salvando
+            queryset = select_for_update(queryset, **kwargs)
+            return queryset.exclude(pk=busy.pk) if queryset.model is Post else queryset
+
+        with patch.object(QuerySet, 'select_for_update', skip_busy):
+            self.assertEqual(dispatch_due_posts(), 1)
+
+        entry = DuePost.objects.get()
+        self.assertEqual(entry.post_id, busy.pk)
+        self.assertGreater(entry.scheduled_for, timezone.now())
+        self.assertEqual(Post.objects.get(pk=free.pk).approval_status, 'publishing')
+
+        DuePost.objects.update(scheduled_for=timezone.now())
+        self.assertEqual(dispatch_due_posts(), 1)
+        self.assertFalse(DuePost.objects.exists())
+
+    def test_in_flight_limit_holds_back_dispatch(self):
+        self._post(timezone.now() - timedelta(minutes=1))
+        with override_settings(SCHEDULER_MAX_IN_FLIGHT=0):
+            self.assertEqual(dispatch_due_posts(), 0)
+        self.assertEqual(DuePost.objects.count(), 1)
+
+
+# ==============================================================================
+# CLIENTE HTTP DAS INTEGRAÇÕES
+# ==============================================================================
+
+class ProviderHTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    statuses = ports = None  # Por teste: respostas programadas (vazio = 200) e portas dos clientes
+
+    def _reply(self):
+        self.ports.append(self.client_address[1])
+        if self.path == '/lento':
+            time.sleep(0.5)
+        status = self.statuses.pop(0) if self.statuses else 200
+        body = b'{"ok": true}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(PROVIDER_HTTP_RETRIES=2, PROVIDER_HTTP_READ_TIMEOUT=0.2)
+class ProviderHTTPTests(SimpleTestCase):
+
+    def setUp(self):
+        self.handler = type('Handler', (ProviderHTTPHandler,), {'statuses': [], 'ports': []})
+        server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = f'http://127.0.0.1:{server.server_port}'
+        # Session nova por teste (a da thread guarda os settings da criação)
+        patch.object(provider_http, '_local', threading.local()).start()
+        self.addCleanup(patch.stopall)
+        provider_http.reset_stats()
+
+    def test_connections_are_reused_and_calls_measured(self):
+        for _ in range(3):
+            self.assertEqual(provider_http.get(self.url + '/me').json(), {'ok': True})
+
+        self.assertEqual(len(set(self.handler.ports)), 1)
+        stats = provider_http.stats()['127.0.0.1']
+        self.assertEqual((stats['calls'], stats['errors']), (3, 0))
+        self.assertGreater(stats['max_ms'], 0)
+
+    def test_retries_idempotent_calls_only(self):
+        self.handler.statuses[:] = [503, 200]
+        self.assertEqual(provider_http.get(self.url + '/me').status_code, 200)
+
+        self.handler.statuses[:] = [503, 200]
+        self.assertEqual(provider_http.post(self.url + '/publicar', json={}).status_code, 503)
+        self.assertEqual(len(self.handler.ports), 3)
+
+    def test_read_timeout_is_applied_and_not_retried(self):
+        with self.assertRaises(requests.ReadTimeout):
+            provider_http.get(self.url + '/lento')
+        self.assertEqual(len(self.handler.ports), 1)
+        self.assertEqual(provider_http.stats()['127.0.0.1']['errors'], 1)
+
+
+# ==============================================================================
+# PLANOS DE CONSULTA (regressão de índices)
+# ==============================================================================
+
+class TaskQueryPlanTests(BrainHubTenantTestCase):
+    """
+    Roda EXPLAIN nas queries de Task que as views realmente executam e falha se
+    alguma varrer a tabela inteira: Seq Scan, ou (com enable_seqscan=off) um
+    índice de Task percorrido sem Index Cond.
+    """
+
+    def setUp(self):
+        self.http = self.login()
+        clients = [Client.objects.create(name=f'Cliente {i}') for i in range(5)]
+        self.client_obj = clients[0]
+        now = timezone.now()
+        statuses = [key for key, label in OPERATIONAL_KANBAN_STAGES]
+        Task.objects.bulk_create([
+            Task(
+                title=f'Card {i}', client=clients[i % 5],
+                kanban_type='operational' if i % 2 else 'general',
+                status=statuses[i % len(statuses)] if i % 2 else 'todo',
+                scheduled_date=now + timedelta(days=i % 60) if i % 2 else None,
+                rank=f'{i:04d}',
+            )
+            for i in range(400)
+        ])
+        # bulk_create não dispara o signal: mesmo caminho do comando update_task_search
+        Task.objects.update(search_vector=task_search_vector())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE projects_task')
+
+    def _full_scans(self, node, task_indexes):
+        """Nós do plano que leem Task inteira."""
+        found = []
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') == 'projects_task':
+            found.append(node['Node Type'])
+        if node.get('Index Name') in task_indexes and 'Index Cond' not in node:
+            found.append(f"{node['Node Type']} sem condição ({node['Index Name']})")
+        for child in node.get('Plans', []):
+            found += self._full_scans(child, task_indexes)
+        return found
+
+    def assertUsesTaskIndexes(self, response, captured):
+        self.assertEqual(response.status_code, 200)
+        queries = [q['sql'] for q in captured if 'FROM "projects_task"' in q['sql']]
+        self.assertTrue(queries)
+
+        connection.set_tenant(self.tenant)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'projects_task'")
+            task_indexes = {row[0] for row in cursor.fetchall()}
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                for sql in queries:
+                    cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+                    plan = cursor.fetchone()[0]
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    self.assertEqual(self._full_scans(plan[0]['Plan'], task_indexes), [], sql)
+            finally:
+                cursor.execute('RESET enable_seqscan')
+
+    def test_operational_kanban_view(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.http.get('/kanban/operational/')
+        self.assertUsesTaskIndexes(response, ctx.captured_queries)
+
+    def test_get_calendar_events(self):
+        today = timezone.now()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.http.get('/api/calendar/events/', {'year': today.year, 'month': today.month})
+        self.assertTrue(response.json())
+        self.assertUsesTaskIndexes(response, ctx.captured_queries)
+
+    def test_client_metrics_dashboard(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.http.get(f'/clients/{self.client_obj.pk}/metrics/')
+        self.assertUsesTaskIndexes(response, ctx.captured_queries)
+
+    def test_search_tasks_api(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.http.get('/api/tasks/search/', {'q': 'card'})
+        self.assertTrue(response.json()['results'])
+        self.assertUsesTaskIndexes(response, ctx.captured_queries)
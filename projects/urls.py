@@ -49,6 +49,11 @@ urlpatterns = [
     path('api/task/add-general/', views.AddTaskAPI.as_view(), name='add_task_api'),
     path('api/task/add-operational/', views.AddOperationalTaskAPI.as_view(), name='add_operational_task'),
     path('api/kanban/update/', views.KanbanUpdateTask.as_view(), name='kanban_update_task'),
+    path('api/kanban/<str:kanban_type>/changes/', views.kanban_changes_api, name='kanban_changes_api'),
+    path('api/kanban/<str:kanban_type>/events/', views.kanban_events_stream, name='kanban_events_stream'),
+    path('api/kanban/card/<int:pk>/', views.operational_card_fragment, name='operational_card_fragment'),
+    path('api/tasks/search/', views.search_tasks_api, name='search_tasks_api'),
+    path('api/tasks/tags/', views.tag_usage_api, name='tag_usage_api'),
     path('api/task/details/<int:pk>/', views.get_task_details_api, name='get_task_details_api'),
     path('api/task/delete/<int:pk>/', views.DeleteTaskAPI.as_view(), name='delete_task_api'),
     path('api/task/edit/<int:pk>/', views.EditTaskAPI.as_view(), name='edit_task_api'),
@@ -88,6 +93,7 @@ urlpatterns = [
     path('social/', views.social_dashboard, name='social_dashboard'),
     path('social/studio/', views.create_post_studio, name='create_post_studio'),
     path('api/social/create_post/', views.create_post_api, name='create_post_api'),
+    path('api/social/posts/<int:post_id>/status/', views.post_status_api, name='post_status_api'),
     
     # --- META (FACEBOOK & INSTAGRAM) ---
     # Início Separado (Novas Funções)
@@ -120,7 +126,14 @@ urlpatterns = [
     
     # Ações de Mídia
     path('media/folder/<int:folder_id>/delete/', views.delete_folder, name='delete_folder'),
+    path('api/media/folder/<int:folder_id>/move/', views.move_folder_api, name='api_move_folder'),
     path('media/file/<int:file_id>/delete/', views.delete_file, name='delete_file'),
     path('api/media/upload/', views.upload_photo_api, name='api_upload_photo'),
+    path('api/media/upload/url/', views.media_upload_url_api, name='api_media_upload_url'),
+    path('api/media/upload/complete/', views.media_upload_complete_api, name='api_media_upload_complete'),
+    path('api/media/multipart/start/', views.multipart_start_api, name='api_multipart_start'),
+    path('api/media/multipart/<int:pk>/parts/', views.multipart_parts_api, name='api_multipart_parts'),
+    path('api/media/multipart/<int:pk>/complete/', views.multipart_complete_api, name='api_multipart_complete'),
+    path('api/media/multipart/<int:pk>/abort/', views.multipart_abort_api, name='api_multipart_abort'),
     path('media/download-batch/', views.download_batch, name='media_download_batch'),
 ]
\ No newline at end of file
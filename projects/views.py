@@ -1,37 +1,50 @@
 import json
 import secrets
 import datetime
-import requests
-import zipfile
-import io
 import base64
 import hashlib
 import os
 from django.utils.text import slugify
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST
+from django.views.decorators.cache import cache_control
 from django.views.generic import View
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
-from django.db import models, connection
+from django.db import IntegrityError, models, connection, transaction
 from django.urls import reverse
 from django.conf import settings
 from django.contrib import messages
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.contrib.auth import views as auth_views
 from django.core.files.base import ContentFile
+from django.core import signing
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
 from projects.models import Client, SocialAccount, Campaign, Post
 
 # --- IMPORTS LOCAIS ---
 from .models import (
-    Task, CalendarEvent, Client, SocialAccount, 
-    MediaFolder, MediaFile, SOCIAL_NETWORKS, CONTENT_TYPES
+    Task, TaskTombstone, Tag, DataVersion, ClientMetricsRollup, CalendarEvent, Client, SocialAccount, 
+    MediaFolder, MediaFile, MultipartUpload, StorageUsage, SOCIAL_NETWORKS, CONTENT_TYPES, KANBAN_TYPES,
+    GENERAL_KANBAN_STAGES, OPERATIONAL_KANBAN_STAGES, TOMBSTONE_RETENTION, highlight_html
 )
 from .forms import ClientForm, TenantAuthenticationForm, MediaFileForm, FolderForm
 from accounts.models import CustomUser
-from .services import MetaService, LinkedInService, TikTokService, PinterestService, YouTubeService, XService
+from .services import MetaService, LinkedInService, TikTokService, PinterestService, YouTubeService, XService, discover_meta_accounts
+from . import provider_http
+from .jobs import enqueue
+from .publishing import dispatch_post
+from .events import publish_task_event, release_db_connections, task_event_stream
+from .zipstream import iterate_in_thread, stream_media_zip
+from .derivatives import derivative_url
+from .storage import head_object, presigned_put_url
+from .multipart import (
+    abort_upload, complete_upload, create_upload, part_size_for, presigned_part_urls, uploaded_parts
+)
 
 # ==============================================================================
 # 1. DASHBOARDS E VISÕES GERAIS
@@ -231,7 +244,37 @@ def client_detail_api(request, pk):
         'client': client,
     })
 
+# --- GET CONDICIONAL (ETag / Last-Modified) ---
+# Os validadores custam uma query pequena; se o navegador já tem a versão atual
+# a view nem roda (304 sem serializar nada). `no-cache` = guarda, mas sempre revalida.
+
+def clients_etag(request, *args, **kwargs):
+    version, changed_at = DataVersion.current('clients')
+    return f"clients-{version}-{kwargs.get('pk', 'all')}"
+
+def clients_last_modified(request, *args, **kwargs):
+    return DataVersion.current('clients')[1]
+
+def task_details_etag(request, pk):
+    updated_at = Task.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None  # 404 fica por conta da view
+    # O card mostra nome/logo do cliente: versão de clientes entra no ETag
+    return f"task-{pk}-{updated_at.timestamp()}-c{DataVersion.current('clients')[0]}"
+
+def calendar_etag(request):
+    try:
+        tasks = Task.objects.scheduled_in_month(int(request.GET.get('year')), int(request.GET.get('month')))
+    except (TypeError, ValueError):
+        return None  # Parâmetros inválidos: a view devolve o 400
+    # Contagem pega exclusões; Max(updated_at) pega criações e edições
+    stats = tasks.order_by().aggregate(total=models.Count('id'), last=models.Max('updated_at'))
+    last = stats['last'].timestamp() if stats['last'] else 0
+    return f"calendar-{request.GET.get('year')}-{request.GET.get('month')}-{stats['total']}-{last}"
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=clients_etag, last_modified_func=clients_last_modified)
 def get_client_data_api(request, pk):
     client = get_object_or_404(Client, pk=pk)
     connected_platforms = list(client.social_accounts.filter(is_active=True).values_list('platform', flat=True))
@@ -254,6 +297,8 @@ def get_client_data_api(request, pk):
     return JsonResponse(data)
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=clients_etag, last_modified_func=clients_last_modified)
 def get_clients_list_api(request):
     clients = Client.objects.all().values('id', 'name')
     return JsonResponse({'clients': list(clients)})
@@ -266,21 +311,9 @@ def client_metrics_dashboard(request, pk):
     """
     client = get_object_or_404(Client, pk=pk)
     
-    # 1. Todas as tarefas vinculadas a este cliente
-    all_tasks = Task.objects.filter(client=client)
-    
-    # --- Métricas de Tarefas Gerais (Projetos/Gestão) ---
-    general_tasks = all_tasks.filter(kanban_type='general')
-    task_status_counts = general_tasks.values('status').annotate(count=models.Count('id'))
-    task_chart_data = {item['status']: item['count'] for item in task_status_counts}
-
-    # --- Métricas de Social Media (Tasks Operacionais) ---
-    op_tasks = all_tasks.filter(kanban_type='operational')
-    post_status_counts = op_tasks.values('status').annotate(count=models.Count('id'))
-    post_chart_data = {item['status']: item['count'] for item in post_status_counts}
-    
-    total_posts_created = op_tasks.count()
-    total_posts_scheduled = op_tasks.filter(status='scheduled').count()
+    # Todos os números (tarefas gerais, posts e séries semanais) saem de uma única
+    # query agregada, guardada por cliente até alguma Task dele mudar
+    metrics = ClientMetricsRollup.for_client(client)
     
     # Placeholders (Model Task ainda não tem likes/views)
     total_likes = 0 
@@ -288,11 +321,12 @@ def client_metrics_dashboard(request, pk):
 
     context = {
         'client': client,
-        'task_chart_data': json.dumps(task_chart_data),
-        'post_chart_data': json.dumps(post_chart_data),
-        'total_tasks': general_tasks.count(),
-        'total_posts': total_posts_created,
-        'posts_scheduled': total_posts_scheduled,
+        'task_chart_data': json.dumps(metrics['task_chart']),
+        'post_chart_data': json.dumps(metrics['post_chart']),
+        'weekly_chart_data': json.dumps(metrics['weekly']),
+        'total_tasks': metrics['total_tasks'],
+        'total_posts': metrics['total_posts'],
+        'posts_scheduled': metrics['posts_scheduled'],
         'total_likes': total_likes,
         'total_views': total_views,
     }
@@ -336,33 +370,23 @@ def general_kanban_view(request):
     """
     template = 'projects/general_kanban.html'
     title = 'Administração da Agência'
+    # Cursor tirado ANTES da leitura do quadro (nada se perde entre a leitura e o 1º delta)
+    kanban_cursor = encode_kanban_cursor(timezone.now())
     
     # 1. Definição das Colunas (Para o loop {% for ... in stages %} do HTML)
-    stages = [
-        ('todo', 'A Fazer'), 
-        ('doing', 'Em Andamento'), 
-        ('done', 'Concluído')
-    ]
-
-    # 2. Busca tarefas do tipo GERAL
-    tasks = Task.objects.filter(kanban_type='general').order_by('order')
+    stages = GENERAL_KANBAN_STAGES
+
+    # 2. Busca tarefas do tipo GERAL (uma query, agrupadas por status em Python)
+    tasks = Task.objects.filter(kanban_type='general').order_by('rank', 'order')
+    active_tag = request.GET.get('tag')
+    if active_tag:
+        tasks = tasks.with_tag(active_tag)
+    columns = tasks.to_board_columns(stages, fallback_status='todo')
     
     # 3. Monta o Dicionário de Listas para o JavaScript
     # O seu HTML antigo usa JS para renderizar, então precisamos serializar tudo aqui.
-    tasks_by_status = {
-        'todo': [],
-        'doing': [],
-        'done': []
-    }
-
-    for task in tasks:
-        # Garante que o status existe no dicionário (segurança)
-        if task.status in tasks_by_status:
-            tasks_by_status[task.status].append(task.to_dict())
-        else:
-            # Caso tenha algum status antigo ou inválido, joga no 'todo' ou ignora
-            if 'todo' in tasks_by_status: 
-                tasks_by_status['todo'].append(task.to_dict())
+    # Status antigos ou inválidos caem na coluna 'todo'.
+    tasks_by_status = {column['id']: column['tasks'] for column in columns}
 
     # Serializa para JSON
     kanban_data_json = json.dumps(tasks_by_status)
@@ -372,6 +396,8 @@ def general_kanban_view(request):
         'stages': stages,                     # Para montar as colunas <div>
         'kanban_data': kanban_data_json,      # Para o primeiro script (se houver)
         'kanban_data_json': kanban_data_json, # Para o window.KANBAN_INITIAL_DATA
+        'kanban_cursor': kanban_cursor,       # Para o delta (kanban_changes_api)
+        'active_tag': active_tag,             # Filtro ?tag= (o JS aplica o mesmo filtro no delta)
         
         # Dados auxiliares para o Modal de Criação:
         'clients': Client.objects.filter(is_active=True),
@@ -395,27 +421,18 @@ def operational_kanban_view(request):
     template = 'projects/operational_kanban.html'
     title = 'Fluxo de Produção'
     
-    stages = [
-        ('briefing', 'Briefing'),
-        ('copy', 'Copy'),
-        ('design', 'Design'),
-        ('review_internal', 'Aprovação Interna'),
-        ('review_client', 'Aprovação Cliente'),
-        ('scheduled', 'Agendado'),
-    ]
+    stages = OPERATIONAL_KANBAN_STAGES
 
     # Busca tarefas operacionais
-    tasks = Task.objects.filter(kanban_type='operational').order_by('order')
+    tasks = Task.objects.filter(kanban_type='operational').order_by('rank', 'order')
+    active_tag = request.GET.get('tag')
+    if active_tag:
+        tasks = tasks.with_tag(active_tag)
     
     # Monta estrutura de LISTA (Melhor para o HTML novo)
-    kanban_columns = []
-    for key, label in stages:
-        stage_tasks = tasks.filter(status=key)
-        kanban_columns.append({
-            'id': key,
-            'title': label,
-            'tasks': [t.to_dict() for t in stage_tasks] # Usa o to_dict() atualizado
-        })
+    # Uma única query; status desconhecidos caem na primeira coluna (Briefing).
+    # Colunas longas (Publicado) são cortadas em KANBAN_COLUMN_MAX_CARDS cards
+    kanban_columns = tasks.to_board_columns(stages, limit=settings.KANBAN_COLUMN_MAX_CARDS or None)
 
     # Lógica de Redes Sociais (Só necessária aqui)
     clients = Client.objects.filter(is_active=True)
@@ -434,6 +451,7 @@ def operational_kanban_view(request):
 
     context = {
         'kanban_columns': kanban_columns, # Estrutura nova
+        'active_tag': active_tag,
         'clients': clients,
         'users': CustomUser.objects.filter(agency=request.tenant),
         'page_title': title,
@@ -456,6 +474,7 @@ def update_task_api(request, pk):
     Lida com: Salvar dados, Mudar Status (Voltar) e Aprovação/Rejeição.
     """
     task = get_object_or_404(Task, pk=pk)
+    old_status = task.status
     
     try:
         # 1. AÇÃO ESPECIAL: VOLTAR ETAPA (FORCE STATUS)
@@ -517,6 +536,7 @@ def update_task_api(request, pk):
 
         # Salva tudo
         task.save()
+        publish_task_event('moved' if task.status != old_status else 'updated', task)
         
         return JsonResponse({
             'status': 'success', 
@@ -532,35 +552,21 @@ def update_task_api(request, pk):
 def kanban_view(request, kanban_type='general'):
     # 1. Definição de Colunas
     if kanban_type == 'operational':
-        stages = [
-            ('briefing', 'Briefing'),
-            ('copy', 'Copy'),
-            ('design', 'Design'),
-            ('review_internal', 'Aprovação Interna'),
-            ('review_client', 'Aprovação Cliente'),
-            ('scheduled', 'Agendado'),
-        ]
+        stages = OPERATIONAL_KANBAN_STAGES
         template = 'projects/operational_kanban.html'
         title = 'Fluxo de Produção'
     else:
         # Fallback para kanban geral
-        stages = [('todo', 'A Fazer'), ('doing', 'Em Andamento'), ('done', 'Concluído')]
+        stages = GENERAL_KANBAN_STAGES
         template = 'projects/general_kanban.html'
         title = 'Tarefas Gerais'
 
     # 2. Busca e Organiza Tarefas
-    tasks = Task.objects.filter(kanban_type=kanban_type).order_by('order')
+    tasks = Task.objects.filter(kanban_type=kanban_type).order_by('rank', 'order')
     
-    # Monta uma estrutura fácil para o HTML ler:
-    # [ {'id': 'briefing', 'title': 'Briefing', 'tasks': [... कृपा...]}, ... ]
-    kanban_columns = []
-    for key, label in stages:
-        stage_tasks = tasks.filter(status=key)
-        kanban_columns.append({
-            'id': key,
-            'title': label,
-            'tasks': [t.to_dict() for t in stage_tasks]
-        })
+    # Monta uma estrutura fácil para o HTML ler (uma única query):
+    # [ {'id': 'briefing', 'title': 'Briefing', 'tasks': [...], 'count': N, 'truncated': bool}, ... ]
+    kanban_columns = tasks.to_board_columns(stages, limit=settings.KANBAN_COLUMN_MAX_CARDS or None)
 
     # 3. Lógica de Redes (Mantida igual a anterior)
     clients = Client.objects.filter(is_active=True)
@@ -678,10 +684,158 @@ def update_task_kanban(request, pk):
         
     return redirect(request.META.get('HTTP_REFERER', 'dashboard'))
 
+# --- DELTA DO KANBAN (Atualização incremental) ---
+
+# Margem para transações que gravaram `updated_at` antes do cursor mas só
+# commitaram depois. O cliente faz upsert por id, então repetir cards é inofensivo.
+KANBAN_CURSOR_OVERLAP = datetime.timedelta(seconds=5)
+
+def encode_kanban_cursor(moment):
+    """Cursor opaco (microssegundos desde epoch), seguro para query string."""
+    return str(int(moment.timestamp() * 1_000_000))
+
+def decode_kanban_cursor(cursor):
+    try:
+        return datetime.datetime.fromtimestamp(int(cursor) / 1_000_000, tz=datetime.timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
 @login_required
-def get_task_details_api(request, pk):
-    task = get_object_or_404(Task, pk=pk)
-    return JsonResponse(task.to_dict())
+def kanban_changes_api(request, kanban_type):
+    """
+    Retorna apenas as tarefas criadas/editadas/movidas e as excluídas desde o cursor.
+    GET ?since=<cursor>. Sem cursor (ou cursor expirado) devolve o quadro completo com reset=True.
+    """
+    if kanban_type not in dict(KANBAN_TYPES):
+        return JsonResponse({'status': 'error', 'message': 'Kanban inválido.'}, status=404)
+
+    now = timezone.now()
+    since = None
+    if request.GET.get('since'):
+        since = decode_kanban_cursor(request.GET.get('since'))
+        if since is None:
+            return JsonResponse({'status': 'error', 'message': 'Cursor inválido.'}, status=400)
+
+    tasks = Task.objects.filter(kanban_type=kanban_type).order_by('rank', 'order')
+    reset = since is None or since < now - TOMBSTONE_RETENTION
+    deleted = []
+
+    if not reset:
+        window_start = since - KANBAN_CURSOR_OVERLAP
+        tasks = tasks.filter(updated_at__gt=window_start)
+        deleted = list(
+            TaskTombstone.objects
+            .filter(kanban_type=kanban_type, deleted_at__gt=window_start)
+            .values_list('task_id', flat=True)
+        )
+
+    return JsonResponse({
+        'status': 'success',
+        'cursor': encode_kanban_cursor(now),
+        'reset': reset,
+        'tasks': tasks.to_board_payload(),
+        'deleted': deleted,
+    })
+
+# --- EVENTOS EM TEMPO REAL (SSE) ---
+
+@login_required
+async def kanban_events_stream(request, kanban_type):
+    """
+    Stream SSE do quadro: o navegador recebe um evento a cada card criado, movido,
+    editado ou excluído por outro usuário, sem recarregar a página.
+    Requer o servidor ASGI (gunicorn + UvicornWorker).
+    """
+    if kanban_type not in dict(KANBAN_TYPES):
+        return JsonResponse({'status': 'error', 'message': 'Kanban inválido.'}, status=404)
+
+    # A conexão aberta pelo middleware/login não fica presa enquanto a aba estiver aberta
+    await sync_to_async(release_db_connections)()
+    response = StreamingHttpResponse(
+        task_event_stream(request.tenant.schema_name, kanban_type),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Nginx/proxies não devem bufferizar o stream
+    return response
+
+@login_required
+def operational_card_fragment(request, pk):
+    """HTML de um único card operacional (o JS troca só o card que mudou)."""
+    task = get_object_or_404(Task.objects.for_board(), pk=pk)
+    tag = request.GET.get('tag')
+    if tag and tag not in [t.name for t in task.tag_set.all()]:
+        # Card saiu do filtro ativo do quadro: o JS remove
+        return HttpResponse(status=204)
+    return render(request, 'projects/includes/operational_card.html', {'task': task.to_dict()})
+
+# --- TAGS ---
+
+@login_required
+def tag_usage_api(request):
+    """
+    Quantas tarefas usam cada tag no tenant. GET ?kanban_type=<general|operational>.
+    A contagem sai da tabela de ligação (índice por tag), sem ler o texto das tarefas.
+    """
+    usage = models.Count('tasks')
+    kanban_type = request.GET.get('kanban_type')
+    if kanban_type in dict(KANBAN_TYPES):
+        usage = models.Count('tasks', filter=models.Q(tasks__kanban_type=kanban_type))
+
+    tags = Tag.objects.annotate(usage=usage).filter(usage__gt=0).order_by('-usage', 'name')
+    return JsonResponse({
+        'status': 'success',
+        'tags': [{'name': tag.name, 'count': tag.usage} for tag in tags],
+    })
+
+# --- BUSCA TEXTUAL ---
+
+SEARCH_MAX_RESULTS = 50
+
+@login_required
+def search_tasks_api(request):
+    """
+    Busca nas tarefas (título, descrição, briefing e copy) via full-text do Postgres.
+    GET ?q=<texto>&kanban_type=<general|operational>&limit=<n>
+    """
+    text = (request.GET.get('q') or '').strip()
+    if len(text) < 2:
+        return JsonResponse({'status': 'error', 'message': 'Digite ao menos 2 caracteres.'}, status=400)
+
+    try:
+        limit = int(request.GET.get('limit', 20))
+    except (TypeError, ValueError):
+        limit = 20
+    limit = max(1, min(limit, SEARCH_MAX_RESULTS))
+
+    tasks = Task.objects.search(text)
+    kanban_type = request.GET.get('kanban_type')
+    if kanban_type in dict(KANBAN_TYPES):
+        tasks = tasks.filter(kanban_type=kanban_type)
+
+    # 1ª query: só ids + relevância (usa o GIN). 2ª: destaques apenas da página.
+    page = list(tasks.values_list('id', 'search_rank')[:limit])
+    ranks = dict(page)
+    highlighted = {
+        task.id: task
+        for task in Task.objects.filter(id__in=ranks).select_related('client').with_highlights(text)
+    }
+
+    results = []
+    for task_id, rank in page:
+        task = highlighted[task_id]
+        results.append({
+            'id': task.id,
+            'title': task.title,
+            'title_highlight': highlight_html(task.title_highlight),
+            'snippet': highlight_html(task.snippet.strip()),
+            'kanban_type': task.kanban_type,
+            'status': task.status,
+            'client_name': task.client.name if task.client else None,
+            'score': round(rank, 4),
+        })
+
+    return JsonResponse({'status': 'success', 'results': results})
 
 # --- APIs JSON para Drag & Drop e Criação Rápida ---
 
@@ -701,7 +855,6 @@ class AddTaskAPI(View):
             
             # --- MUDANÇA 1: PEGA LISTA DE TAGS ---
             tags_list = request.POST.getlist('tags') 
-            tags_str = ",".join(tags_list) if tags_list else ""
 
             # --- MUDANÇA 2: PEGA LISTA DE RESPONSÁVEIS ---
             assigned_ids = request.POST.getlist('assigned_to')
@@ -713,21 +866,16 @@ class AddTaskAPI(View):
             # Tratamento de Data vazia
             if deadline == '': deadline = None
 
-            # Calcula a ordem
-            max_order = Task.objects.filter(kanban_type=kanban_type, status='todo').aggregate(models.Max('order'))['order__max']
-            new_order = (max_order or 0) + 1
-            
             # --- MUDANÇA 3: CRIA A TAREFA SEM O CAMPO assigned_to ---
-            task = Task.objects.create(
+            # create_in_column calcula o rank (fim da coluna) sem corrida
+            task = Task.objects.create_in_column(
                 title=title,
                 kanban_type=kanban_type,
                 status='todo',
                 priority=priority,
                 description=description,      
                 deadline=deadline,
-                tags=tags_str,
                 created_by=request.user,
-                order=new_order
                 # REMOVIDO: assigned_to_id=... (Isso causava o erro)
             )
             
@@ -736,7 +884,11 @@ class AddTaskAPI(View):
                 # Limpa IDs vazios e converte para inteiro
                 clean_ids = [int(x) for x in assigned_ids if x]
                 task.assigned_to.set(clean_ids)
+
+            if tags_list:
+                task.set_tags(tags_list)
             
+            publish_task_event('created', task)
             return JsonResponse({'status':'success', 'task': task.to_dict()})
 
         except Exception as e:
@@ -771,8 +923,7 @@ class EditTaskAPI(View):
             # Tratamento de Tags
             # getlist retorna lista vazia se não tiver nada, então verificamos se a chave existe
             if 'tags' in request.POST:
-                tags_list = request.POST.getlist('tags')
-                task.tags = ",".join(tags_list)
+                task.set_tags(request.POST.getlist('tags'))
             
             # Tratamento de Responsáveis (ManyToMany)
             if 'assigned_to' in request.POST:
@@ -783,12 +934,15 @@ class EditTaskAPI(View):
             # Se vier vazio (lista vazia), o .set([]) vai limpar. Isso é o correto.
 
             task.save()
+            publish_task_event('updated', task)
             return JsonResponse({'status':'success', 'task': task.to_dict()})
             
         except Exception as e:
             return JsonResponse({'status':'error', 'message': str(e)}, status=500)
             
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=task_details_etag)
 def get_task_details_api(request, pk):
     """API Leve apenas para buscar dados para o Modal de Edição"""
     task = get_object_or_404(Task, pk=pk)
@@ -812,18 +966,13 @@ class AddOperationalTaskAPI(View):
             if not client_id:
                 return JsonResponse({'status':'error', 'message':'Selecione um cliente.'}, status=400)
             
-            # 2. Ordem automática
-            max_order = Task.objects.filter(kanban_type='operational', status='briefing').aggregate(models.Max('order'))['order__max']
-            new_order = (max_order or 0) + 1
-            
-            # 3. Cria a tarefa (SEM assigned_to)
-            task = Task.objects.create(
+            # 2. Cria a tarefa (SEM assigned_to) no fim da coluna Briefing
+            task = Task.objects.create_in_column(
                 title=title,
                 client_id=client_id,
                 created_by=request.user, # Apenas quem criou fica registrado
                 kanban_type='operational',
                 status='briefing',
-                order=new_order,
                 
                 # Campos do Briefing que já vêm preenchidos
                 social_network=request.POST.get('social_network'),
@@ -833,6 +982,7 @@ class AddOperationalTaskAPI(View):
                 briefing_files=request.FILES.get('briefing_files')
             )
             
+            publish_task_event('created', task)
             return JsonResponse({'status':'success', 'task': task.to_dict()})
             
         except Exception as e:
@@ -847,16 +997,23 @@ class KanbanUpdateTask(View):
         try:
             data = json.loads(request.body)
             task = Task.objects.get(id=data.get('task_id'))
-            
-            if data.get('status'):
-                task.status = data.get('status')
-                task.save()
-            
-            if data.get('newOrderList'):
-                for idx, t_id in enumerate(data['newOrderList']):
-                    Task.objects.filter(id=t_id).update(order=idx)
+
+            # Vizinhos do card na nova posição. O JS envia a coluna inteira
+            # (newOrderList), mas só o card movido é gravado (rank fracionário).
+            after_id = data.get('after_id')
+            before_id = data.get('before_id')
+            order_list = [str(t_id) for t_id in data.get('newOrderList') or []]
+            if str(task.id) in order_list:
+                idx = order_list.index(str(task.id))
+                after_id = order_list[idx - 1] if idx > 0 else None
+                before_id = order_list[idx + 1] if idx + 1 < len(order_list) else None
+
+            status_changed = data.get('status') and data.get('status') != task.status
+            if status_changed or after_id or before_id:
+                task.move_to(data.get('status'), after_id=after_id, before_id=before_id)
+                publish_task_event('moved', task)
                     
-            return JsonResponse({'status': 'success'})
+            return JsonResponse({'status': 'success', 'rank': task.rank})
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
@@ -864,7 +1021,10 @@ class KanbanUpdateTask(View):
 class DeleteTaskAPI(View):
     @method_decorator(login_required)
     def delete(self, request, pk):
-        get_object_or_404(Task, pk=pk).delete()
+        task = get_object_or_404(Task, pk=pk)
+        task.delete()
+        # Após o delete() o pk vira None: envia o id original
+        publish_task_event('deleted', task, task_id=pk)
         return JsonResponse({'status': 'success'})
 
 # ==============================================================================
@@ -887,6 +1047,7 @@ def send_approval_link(request, task_id):
     if task.status == 'review_internal':
         task.status = 'review_client'
         task.save()
+        publish_task_event('moved', task)
 
     return JsonResponse({'status': 'success', 'approval_url': url})
 
@@ -895,7 +1056,7 @@ def external_approval_view(request, token):
     task = get_object_or_404(Task, approval_token=token)
     context = {
         'task': task,
-        'image_url': task.final_art.url if task.final_art else None
+        'image_url': derivative_url(task.final_art, task.final_art_derivatives, 'preview'),
     }
     return render(request, 'projects/external_approval.html', context)
 
@@ -919,6 +1080,7 @@ class ProcessApprovalAction(View):
                 task.last_feedback = feedback
                 
             task.save()
+            publish_task_event('moved', task)
             return JsonResponse({'status': 'success'})
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
@@ -932,18 +1094,21 @@ def calendar_view(request):
     return render(request, 'projects/calendar.html')
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=calendar_etag)
 def get_calendar_events(request):
-    year = request.GET.get('year')
-    month = request.GET.get('month')
+    try:
+        year = int(request.GET.get('year'))
+        month = int(request.GET.get('month'))
+        if not 1 <= month <= 12:
+            raise ValueError
+    except (TypeError, ValueError):
+        return JsonResponse({'status': 'error', 'message': 'Mês/ano inválido.'}, status=400)
     
     events_data = []
     
-    # Busca Tasks Operacionais agendadas
-    tasks = Task.objects.filter(
-        kanban_type='operational', 
-        scheduled_date__year=year, 
-        scheduled_date__month=month
-    )
+    # Busca Tasks Operacionais agendadas (intervalo do mês, usa task_op_schedule_idx)
+    tasks = Task.objects.scheduled_in_month(year, month)
     for t in tasks:
         events_data.append({
             'id': t.id,
@@ -952,7 +1117,7 @@ def get_calendar_events(request):
             'time': t.scheduled_date.strftime('%H:%M'),
             'type': 'task',
             'status': t.status,
-            'image': t.final_art.url if t.final_art else None
+            'image': derivative_url(t.final_art, t.final_art_derivatives, 'thumb'),
         })
         
     return JsonResponse(events_data, safe=False)
@@ -995,33 +1160,18 @@ def media_manager(request, client_id, folder_id=None):
                 messages.success(request, "Pasta criada!")
                 return redirect(request.path)
 
-        elif 'upload_files' in request.POST:
-            file_form = MediaFileForm(request.POST, request.FILES)
-            if file_form.is_valid():
-                files = request.FILES.getlist('files')
-                if current_folder:
-                    count = 0
-                    for f in files:
-                        MediaFile.objects.create(folder=current_folder, file=f)
-                        count += 1
-                    messages.success(request, f"{count} arquivos enviados!")
-                else:
-                    messages.error(request, "Selecione uma pasta.")
-                return redirect(request.path)
-            else:
-                messages.error(request, "Erro no formulário.")
+        # Uploads não passam mais por aqui: o navegador envia direto ao R2
+        # (media_upload_url_api + media_upload_complete_api).
 
     folder_form = FolderForm()
     file_form = MediaFileForm()
     
-    breadcrumbs = []
-    temp = current_folder
-    while temp:
-        breadcrumbs.insert(0, temp)
-        temp = temp.parent
+    # Caminho materializado: todos os ancestrais em uma query
+    breadcrumbs = current_folder.ancestors() if current_folder else []
 
     subfolders = MediaFolder.objects.filter(client=client, parent=current_folder)
     files = MediaFile.objects.filter(folder=current_folder) if current_folder else []
+    folder_stats = current_folder.subtree_stats() if current_folder else None
 
     context = {
         'client': client,
@@ -1029,6 +1179,7 @@ def media_manager(request, client_id, folder_id=None):
         'breadcrumbs': breadcrumbs,
         'subfolders': subfolders,
         'files': files,
+        'folder_stats': folder_stats,
         'folder_form': folder_form,
         'file_form': file_form,
     }
@@ -1042,14 +1193,34 @@ def media_dashboard(request):
 @login_required
 def delete_folder(request, folder_id):
     folder = get_object_or_404(MediaFolder, pk=folder_id)
-    client_id = folder.client.id
-    parent_id = folder.parent.id if folder.parent else None
+    client_id = folder.client_id
+    parent_id = folder.parent_id
     folder.delete()
     messages.success(request, "Pasta excluída.")
     if parent_id:
         return redirect('media_folder', client_id=client_id, folder_id=parent_id)
     return redirect('media_root', client_id=client_id)
 
+@login_required
+@require_POST
+def move_folder_api(request, folder_id):
+    folder = get_object_or_404(MediaFolder, pk=folder_id)
+    try:
+        parent_id = json.loads(request.body).get('parent_id')
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Dados inválidos.'}, status=400)
+
+    new_parent = get_object_or_404(MediaFolder, pk=parent_id) if parent_id else None
+    try:
+        with transaction.atomic():
+            folder.move_to(new_parent)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    except IntegrityError:
+        return JsonResponse({'status': 'error', 'message': 'Já existe uma pasta com esse nome no destino.'}, status=400)
+
+    return JsonResponse({'status': 'success', 'path': folder.path})
+
 @login_required
 def delete_file(request, file_id):
     file = get_object_or_404(MediaFile, pk=file_id)
@@ -1062,6 +1233,18 @@ def delete_file(request, file_id):
 @csrf_exempt  # Isso impede o Django de bloquear o JS por falta de token de segurança
 @require_POST
 def upload_photo_api(request):
+    # Endpoint antigo (arquivo passa pelo Django). Barrado pelo Content-Length
+    # ANTES de ler o corpo: arquivos grandes devem usar o upload direto ao R2.
+    content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    if content_length > settings.MEDIA_PROXY_UPLOAD_MAX_BYTES:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Arquivo grande demais para este endpoint. Use o upload direto.',
+        }, status=413)
+    # Cota do tenant: O(1), lê só a linha de StorageUsage
+    if StorageUsage.would_exceed(content_length):
+        return JsonResponse({'status': 'error', 'message': 'Cota de armazenamento da agência excedida.'}, status=403)
+
     # Tenta pegar tanto 'file' (padrão de JS) quanto 'foto' (seu código antigo)
     file = request.FILES.get('file') or request.FILES.get('foto')
     client_id = request.POST.get('client_id')
@@ -1095,32 +1278,284 @@ def upload_photo_api(request):
         print("ERRO NO UPLOAD:", traceback.format_exc())
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
+# --- UPLOAD DIRETO PARA O R2 (URL ASSINADA) ---
+# 1. media_upload_url_api: gera a chave (regras do client_r2_path) e a URL de PUT.
+# 2. O navegador envia o arquivo direto ao R2.
+# 3. media_upload_complete_api: confere o objeto (HEAD) e cria o MediaFile.
+
+DIRECT_UPLOAD_SALT = 'projects.media.direct-upload'
+
+
+@login_required
+@require_POST
+def media_upload_url_api(request):
+    try:
+        data = json.loads(request.body)
+        size = int(data.get('size') or 0)
+    except (ValueError, TypeError):
+        return JsonResponse({'status': 'error', 'message': 'Dados inválidos.'}, status=400)
+
+    filename = os.path.basename(data.get('filename') or '')
+    content_type = data.get('content_type') or ''
+    if not filename:
+        return JsonResponse({'status': 'error', 'message': 'Informe o nome do arquivo.'}, status=400)
+    if size > settings.MEDIA_DIRECT_UPLOAD_MAX_BYTES:
+        return JsonResponse({'status': 'error', 'message': 'Arquivo maior que o limite permitido.'}, status=400)
+    if StorageUsage.would_exceed(size):
+        return JsonResponse({'status': 'error', 'message': 'Cota de armazenamento da agência excedida.'}, status=403)
+
+    folder = get_object_or_404(MediaFolder, pk=data.get('folder_id'), client_id=data.get('client_id'))
+
+    file_field = MediaFile._meta.get_field('file')
+    if getattr(file_field.storage, 'bucket', None) is None:
+        # Storage sem R2 (dev local): o JS usa o upload antigo
+        return JsonResponse({'status': 'error', 'message': 'Upload direto indisponível.'}, status=501)
+
+    key = file_field.generate_filename(MediaFile(folder=folder), filename)
+    upload_url = presigned_put_url(
+        file_field.storage, key, content_type, expires=settings.MEDIA_DIRECT_UPLOAD_EXPIRES
+    )
+    token = signing.dumps({'key': key, 'folder_id': folder.pk}, salt=DIRECT_UPLOAD_SALT)
+
+    return JsonResponse({
+        'status': 'success',
+        'method': 'PUT',
+        'upload_url': upload_url,
+        'headers': {'Content-Type': content_type} if content_type else {},
+        'key': key,
+        'token': token,
+    })
+
+
+@login_required
+@require_POST
+def media_upload_complete_api(request):
+    try:
+        data = json.loads(request.body)
+        payload = signing.loads(
+            data.get('token') or '', salt=DIRECT_UPLOAD_SALT, max_age=settings.MEDIA_DIRECT_UPLOAD_EXPIRES
+        )
+    except (ValueError, signing.BadSignature):
+        return JsonResponse({'status': 'error', 'message': 'Token de upload inválido ou expirado.'}, status=400)
+
+    key = payload['key']
+    folder = get_object_or_404(MediaFolder, pk=payload['folder_id'])
+
+    # Registrar duas vezes o mesmo upload (retry do navegador) não duplica o arquivo
+    media_file = MediaFile.objects.filter(folder=folder, upload_key=key).first()
+    if media_file is None:
+        storage = MediaFile._meta.get_field('file').storage
+        head = head_object(storage, key)
+        if head is None:
+            return JsonResponse({'status': 'error', 'message': 'Arquivo não encontrado no storage.'}, status=400)
+        if head['size'] > settings.MEDIA_DIRECT_UPLOAD_MAX_BYTES:
+            storage.delete(key)
+            return JsonResponse({'status': 'error', 'message': 'Arquivo maior que o limite permitido.'}, status=400)
+        # A cota do upload-url usou o tamanho declarado; aqui vale o que chegou de fato
+        if StorageUsage.would_exceed(head['size']):
+            storage.delete(key)
+            return JsonResponse({'status': 'error', 'message': 'Cota de armazenamento da agência excedida.'}, status=400)
+
+        media_file = MediaFile(folder=folder, file_size=head['size'], upload_key=key)
+        media_file.file.name = key
+        media_file.save()
+        if head['size'] <= settings.MEDIA_DEDUP_INLINE_MAX_BYTES:
+            media_file.deduplicate()
+
+    return JsonResponse({
+        'status': 'success',
+        'file_id': media_file.id,
+        'file_name': media_file.file.name,
+    })
+
+# --- UPLOAD MULTIPART (VÍDEOS GRANDES, COM RETOMADA) ---
+# start -> parts (URLs das partes) -> PUT de cada parte no R2 -> complete.
+# Após uma queda, o navegador chama start de novo com o mesmo arquivo e recebe
+# as partes que já chegaram; só envia o resto.
+
+MULTIPART_TARGETS = {
+    'media': (MediaFile, 'file'),
+    'final_art': (Task, 'final_art'),
+    'design_files': (Task, 'design_files'),
+}
+
+# Máximo de URLs de parte por chamada (o navegador pede em lotes)
+MULTIPART_URLS_PER_REQUEST = 100
+
+
+def _multipart_field(target):
+    model, field_name = MULTIPART_TARGETS[target]
+    return model._meta.get_field(field_name)
+
+
+@login_required
+@require_POST
+def multipart_start_api(request):
+    try:
+        data = json.loads(request.body)
+        size = int(data.get('size') or 0)
+    except (ValueError, TypeError):
+        return JsonResponse({'status': 'error', 'message': 'Dados inválidos.'}, status=400)
+
+    target = data.get('target') or 'media'
+    filename = os.path.basename(data.get('filename') or '')
+    content_type = data.get('content_type') or ''
+    if target not in MULTIPART_TARGETS or not filename or size <= 0:
+        return JsonResponse({'status': 'error', 'message': 'Informe destino, nome e tamanho do arquivo.'}, status=400)
+
+    folder = task = None
+    if target == 'media':
+        folder = get_object_or_404(MediaFolder, pk=data.get('folder_id'), client_id=data.get('client_id'))
+        instance = MediaFile(folder=folder)
+    else:
+        task = get_object_or_404(Task, pk=data.get('task_id'))
+        instance = task
+
+    field = _multipart_field(target)
+    storage = field.storage
+    if getattr(storage, 'bucket', None) is None:
+        return JsonResponse({'status': 'error', 'message': 'Upload direto indisponível.'}, status=501)
+
+    # Retomada: mesmo arquivo (nome + tamanho) para o mesmo destino
+    upload = MultipartUpload.objects.filter(
+        created_by=request.user, target=target, folder=folder, task=task, filename=filename, size=size
+    ).first()
+    parts = []
+    if upload is not None:
+        try:
+            parts = uploaded_parts(storage, upload.key, upload.upload_id)
+        except storage.bucket.meta.client.exceptions.NoSuchUpload:
+            # Abortado no bucket (limpeza): recomeça do zero
+            upload.delete()
+            upload = None
+
+    if upload is None:
+        if StorageUsage.would_exceed(size):
+            return JsonResponse({'status': 'error', 'message': 'Cota de armazenamento da agência excedida.'}, status=403)
+        key = field.generate_filename(instance, filename)
+        upload = MultipartUpload.objects.create(
+            key=key, upload_id=create_upload(storage, key, content_type),
+            target=target, folder=folder, task=task, filename=filename, size=size,
+            part_size=part_size_for(size), content_type=content_type, created_by=request.user,
+        )
+
+    return JsonResponse({
+        'status': 'success',
+        'upload': upload.pk,
+        'key': upload.key,
+        'part_size': upload.part_size,
+        'part_count': upload.part_count,
+        'uploaded_parts': [p['PartNumber'] for p in parts],
+    })
+
+
+@login_required
+@require_POST
+def multipart_parts_api(request, pk):
+    upload = get_object_or_404(MultipartUpload, pk=pk, created_by=request.user)
+    try:
+        numbers = sorted({int(n) for n in json.loads(request.body).get('part_numbers') or []})
+    except (ValueError, TypeError):
+        return JsonResponse({'status': 'error', 'message': 'Dados inválidos.'}, status=400)
+
+    if not numbers or numbers[0] < 1 or numbers[-1] > upload.part_count:
+        return JsonResponse({'status': 'error', 'message': 'Número de parte inválido.'}, status=400)
+    if len(numbers) > MULTIPART_URLS_PER_REQUEST:
+        return JsonResponse({'status': 'error', 'message': 'Peça no máximo 100 partes por vez.'}, status=400)
+
+    storage = _multipart_field(upload.target).storage
+    urls = presigned_part_urls(
+        storage, upload.key, upload.upload_id, numbers, expires=settings.MEDIA_DIRECT_UPLOAD_EXPIRES
+    )
+    return JsonResponse({'status': 'success', 'urls': {str(n): url for n, url in urls.items()}})
+
+
+@login_required
+@require_POST
+def multipart_complete_api(request, pk):
+    upload = get_object_or_404(MultipartUpload, pk=pk, created_by=request.user)
+    storage = _multipart_field(upload.target).storage
+
+    try:
+        parts = uploaded_parts(storage, upload.key, upload.upload_id)
+        missing = sorted(set(range(1, upload.part_count + 1)) - {p['PartNumber'] for p in parts})
+        if missing:
+            return JsonResponse({
+                'status': 'error', 'message': 'Upload incompleto.', 'missing_parts': missing,
+            }, status=400)
+
+        # O start conferiu a cota com o tamanho declarado; aqui vale o que chegou de fato
+        if StorageUsage.would_exceed(sum(p['Size'] for p in parts)):
+            abort_upload(storage, upload.key, upload.upload_id)
+            upload.delete()
+            return JsonResponse({'status': 'error', 'message': 'Cota de armazenamento da agência excedida.'}, status=400)
+
+        complete_upload(storage, upload.key, upload.upload_id, parts)
+    except storage.bucket.meta.client.exceptions.NoSuchUpload:
+        # Retry depois de uma queda: o complete anterior já juntou as partes no
+        # bucket (ou o upload foi abortado). Vale o objeto que estiver lá
+        pass
+
+    head = head_object(storage, upload.key)
+    if head is None:
+        upload.delete()
+        return JsonResponse({'status': 'error', 'message': 'Arquivo não encontrado no storage. Envie de novo.'}, status=400)
+
+    response = {'status': 'success', 'file_name': upload.key}
+    # Registro e remoção do upload juntos: se algo falhar, o retry registra de novo
+    with transaction.atomic():
+        if upload.target == 'media':
+            media_file = MediaFile.objects.filter(folder=upload.folder, upload_key=upload.key).first()
+            if media_file is None:
+                media_file = MediaFile(folder=upload.folder, file_size=head['size'], upload_key=upload.key)
+                media_file.file.name = upload.key
+                media_file.save()
+                # Vídeos grandes são deduplicados depois, pelo comando dedupe_media_files
+                if head['size'] <= settings.MEDIA_DEDUP_INLINE_MAX_BYTES:
+                    media_file.deduplicate()
+            response['file_id'] = media_file.id
+        else:
+            task = upload.task
+            setattr(task, upload.target, upload.key)
+            task.save(update_fields=[upload.target, 'updated_at'])
+            response['task_id'] = task.id
+        upload.delete()
+
+    if upload.target != 'media':
+        publish_task_event('updated', task)
+    return JsonResponse(response)
+
+
+@login_required
+@require_POST
+def multipart_abort_api(request, pk):
+    upload = get_object_or_404(MultipartUpload, pk=pk, created_by=request.user)
+    abort_upload(_multipart_field(upload.target).storage, upload.key, upload.upload_id)
+    upload.delete()
+    return JsonResponse({'status': 'success'})
+
+@login_required
 def download_batch(request):
     if request.method == 'POST':
         file_ids = request.POST.getlist('selected_files')
         download_token = request.POST.get('download_token')
         if not file_ids: return redirect(request.META.get('HTTP_REFERER', '/'))
 
-        files = MediaFile.objects.filter(id__in=file_ids)
-        if not files.exists(): return redirect(request.META.get('HTTP_REFERER', '/'))
-
+        files = MediaFile.objects.filter(id__in=file_ids).select_related('folder__client').order_by('id')
         first_file = files.first()
+        if not first_file: return redirect(request.META.get('HTTP_REFERER', '/'))
+
         client_name = slugify(first_file.folder.client.name)
         zip_filename = f"imagens_{client_name}.zip"
 
-        zip_buffer = io.BytesIO()
-        try:
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for media_file in files:
-                    try:
-                        file_content = media_file.file.read()
-                        zip_file.writestr(media_file.filename, file_content)
-                    except: continue
-        except: pass
-
-        zip_buffer.seek(0)
-        response = HttpResponse(zip_buffer, content_type='application/zip')
+        # O zip é montado enquanto é enviado (memória constante, primeiro byte imediato)
+        content = stream_media_zip(files.iterator())
+        if isinstance(request, ASGIRequest):
+            # Gerador síncrono sob ASGI seria consumido inteiro antes do envio
+            content = iterate_in_thread(content)
+        response = StreamingHttpResponse(content, content_type='application/zip')
         response['Content-Disposition'] = f'attachment; filename="{zip_filename}"'
+        # O cookie vai junto com os headers: o JS detecta o início do download
         if download_token:
             response.set_cookie('download_token', download_token, max_age=10)
         return response
@@ -1160,118 +1595,66 @@ def create_post_studio(request):
 @login_required
 @require_POST
 def create_post_api(request):
-    """ API que salva o Post e dispara IMAGEM + TEXTO para o LinkedIn em tempo real """
+    """ API que salva o Post e enfileira a publicação em cada rede (projects/publishing.py) """
     try:
         client_id = request.POST.get('client_id')
         caption = request.POST.get('caption', '')
-        scheduled_for = request.POST.get('scheduled_for')
+        try:
+            scheduled_for = parse_datetime(request.POST.get('scheduled_for') or '')
+        except ValueError:  # Formato certo, data impossível (ex: mês 13)
+            scheduled_for = None
+        if scheduled_for is None:
+            # Sem data válida não publica "agora" por engano
+            return JsonResponse({'status': 'error', 'message': 'Data de agendamento inválida.'}, status=400)
+        if timezone.is_naive(scheduled_for):
+            scheduled_for = timezone.make_aware(scheduled_for)
         account_ids = request.POST.getlist('platforms')
         media_files = request.FILES.getlist('media_files') # Pega os arquivos upados
 
         client = get_object_or_404(Client, id=client_id)
 
-        # 1. Salva no banco de dados da BrainZ
-        novo_post = Post.objects.create(
-            client=client,
-            caption=caption,
-            scheduled_for=scheduled_for,
-            approval_status='approved_to_schedule'
-        )
+        with transaction.atomic():
+            # 1. Salva no banco de dados da BrainZ (a primeira mídia vai para o R2 com o post)
+            novo_post = Post.objects.create(
+                client=client,
+                caption=caption,
+                scheduled_for=scheduled_for,
+                media=media_files[0] if media_files else None,
+                approval_status='approved_to_schedule'
+            )
+
+            # 2. Uma entrega por conta, publicada em segundo plano pelos workers.
+            # Agendado para o futuro: fica no índice e o run_scheduler despacha na hora.
+            if account_ids:
+                novo_post.accounts.add(*SocialAccount.objects.filter(id__in=account_ids))
+                if scheduled_for <= timezone.now():
+                    dispatch_post(novo_post)
+
+        if novo_post.approval_status == 'publishing':
+            message = 'Post salvo! A publicação nas redes acontece em segundo plano.'
+        else:
+            message = f"Post agendado para {timezone.localtime(scheduled_for).strftime('%d/%m/%Y %H:%M')}!"
+        return JsonResponse({'status': 'success', 'message': message, 'post_id': novo_post.pk})
 
-        if account_ids:
-            accounts = SocialAccount.objects.filter(id__in=account_ids)
-            novo_post.accounts.add(*accounts)
-
-            # =================================================================
-            # 2. MOTOR DE PUBLICAÇÃO: LINKEDIN (TEXTO + IMAGEM)
-            # =================================================================
-            for account in accounts:
-                if account.platform == 'linkedin':
-                    token = account.access_token
-                    urn = account.account_id
-
-                    headers = {
-                        'Authorization': f'Bearer {token}',
-                        'Content-Type': 'application/json',
-                        'X-Restli-Protocol-Version': '2.0.0'
-                    }
-
-                    # Descobre o ID do usuário caso ainda não esteja salvo
-                    if not urn or not urn.startswith('urn:li:'):
-                        me_res = requests.get('https://api.linkedin.com/v2/userinfo', headers=headers)
-                        if me_res.status_code == 200:
-                            urn = f"urn:li:person:{me_res.json().get('sub')}"
-                            account.account_id = urn
-                            account.save()
-                        else:
-                            continue
-
-                    # --- LÓGICA DE UPLOAD SE HOUVER IMAGEM ---
-                    asset_urn = None
-                    if media_files:
-                        image_file = media_files[0] # Pega a primeira imagem para o teste
-                        
-                        # ETAPA A: Registrar o Upload
-                        reg_url = 'https://api.linkedin.com/v2/assets?action=registerUpload'
-                        reg_data = {
-                            "registerUploadRequest": {
-                                "recipes": ["urn:li:digitalmediaRecipe:feedshare-image"],
-                                "owner": urn,
-                                "serviceRelationships": [{"relationshipType": "OWNER", "identifier": "urn:li:userGeneratedContent"}]
-                            }
-                        }
-                        reg_res = requests.post(reg_url, headers=headers, json=reg_data)
-                        
-                        if reg_res.status_code == 200:
-                            reg_json = reg_res.json()
-                            upload_url = reg_json['value']['uploadMechanism']['com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest']['uploadUrl']
-                            asset_urn = reg_json['value']['asset']
-
-                            # ETAPA B: Fazer o Upload do Binário da Imagem
-                            image_data = image_file.read()
-                            upload_headers = {'Authorization': f'Bearer {token}'} # Sem content-type para evitar conflitos binários
-                            requests.post(upload_url, headers=upload_headers, data=image_data)
-
-                    # ETAPA C: Montar o Post Final
-                    post_data = {
-                        "author": urn,
-                        "lifecycleState": "PUBLISHED",
-                        "visibility": {"com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"}
-                    }
-
-                    # Se conseguiu subir a imagem, anexa no post. Se não, vai só texto.
-                    if asset_urn:
-                        post_data["specificContent"] = {
-                            "com.linkedin.ugc.ShareContent": {
-                                "shareCommentary": {"text": caption},
-                                "shareMediaCategory": "IMAGE",
-                                "media": [{"status": "READY", "media": asset_urn}]
-                            }
-                        }
-                    else:
-                        post_data["specificContent"] = {
-                            "com.linkedin.ugc.ShareContent": {
-                                "shareCommentary": {"text": caption},
-                                "shareMediaCategory": "NONE"
-                            }
-                        }
-
-                    # Dispara o Post para o mundo!
-                    post_url = 'https://api.linkedin.com/v2/ugcPosts'
-                    response = requests.post(post_url, headers=headers, json=post_data)
-
-                    if response.status_code in [200, 201]:
-                        print("🚀 SUCESSO! Post publicado no LinkedIn com Imagem!")
-                    else:
-                        print("❌ Erro no LinkedIn:", response.json())
-
-        return JsonResponse({'status': 'success', 'message': 'Post publicado e salvo com sucesso!'})
-        
     except Exception as e:
-        print(f"Erro fatal: {e}")
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
 
+@login_required
+def post_status_api(request, post_id):
+    """ Status do post e de cada entrega (para o front acompanhar a publicação) """
+    post = get_object_or_404(Post, pk=post_id)
+    deliveries = post.deliveries.select_related('account').order_by('pk')
+    return JsonResponse({
+        'status': 'success',
+        'post': {
+            'id': post.pk,
+            'approval_status': post.approval_status,
+            'deliveries': [delivery.to_dict() for delivery in deliveries],
+        },
+    })
+
+
 # 6. AUTH SOCIAL (OAUTH)
 # ==============================================================================
 
@@ -1331,7 +1714,6 @@ def meta_auth_callback(request):
         # ==========================================
         # 1. TROCAR POR TOKEN DE LONGA DURAÇÃO (60 DIAS)
         # ==========================================
-        import requests
         long_lived_url = "https://graph.facebook.com/v18.0/oauth/access_token"
         params = {
             'grant_type': 'fb_exchange_token',
@@ -1340,7 +1722,7 @@ def meta_auth_callback(request):
             'fb_exchange_token': short_lived_token
         }
         
-        long_lived_response = requests.get(long_lived_url, params=params).json()
+        long_lived_response = provider_http.get(long_lived_url, params=params).json()
         access_token = long_lived_response.get('access_token', short_lived_token) # Usa o longo, ou o curto como fallback
         
         # ==========================================
@@ -1349,29 +1731,13 @@ def meta_auth_callback(request):
         client.meta_access_token = access_token # Verifique se o nome do campo é esse mesmo no seu models.py
         client.save()
         
-        count = 0
-        
-        # DECIDE QUAL FUNÇÃO CHAMAR
-        if intent == 'instagram_only':
-            count = service.save_only_instagram_accounts(access_token, client)
-            tipo = "Instagram"
-        elif intent == 'facebook_only':
-            count = service.save_only_facebook_pages(access_token, client)
-            tipo = "Facebook"
-        else:
-            # Caso antigo (salva tudo)
-            c1 = service.save_only_facebook_pages(access_token, client)
-            c2 = service.save_only_instagram_accounts(access_token, client)
-            count = c1 + c2
-            tipo = "Meta"
-
-        if count > 0:
-            messages.success(request, f"{count} conta(s) de {tipo} conectada(s) com sucesso!")
-        else:
-            if intent == 'instagram_only':
-                messages.warning(request, "Nenhuma conta de Instagram vinculada encontrada. Verifique se sua Página do Facebook tem um Instagram conectado.")
-            else:
-                messages.warning(request, f"Nenhuma conta de {tipo} encontrada.")
+        # 3. As contas (Páginas/Instagram) são buscadas em segundo plano:
+        # várias chamadas à Graph API que seguravam o redirect por segundos.
+        # Só o id vai para a fila (schema public); a tarefa lê o token do Client
+        enqueue(discover_meta_accounts, args=[client.pk, intent])
+
+        tipo = {'instagram_only': "Instagram", 'facebook_only': "Facebook"}.get(intent, "Meta")
+        messages.success(request, f"Conexão com {tipo} autorizada! As contas aparecem em instantes.")
     else:
         messages.error(request, "Erro ao conectar com a Meta.")
 
@@ -0,0 +1,205 @@
+# projects/zipstream.py
+"""
+ZIP em streaming para downloads em lote da Central de Mídia.
+
+O arquivo é gerado enquanto é enviado: cada objeto do R2 é lido em blocos e
+escrito no zip, e os bytes prontos saem para o StreamingHttpResponse. Os
+próximos objetos são baixados em paralelo (prefetch_media) enquanto o atual é
+escrito, com limite de threads e de bytes em memória por download.
+
+Objetos que cabem no orçamento do prefetch chegam inteiros em memória; os
+maiores vão do GET no R2 direto para a entrada do zip, bloco a bloco, sem passar
+por disco. Se a abertura ou o primeiro bloco falhar, o arquivo é pulado; se a
+leitura cair no meio de uma entrada já começada, o download é interrompido (o
+zip sai incompleto e o navegador acusa erro) em vez de entregar o arquivo
+truncado como se estivesse inteiro.
+
+Sob ASGI, o StreamingHttpResponse consome geradores síncronos com
+sync_to_async(list), montando o zip inteiro antes do primeiro byte; a view usa
+iterate_in_thread() para entregar um bloco de cada vez.
+"""
+import io
+import logging
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .storage import STREAM_CHUNK_SIZE, open_stream
+
+logger = logging.getLogger(__name__)
+
+# Formatos que já são comprimidos: DEFLATE só gastaria CPU (vão como ZIP_STORED)
+STORED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.avif',
+    '.mp4', '.mov', '.m4v', '.webm', '.mkv', '.avi',
+    '.mp3', '.m4a', '.aac', '.ogg',
+    '.zip', '.rar', '.7z', '.gz', '.pdf', '.psd', '.ai',
+}
+
+
+class _StreamBuffer:
+    """
+    Destino "não pesquisável" para o ZipFile: guarda os bytes escritos até o
+    gerador repassá-los. Sem seek(), o zipfile usa data descriptors e não
+    precisa voltar no arquivo para gravar tamanhos/CRC.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+def compress_type_for(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def unique_name(name, used):
+    """Evita entradas com o mesmo nome no zip: foto.jpg, foto (2).jpg, ..."""
+    candidate, counter = name, 1
+    root, ext = os.path.splitext(name)
+    while candidate in used:
+        counter += 1
+        candidate = f"{root} ({counter}){ext}"
+    used.add(candidate)
+    return candidate
+
+
+def _download(storage, name):
+    """Executado nas threads do prefetch: baixa o objeto inteiro."""
+    with open_stream(storage, name) as source:
+        return source.read()
+
+
+def prefetch_media(media_files, workers=None, max_bytes=None):
+    """
+    Percorre `media_files` em ordem entregando (media_file, abrir_fonte), enquanto
+    até `workers` objetos seguintes são baixados em paralelo. A soma dos tamanhos
+    baixados e ainda não consumidos nunca passa de `max_bytes`; arquivos maiores
+    que o limite (ou sem tamanho conhecido) não entram no prefetch: quando chegar
+    a vez deles, `abrir_fonte()` abre o GET em streaming (open_stream).
+
+    `abrir_fonte()` retorna um objeto com read(), para usar com `with`. Se o
+    download antecipado falhou, a exceção aparece ao chamá-lo.
+    """
+    workers = workers or settings.MEDIA_ZIP_PREFETCH_WORKERS
+    max_bytes = max_bytes or settings.MEDIA_ZIP_PREFETCH_MAX_BYTES
+
+    upcoming = iter(media_files)
+    next_file = next(upcoming, None)
+    window = deque()  # (media_file, future ou None, bytes reservados)
+    reserved = 0
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='zip-prefetch')
+    try:
+        while True:
+            # Enche a janela respeitando threads e orçamento de memória
+            while next_file is not None and len(window) < workers * 4:
+                size = next_file.file_size or 0
+                if not size or size > max_bytes:
+                    window.append((next_file, None, 0))
+                elif sum(1 for item in window if item[1]) >= workers or reserved + size > max_bytes:
+                    break
+                else:
+                    future = pool.submit(_download, next_file.file.storage, next_file.file.name)
+                    window.append((next_file, future, size))
+                    reserved += size
+                next_file = next(upcoming, None)
+
+            if not window:
+                return
+
+            media_file, future, size = window.popleft()
+            if future is None:
+                yield media_file, lambda mf=media_file: open_stream(mf.file.storage, mf.file.name)
+            else:
+                yield media_file, lambda f=future: io.BytesIO(f.result())
+            # O consumidor já escreveu o arquivo: libera o orçamento dele
+            reserved -= size
+    finally:
+        # Download cancelado pelo navegador: não espera os objetos pendentes
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def stream_media_zip(media_files, chunk_size=STREAM_CHUNK_SIZE, workers=None, max_bytes=None):
+    """
+    Gera os bytes de um zip com os arquivos de `media_files` (MediaFile).
+    Arquivos que não abrirem são pulados, como no download antigo; uma falha no
+    meio de uma entrada interrompe o download (a exceção sobe).
+    """
+    buffer = _StreamBuffer()
+    used_names = set()
+
+    with zipfile.ZipFile(buffer, 'w', allowZip64=True) as archive:
+        for media_file, open_source in prefetch_media(media_files, workers, max_bytes):
+            name = unique_name(media_file.filename or os.path.basename(media_file.file.name), used_names)
+            info = zipfile.ZipInfo(name, date_time=media_file.uploaded_at.timetuple()[:6])
+            info.compress_type = compress_type_for(name)
+            info.file_size = media_file.file_size or 0
+
+            try:
+                opened = open_source()
+            except Exception:
+                logger.exception('Erro ao incluir %s no zip; arquivo pulado', name)
+                continue
+
+            with opened as source:
+                try:
+                    # Lido antes de abrir a entrada: falha aqui ainda não escreveu nada
+                    chunk = source.read(chunk_size)
+                except Exception:
+                    logger.exception('Erro ao incluir %s no zip; arquivo pulado', name)
+                    continue
+
+                # force_zip64: tamanho real pode não bater com o registrado (ou passar de 4 GB)
+                with archive.open(info, 'w', force_zip64=True) as entry:
+                    while chunk:
+                        entry.write(chunk)
+                        yield from buffer.drain()
+                        try:
+                            chunk = source.read(chunk_size)
+                        except Exception:
+                            logger.exception('Leitura de %s falhou no meio do zip; download interrompido', name)
+                            raise
+            yield from buffer.drain()
+
+    yield from buffer.drain()
+
+
+async def iterate_in_thread(iterator):
+    """
+    Entrega um gerador síncrono como iterador assíncrono, um item por vez
+    (ASGI): cada next() roda na thread síncrona da request, com a mesma conexão
+    do banco. Se o cliente desconectar, fecha o gerador (cancela o prefetch).
+    """
+    iterator = iter(iterator)
+    done = object()
+    try:
+        while True:
+            item = await sync_to_async(next)(iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close:
+            await sync_to_async(close)()
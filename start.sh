@@ -0,0 +1,47 @@
+#!/usr/bin/env bash
+# Processos do container. Uso: start.sh [all|web|worker|jobs|scheduler]
+#
+#   all        (padrão do Dockerfile) web + workers no mesmo container: se
+#              qualquer um morrer, derruba o resto para o orquestrador reiniciar
+#   web        só o gunicorn (quando os workers rodam em serviços separados)
+#   worker     fila de remoção de arquivos do R2 (drain_storage_deletes)
+#   jobs       fila de tarefas: schemas de agências novas, entregas de posts, ...
+#   scheduler  despacha os posts agendados de todos os tenants
+#
+# Sem os workers, agência nova nunca ganha schema e post agendado não sai.
+set -u
+
+WEB_CMD=(gunicorn --bind 0.0.0.0:3000 --timeout 600 --keep-alive 5 --workers "${WEB_WORKERS:-3}"
+         -k uvicorn_worker.UvicornWorker config.asgi:application)
+WORKER_CMD=(python manage.py drain_storage_deletes --loop)
+JOBS_CMD=(python manage.py run_workers --processes "${JOB_PROCESSES:-2}")
+SCHEDULER_CMD=(python manage.py run_scheduler --loop)
+
+case "${1:-all}" in
+    web)
+        python manage.py collectstatic --noinput || exit 1
+        exec "${WEB_CMD[@]}"
+        ;;
+    worker) exec "${WORKER_CMD[@]}" ;;
+    jobs) exec "${JOBS_CMD[@]}" ;;
+    scheduler) exec "${SCHEDULER_CMD[@]}" ;;
+    all)
+        python manage.py collectstatic --noinput || exit 1
+        "${WORKER_CMD[@]}" &
+        "${JOBS_CMD[@]}" &
+        "${SCHEDULER_CMD[@]}" &
+        "${WEB_CMD[@]}" &
+
+        trap 'kill -TERM $(jobs -p) 2>/dev/null' TERM INT
+        # Primeiro que sair (ou o SIGTERM do docker stop) encerra todos
+        wait -n
+        status=$?
+        kill -TERM $(jobs -p) 2>/dev/null
+        wait
+        exit "$status"
+        ;;
+    *)
+        echo "Papel desconhecido: $1 (use all, web, worker, jobs ou scheduler)" >&2
+        exit 2
+        ;;
+esac
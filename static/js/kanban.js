@@ -5,6 +5,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // 1. Inicializa o Quadro
     if (window.KANBAN_INITIAL_DATA) {
+        indexBoardTasks(window.KANBAN_INITIAL_DATA);
         renderBoard(window.KANBAN_INITIAL_DATA);
     } else {
         console.error('Dados iniciais (KANBAN_INITIAL_DATA) não encontrados.');
@@ -20,8 +21,84 @@ document.addEventListener('DOMContentLoaded', function() {
     if (typeof feather !== 'undefined') {
         feather.replace();
     }
+
+    // 5. Recebe as mudanças dos outros usuários em tempo real
+    subscribeKanbanEvents();
 });
 
+/**
+ * Estado local do quadro (id -> task) usado para aplicar o delta do servidor
+ */
+const kanbanState = {
+    tasks: {},
+    cursor: window.KANBAN_CURSOR || null,
+};
+
+function indexBoardTasks(data) {
+    Object.values(data).forEach(columnTasks => {
+        (columnTasks || []).forEach(task => { kanbanState.tasks[task.id] = task; });
+    });
+}
+
+/**
+ * Busca apenas o que mudou desde o último cursor e re-renderiza localmente
+ * (substitui o window.location.reload() depois de salvar)
+ */
+function syncKanbanChanges() {
+    if (!window.KANBAN_CHANGES_URL) { window.location.reload(); return; }
+
+    const url = kanbanState.cursor
+        ? `${window.KANBAN_CHANGES_URL}?since=${encodeURIComponent(kanbanState.cursor)}`
+        : window.KANBAN_CHANGES_URL;
+
+    return fetch(url)
+        .then(res => res.json())
+        .then(data => {
+            if (data.status !== 'success') throw new Error(data.message);
+
+            if (data.reset) kanbanState.tasks = {};
+            data.tasks.forEach(task => { kanbanState.tasks[task.id] = task; });
+            data.deleted.forEach(id => { delete kanbanState.tasks[id]; });
+            kanbanState.cursor = data.cursor;
+
+            // Quadro filtrado por tag (?tag=): o delta traz tudo, o filtro é local
+            const visible = Object.values(kanbanState.tasks).filter(
+                task => !window.KANBAN_TAG || (task.tags || []).includes(window.KANBAN_TAG)
+            );
+            const ordered = visible.sort((a, b) => {
+                const rankA = a.rank || '', rankB = b.rank || '';
+                if (rankA !== rankB) return rankA < rankB ? -1 : 1;
+                return (a.order || 0) - (b.order || 0);
+            });
+            renderBoard(ordered);
+        })
+        .catch(error => {
+            console.error('Erro ao sincronizar o Kanban:', error);
+            window.location.reload();
+        });
+}
+
+/**
+ * Abre o stream SSE do quadro. Cada evento só avisa que algo mudou; os dados
+ * vêm do delta (syncKanbanChanges), agrupando rajadas de eventos em uma chamada.
+ */
+function subscribeKanbanEvents() {
+    if (!window.KANBAN_EVENTS_URL || !window.EventSource) return;
+
+    let pending = null;
+    const scheduleSync = () => {
+        clearTimeout(pending);
+        pending = setTimeout(() => {
+            // Não re-renderiza no meio de um drag; tenta de novo em seguida
+            if (document.querySelector('.dragging')) { scheduleSync(); return; }
+            syncKanbanChanges();
+        }, 300);
+    };
+
+    const stream = new EventSource(window.KANBAN_EVENTS_URL);
+    ['created', 'moved', 'updated', 'deleted'].forEach(name => stream.addEventListener(name, scheduleSync));
+}
+
 /**
  * Renderiza todas as colunas e cards
  */
@@ -380,7 +457,7 @@ function handleAddTaskSubmit(e) {
     .then(data => {
         if (data.status === 'success') {
             document.getElementById('add-task-modal').style.display = 'none';
-            window.location.reload(); 
+            syncKanbanChanges(); 
         } else {
             alert('Erro: ' + (data.message || JSON.stringify(data.errors)));
         }
@@ -515,6 +592,7 @@ function confirmDeleteTask(taskId) {
             if(res.ok) {
                 const card = document.querySelector(`.kanban-card[data-id="${taskId}"]`);
                 if(card) card.remove();
+                delete kanbanState.tasks[taskId];
                 updateTaskCounts();
             } else {
                 alert('Erro ao excluir tarefa.');
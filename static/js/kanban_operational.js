@@ -52,13 +52,13 @@ document.addEventListener("DOMContentLoaded", function () {
     }
 
     // --- DRAG & DROP ---
-    const cards = document.querySelectorAll('.kanban-card');
     const columns = document.querySelectorAll('.kanban-tasks-list');
-    
-    cards.forEach(c => {
+
+    function bindCard(c) {
         c.addEventListener('dragstart', function() { this.classList.add('dragging'); });
         c.addEventListener('dragend', function() { this.classList.remove('dragging'); });
-    });
+    }
+    document.querySelectorAll('.kanban-card').forEach(bindCard);
 
     columns.forEach(col => {
         col.addEventListener('dragover', e => e.preventDefault());
@@ -81,6 +81,60 @@ document.addEventListener("DOMContentLoaded", function () {
         });
     }
 
+    // --- TEMPO REAL (SSE) ---
+    // Mudanças feitas por outros usuários chegam pelo stream; só o card afetado é trocado.
+    function updateColumnCount(col) {
+        const badge = col?.closest('.col-kanban')?.querySelector('.col-kanban-header .badge');
+        if (badge) badge.innerText = col.querySelectorAll('.kanban-card').length;
+    }
+
+    function removeCard(taskId) {
+        const card = document.querySelector(`.kanban-card[data-id="${taskId}"]`);
+        if (!card) return;
+        const col = card.closest('.kanban-tasks-list');
+        card.remove();
+        updateColumnCount(col);
+    }
+
+    function refreshCard(msg) {
+        const query = CONFIG.activeTag ? `?tag=${encodeURIComponent(CONFIG.activeTag)}` : '';
+        fetch(`${CONFIG.urls.cardFragment}${msg.task_id}/${query}`)
+            .then(res => {
+                // 204: o card não pertence mais ao filtro de tag do quadro
+                if (res.status === 204) { removeCard(msg.task_id); return null; }
+                return res.ok ? res.text() : null;
+            })
+            .then(html => {
+                if (!html || document.querySelector('.dragging')) return;
+                const col = document.getElementById(`col-${msg.status}`) || document.getElementById('col-briefing');
+                if (!col) return;
+
+                const tpl = document.createElement('template');
+                tpl.innerHTML = html.trim();
+                const card = tpl.content.querySelector('.kanban-card');
+                if (!card) return;
+
+                removeCard(msg.task_id);
+                col.querySelector('.py-4.opacity-50')?.remove(); // placeholder "Vazio"
+                bindCard(card);
+
+                // Insere na posição pelo rank (mesma ordenação do servidor)
+                const next = Array.from(col.querySelectorAll('.kanban-card'))
+                    .find(c => (c.dataset.rank || '') > (msg.rank || ''));
+                if (next) col.insertBefore(card, next);
+                else col.appendChild(card);
+                updateColumnCount(col);
+            });
+    }
+
+    if (CONFIG.urls.events && window.EventSource) {
+        const stream = new EventSource(CONFIG.urls.events);
+        ['created', 'moved', 'updated'].forEach(name => {
+            stream.addEventListener(name, e => refreshCard(JSON.parse(e.data)));
+        });
+        stream.addEventListener('deleted', e => removeCard(JSON.parse(e.data).task_id));
+    }
+
     // --- MODAL OPEN ---
     window.openNewTaskModal = function () {
         document.getElementById('kanbanTaskForm').reset();
@@ -337,7 +391,7 @@ document.addEventListener("DOMContentLoaded", function () {
     };
 
     // Função central de envio
-    function sendAction(forceStatus, actionType, feedbackText, blobImage, visualNextTab) {
+    async function sendAction(forceStatus, actionType, feedbackText, blobImage, visualNextTab) {
         Swal.fire({ title: 'Salvando...', didOpen: () => Swal.showLoading() });
         
         const formData = new FormData(document.getElementById('kanbanTaskForm'));
@@ -347,6 +401,19 @@ document.addEventListener("DOMContentLoaded", function () {
         if(blobImage) formData.append('feedback_image_annotation', blobImage, 'ajuste.png');
 
         const taskId = document.getElementById('task-id').value;
+
+        // Arte final grande (vídeo): vai direto ao R2 em partes, fora do formulário
+        const artFile = formData.get('final_art');
+        if (taskId && artFile && artFile.size > MULTIPART_THRESHOLD) {
+            try {
+                await uploadMultipart(artFile, { target: 'final_art', task_id: taskId }, CONFIG.csrfToken,
+                    (sent, total) => Swal.update({ title: `Enviando arte... ${Math.round(sent / total * 100)}%` }));
+                formData.delete('final_art');
+            } catch (err) {
+                Swal.fire('Erro', `Falha no upload da arte: ${err.message}. Tente de novo para retomar.`, 'error');
+                return;
+            }
+        }
         let url = CONFIG.urls.addTask;
         if(taskId) url = `${CONFIG.urls.taskUpdate}${taskId}/`;
 
@@ -149,6 +149,69 @@ function confirmDelete(event, title, text, element) {
 // Função de pausa (Delay)
 const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
 
+// Upload direto para o R2: o servidor só assina a URL e registra o arquivo no
+// final, os bytes vão do navegador para o bucket sem passar pelo Django.
+async function uploadDirect(file, clientId, folderId, csrfToken) {
+    // Vídeos grandes: multipart com retomada (multipart_upload.js)
+    if (file.size > MULTIPART_THRESHOLD) {
+        try {
+            const params = { target: 'media', client_id: clientId, folder_id: folderId };
+            return await uploadMultipart(file, params, csrfToken);
+        } catch (err) {
+            if (err.status !== 501) return { status: 'error', message: err.message };
+        }
+    }
+
+    const jsonHeaders = { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken };
+
+    const signResponse = await fetch('/api/media/upload/url/', {
+        method: 'POST',
+        headers: jsonHeaders,
+        body: JSON.stringify({
+            client_id: clientId,
+            folder_id: folderId,
+            filename: file.name,
+            size: file.size,
+            content_type: file.type
+        })
+    });
+    const signed = await signResponse.json().catch(() => ({}));
+
+    // Storage sem R2 (ambiente local): volta para o upload pelo servidor
+    if (signResponse.status === 501) return uploadViaServer(file, clientId, folderId, csrfToken);
+    if (!signResponse.ok) return { status: 'error', message: signed.message || signResponse.status };
+
+    const putResponse = await fetch(signed.upload_url, {
+        method: signed.method,
+        headers: signed.headers,
+        body: file
+    });
+    if (!putResponse.ok) return { status: 'error', message: `R2 ${putResponse.status}` };
+
+    const doneResponse = await fetch('/api/media/upload/complete/', {
+        method: 'POST',
+        headers: jsonHeaders,
+        body: JSON.stringify({ token: signed.token })
+    });
+    const done = await doneResponse.json().catch(() => ({}));
+    return doneResponse.ok ? done : { status: 'error', message: done.message || doneResponse.status };
+}
+
+async function uploadViaServer(file, clientId, folderId, csrfToken) {
+    const formData = new FormData();
+    formData.append('foto', file);
+    formData.append('client_id', clientId);
+    if (folderId) formData.append('folder_id', folderId);
+
+    const response = await fetch('/api/media/upload/', {
+        method: 'POST',
+        headers: { 'X-CSRFToken': csrfToken },
+        body: formData
+    });
+    const data = await response.json().catch(() => ({}));
+    return response.ok ? data : { status: 'error', message: data.message || response.status };
+}
+
 // Função de Upload em Lote
 async function uploadInBatch(inputElement) {
     console.log("--> Iniciando uploadInBatch...");
@@ -223,30 +286,17 @@ async function uploadInBatch(inputElement) {
     let errorCount = 0;
 
     for (const [index, file] of files.entries()) {
-        const formData = new FormData();
-        formData.append('foto', file);
-        formData.append('client_id', clientId);
-        if (folderId) formData.append('folder_id', folderId);
-
         addLog(`Enviando: ${file.name}...`, 'info');
 
         try {
-            if (index > 0) await sleep(200);
-
-            const response = await fetch('/api/media/upload/', {
-                method: 'POST',
-                headers: { 'X-CSRFToken': csrfToken },
-                body: formData
-            });
-
-            const data = await response.json().catch(() => ({}));
+            const data = await uploadDirect(file, clientId, folderId, csrfToken);
 
-            if (response.ok && data.status === 'success') {
+            if (data.status === 'success') {
                 successCount++;
                 addLog(`✓ Sucesso: ${file.name}`, 'success');
             } else {
                 errorCount++;
-                addLog(`✗ Falha: ${file.name} (${data.message || response.status})`, 'error');
+                addLog(`✗ Falha: ${file.name} (${data.message})`, 'error');
             }
         } catch (err) {
             errorCount++;
@@ -0,0 +1,97 @@
+/* static/js/multipart_upload.js */
+
+// Upload multipart direto para o R2 (vídeos grandes).
+// O arquivo é fatiado em partes enviadas em paralelo; cada parte tem retry com
+// espera crescente. Se a conexão cair de vez, chamar uploadMultipart de novo com
+// o mesmo arquivo retoma: o servidor devolve as partes que já chegaram.
+
+// Acima deste tamanho o upload usa multipart em vez de um PUT único
+const MULTIPART_THRESHOLD = 64 * 1024 * 1024;
+const MULTIPART_CONCURRENCY = 4;
+const MULTIPART_RETRIES = 5;
+const MULTIPART_URL_BATCH = 100;
+
+async function multipartRequest(url, csrfToken, payload) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken },
+        body: JSON.stringify(payload || {})
+    });
+    const data = await response.json().catch(() => ({}));
+    if (!response.ok) {
+        const error = new Error(data.message || `Erro ${response.status}`);
+        error.status = response.status;
+        error.data = data;
+        throw error;
+    }
+    return data;
+}
+
+// params: { target: 'media'|'final_art'|'design_files', client_id, folder_id, task_id }
+// onProgress(enviados, total) é chamado a cada parte concluída (em bytes).
+async function uploadMultipart(file, params, csrfToken, onProgress) {
+    const start = await multipartRequest('/api/media/multipart/start/', csrfToken, {
+        ...params,
+        filename: file.name,
+        size: file.size,
+        content_type: file.type
+    });
+    const base = `/api/media/multipart/${start.upload}`;
+    const partSize = start.part_size;
+    const partBytes = (n) => Math.min(partSize, file.size - (n - 1) * partSize);
+
+    const done = new Set(start.uploaded_parts);
+    let sent = 0;
+    done.forEach(n => { sent += partBytes(n); });
+    if (onProgress) onProgress(sent, file.size);
+
+    const urls = {};
+    const fetchUrls = async (numbers) => {
+        for (let i = 0; i < numbers.length; i += MULTIPART_URL_BATCH) {
+            const batch = numbers.slice(i, i + MULTIPART_URL_BATCH);
+            const data = await multipartRequest(`${base}/parts/`, csrfToken, { part_numbers: batch });
+            Object.assign(urls, data.urls);
+        }
+    };
+
+    const sendPart = async (n) => {
+        const blob = file.slice((n - 1) * partSize, (n - 1) * partSize + partBytes(n));
+        for (let attempt = 0; ; attempt++) {
+            try {
+                const response = await fetch(urls[n], { method: 'PUT', body: blob });
+                if (response.ok) break;
+                // URL expirada: pede outra e tenta de novo
+                if (response.status === 403) await fetchUrls([n]);
+                else throw new Error(`R2 ${response.status}`);
+            } catch (err) {
+                if (attempt >= MULTIPART_RETRIES) throw err;
+                await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+            }
+        }
+        done.add(n);
+        sent += blob.size;
+        if (onProgress) onProgress(sent, file.size);
+    };
+
+    const sendMissing = async (missing) => {
+        await fetchUrls(missing);
+        const queue = missing.slice();
+        const worker = async () => {
+            while (queue.length) await sendPart(queue.shift());
+        };
+        await Promise.all(Array.from({ length: MULTIPART_CONCURRENCY }, worker));
+    };
+
+    const pending = [];
+    for (let n = 1; n <= start.part_count; n++) if (!done.has(n)) pending.push(n);
+    await sendMissing(pending);
+
+    try {
+        return await multipartRequest(`${base}/complete/`, csrfToken);
+    } catch (err) {
+        // O bucket não recebeu alguma parte: reenvia só elas e conclui de novo
+        if (!err.data || !err.data.missing_parts) throw err;
+        await sendMissing(err.data.missing_parts);
+        return multipartRequest(`${base}/complete/`, csrfToken);
+    }
+}